@@ -1,21 +1,60 @@
 # Last modified: 2024-03-26
 import os
+import functools
 import logging
 import re
 import requests
+import httpx
 import hashlib
 import time
 from functools import lru_cache
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from models import BotSettings
 from dotenv import load_dotenv
 from clean_summary import clean_summary
-from fix_political_references import fix_political_references
+from fix_political_references import fix_political_references, topic_emoji
 from validate_summary import validate_summary_quality
+from llm_cache import llm_cache, make_cache_key
+from http_client import AsyncPooledHTTPClient, http_client
+from key_pool import key_pool
+from prompt_budget import MIN_CONTENT_TOKENS, estimate_tokens, prompt_token_budget, trim_to_budget
+from llm_router import AI_ROUTING, Attempt, endpoint_name, llm_router
+from llm_stream import (AI_STREAMING, AI_STREAM_RETRIES, GenerationRejected, StreamMonitor, asse_events,
+                        gemini_delta, is_event_stream, openrouter_delta, sse_events)
+from local_summarizer import AI_LOCAL_FALLBACK, local_summarizer
+from flask import has_app_context
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Разметка ответа комбинированного запроса (резюме + хештеги)
+COMBINED_HASHTAGS_RE = re.compile(r'^[\*\s]*ХЕШТЕГИ[\*\s]*:[\*\s]*(.+)$', re.IGNORECASE | re.MULTILINE)
+COMBINED_SUMMARY_RE = re.compile(r'^[\*\s]*РЕЗЮМЕ[\*\s]*:[\*\s]*(.*)$', re.IGNORECASE | re.MULTILINE | re.DOTALL)
+# Пакетная генерация: разделитель блоков и максимальная длина статьи для пакета
+BATCH_DELIMITER_RE = re.compile(r'^[\*\s]*=+\s*СТАТЬЯ\s+(\d+)\s*=+[\*\s]*$', re.IGNORECASE | re.MULTILINE)
+BATCH_MAX_CONTENT_CHARS = int(os.environ.get("AI_BATCH_MAX_CONTENT_CHARS", "3000"))
+BATCH_STYLE_HINTS = {
+    'engaging': 'лаконичный, деловой, но понятный язык, важные цифры выделяй жирным (**+15%**)',
+    'formal': 'деловой и точный, с ключевыми финансовыми показателями',
+    'default': 'акцент на геополитике, заявления официальных лиц в формате "ИМЯ: цитата"',
+}
+# Дописывается к запросу резюме, когда хештеги запрашиваются тем же запросом
+COMBINED_FORMAT = """
+
+ФОРМАТ ОТВЕТА (строго две секции):
+ХЕШТЕГИ: эмодзи и 3-4 самых релевантных хештега на русском одной строкой (например: 🇷🇺#санкции #россия #экономика)
+РЕЗЮМЕ:
+текст сводки в указанном выше формате"""
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+EMOJI_PATTERN = re.compile(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]')
+# Провайдер в аналитике для резюме, созданных без LLM
+LOCAL_PROVIDER = "local"
+
+
+class LLMUnavailable(Exception):
+    """LLM сейчас не стоит ждать: все ключи на паузе или очередь и задержка выше порогов"""
+
+
 class AIService:
     def __init__(self, ai_provider=None):
         self.ai_provider = ai_provider or "openrouter"
@@ -24,50 +63,133 @@ class AIService:
         self.backup_key = os.environ.get("OPENROUTER_BACKUP_KEY")
         self.backup_key2 = os.environ.get("OPENROUTER_BACKUP_KEY1")
         self.model = "deepseek/deepseek-r1-0528:free"
+        self.gemini_model = "gemini-2.0-flash-001"
         self.site_url = os.environ.get("SITE_URL", "https://smartlab-bot.replit.app")
         self.site_name = os.environ.get("SITE_NAME", "News Bot")
-        # Кэш для хранения результатов API запросов
-        self._cache = {}
+        # Кэш ответов API общий для всех экземпляров и процессов
+        self._cache = llm_cache
 
     def _get_prompt_hash(self, prompt: str, model: Optional[str] = None, temperature: Optional[float] = None) -> str:
         """Создает хэш строки запроса для кэширования"""
         hash_input = f"{prompt}|{model or self.model}|{temperature or 0.7}"
         return hashlib.md5(hash_input.encode('utf-8')).hexdigest()
 
+    def _current_model(self) -> str:
+        return self.gemini_model if self.ai_provider == "gemini" else self.model
+
+    def _get_cache_key(self, kind: str, article_data: Dict[str, Any], style: str = "", temperature: float = 0.7) -> str:
+        """Ключ кэша по нормализованному содержимому статьи, провайдеру, модели, стилю и температуре"""
+        return make_cache_key(kind, article_data, self.ai_provider, self._current_model(), style, temperature)
+
     def _get_cached_response(self, prompt_hash: str) -> Optional[str]:
-        """Получает кэшированный ответ по хэшу запроса"""
+        """Получает кэшированный ответ по ключу"""
         return self._cache.get(prompt_hash)
 
-    def _cache_response(self, prompt_hash: str, response: str) -> None:
+    def _cache_response(self, prompt_hash: str, response: str, kind: str = "") -> None:
         """Сохраняет ответ в кэш"""
-        self._cache[prompt_hash] = response
-        # Ограничиваем размер кэша
-        if len(self._cache) > 100:
-            # Удаляем случайный элемент
-            self._cache.pop(next(iter(self._cache)))
-
-    def _call_openrouter_api(self, payload: Dict[str, Any], api_key: Optional[str] = None) -> Dict[str, Any]:
-        """Calls OpenRouter API with proper error handling"""
-        url = "https://openrouter.ai/api/v1/chat/completions"
+        self._cache.set(prompt_hash, response, kind=kind, provider=self.ai_provider, model=self._current_model())
+
+    def _call_openrouter_api(self, payload: Dict[str, Any], api_key: Optional[str] = None,
+                             monitor: Optional[StreamMonitor] = None) -> Dict[str, Any]:
+        """
+        Calls OpenRouter API with proper error handling.
+        С monitor ответ запрашивается потоком и собирается в тот же формат, что и обычный
+        """
+        url = OPENROUTER_URL
         key = api_key or self.api_key
         if key:
             logger.debug(f"Вызов OpenRouter API с ключом: {key[:5]}...")
         else:
             logger.warning("Вызов OpenRouter API без ключа")
             raise ValueError("API key is required for OpenRouter API calls")
-        headers = {
-            "Authorization": f"Bearer {key}" if key else "",
-            "Content-Type": "application/json",
-            "HTTP-Referer": self.site_url,
-            "X-Title": self.site_name,
-        }
+        headers = self._openrouter_headers(key)
+        if monitor is not None:
+            payload = dict(payload, stream=True)
+        try:
+            response = http_client.post(url, headers=headers, json=payload, timeout=30,
+                                        **self._stream_kwargs(monitor))
+        except requests.exceptions.RequestException:
+            key_pool.failure("openrouter", key)
+            raise
+        self._report_key("openrouter", key, response.status_code, response.headers, self._error_body(response))
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
             response.raise_for_status()
-            return response.json()
         except requests.exceptions.HTTPError as e:
             logger.error(f"OpenRouter API error: {e} {getattr(e.response, 'text', '')}")
             raise
+        if monitor is not None and is_event_stream(response.headers):
+            text = self._read_stream(response, monitor, openrouter_delta, "openrouter", key)
+            return {"choices": [{"message": {"content": text}}]}
+        return response.json()
+
+    @staticmethod
+    def _stream_kwargs(monitor: Optional[StreamMonitor]) -> Dict[str, Any]:
+        return {'stream': True} if monitor is not None else {}
+
+    @staticmethod
+    def _error_body(response: Any) -> str:
+        """Тело ответа для разбора 429; тело успешного потокового ответа читается отдельно"""
+        return response.text if response.status_code >= 400 else ''
+
+    @staticmethod
+    def _read_stream(response: Any, monitor: StreamMonitor, delta: Callable[[Dict[str, Any]], str],
+                     provider: str, key: str) -> str:
+        """Читает поток SSE; при GenerationRejected соединение закрывается и генерация прерывается"""
+        try:
+            for event in sse_events(response.iter_lines()):
+                monitor.feed(delta(event))
+        except requests.exceptions.RequestException:
+            key_pool.failure(provider, key)
+            raise
+        finally:
+            response.close()
+        return monitor.finish()
+
+    @staticmethod
+    def _report_key(provider: str, key: str, status_code: int, headers: Any, body: str) -> None:
+        """Сообщает пулу ключей результат запроса: 429 ставит ключ на паузу, ошибки ведут к отключению"""
+        if status_code == 429:
+            key_pool.rate_limited(provider, key, headers, body)
+        elif status_code >= 400:
+            key_pool.failure(provider, key)
+        else:
+            key_pool.success(provider, key, headers)
+
+    def _openrouter_headers(self, key: Optional[str]) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {key}" if key else "",
+            "Content-Type": "application/json",
+            "HTTP-Referer": self.site_url,
+            "X-Title": self.site_name,
+        }
+
+    def _gemini_request(self, prompt: str, stream: bool = False) -> Tuple[str, Dict[str, Any]]:
+        """URL и тело запроса generateContent (или streamGenerateContent в формате SSE) для Gemini"""
+        base = f"https://generativelanguage.googleapis.com/v1/models/{self.gemini_model}"
+        if stream:
+            url = f"{base}:streamGenerateContent?alt=sse&key={self.gemini_api_key}"
+        else:
+            url = f"{base}:generateContent?key={self.gemini_api_key}"
+        data = {
+            "contents": [
+                {"parts": [{"text": prompt}]}
+            ]
+        }
+        return url, data
+
+    def _openrouter_payload(self, prompt: str, max_tokens: int, temperature: float) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+
+    @staticmethod
+    def _gemini_text(result: Dict[str, Any]) -> str:
+        return result.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
 
     # Используем внешние функции вместо методов класса
     def _clean_summary(self, summary: Optional[str]) -> str:
@@ -79,8 +201,13 @@ class AIService:
     def _fix_political_references(self, text: str) -> str:
         return fix_political_references(text)
         
-    def build_summary_prompt(self, article_data: Dict[str, Any], style: str) -> str:
-        """Builds a prompt for article summarization"""
+    def build_summary_prompt(self, article_data: Dict[str, Any], style: str, reserve_tokens: int = 0) -> str:
+        """
+        Builds a prompt for article summarization.
+        Если запрос не помещается в бюджет токенов модели (prompt_token_budget),
+        текст статьи сокращается экстрактивно: начало, предложения с цифрами и цитаты.
+        reserve_tokens - сколько бюджета оставить для дописываемого к запросу текста
+        """
         title = article_data.get('title', '')
         content = article_data.get('content', '')
         quotes = article_data.get('quotes', [])
@@ -89,6 +216,20 @@ class AIService:
             important_quotes = [q for q in quotes if len(q) > 30][:3]
             if important_quotes:
                 quotes_text = "\n\nВажные цитаты:\n" + "\n".join([f'- \"{q}\"' for q in important_quotes])
+        prompt = self._render_summary_prompt(title, content, quotes_text, style)
+        budget = prompt_token_budget(self._current_model()) - reserve_tokens
+        prompt_tokens = estimate_tokens(prompt)
+        if prompt_tokens <= budget:
+            return prompt
+        content_tokens = estimate_tokens(content)
+        content_budget = max(MIN_CONTENT_TOKENS, budget - (prompt_tokens - content_tokens))
+        trimmed = trim_to_budget(content, content_budget, title=title, quotes=quotes)
+        logger.info(f"Prompt over budget ({prompt_tokens} > {budget} tokens), "
+                    f"article trimmed from {content_tokens} to {estimate_tokens(trimmed)} tokens")
+        return self._render_summary_prompt(title, trimmed, quotes_text, style)
+
+    @staticmethod
+    def _render_summary_prompt(title: str, content: str, quotes_text: str, style: str) -> str:
         if style == "engaging":
             prompt = f"""Ты - редактор финансового новостного канала. Твоя задача - создать лаконичную новостную сводку для Telegram-канала.
 
@@ -160,84 +301,280 @@ class AIService:
 Только текст сводки в указанном формате:"""
         return prompt
 
-    def summarize_article(self, article_data: Dict, style: str = "engaging") -> Optional[str]:
+    def _streamed(self, generate: Callable[[Optional[StreamMonitor]], Optional[str]], check_header: bool,
+                  usage: Optional[Dict[str, Any]]) -> Optional[str]:
+        """
+        Выполняет запрос потоком. С check_header ответ с неподходящей первой строкой
+        (нет эмодзи или хештега) обрывается и сразу запрашивается заново, до AI_STREAM_RETRIES раз;
+        последняя попытка не обрывается, чтобы результат был не хуже, чем без проверки.
+        usage получает ttft - время до первого токена принятого ответа
+        """
+        if not AI_STREAMING:
+            return generate(None)
+        retries = AI_STREAM_RETRIES if check_header else 0
+        for attempt in range(retries + 1):
+            monitor = StreamMonitor(check_header=attempt < retries)
+            try:
+                text = generate(monitor)
+            except GenerationRejected as e:
+                logger.warning(f"Генерация оборвана, повторяем запрос ({attempt + 1}/{retries}): {e}")
+                continue
+            self._record_ttft(usage, monitor)
+            return text
+        return None
+
+    async def _astreamed(self, generate: Callable[[Optional[StreamMonitor]], Awaitable[Optional[str]]],
+                         check_header: bool, usage: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Асинхронный аналог _streamed"""
+        if not AI_STREAMING:
+            return await generate(None)
+        retries = AI_STREAM_RETRIES if check_header else 0
+        for attempt in range(retries + 1):
+            monitor = StreamMonitor(check_header=attempt < retries)
+            try:
+                text = await generate(monitor)
+            except GenerationRejected as e:
+                logger.warning(f"Генерация оборвана, повторяем запрос ({attempt + 1}/{retries}): {e}")
+                continue
+            self._record_ttft(usage, monitor)
+            return text
+        return None
+
+    @staticmethod
+    def _record_ttft(usage: Optional[Dict[str, Any]], monitor: StreamMonitor) -> None:
+        # При дублировании запроса первым записывает свой TTFT ответ, пришедший раньше
+        if usage is not None and monitor.ttft is not None:
+            usage.setdefault('ttft', round(monitor.ttft, 3))
+
+    def _gemini_call(self, prompt: str, monitor: Optional[StreamMonitor] = None) -> Optional[str]:
+        url, data = self._gemini_request(prompt, stream=monitor is not None)
+        try:
+            resp = http_client.post(url, json=data, timeout=15, **self._stream_kwargs(monitor))
+        except requests.exceptions.RequestException:
+            key_pool.failure("gemini", self.gemini_api_key)
+            raise
+        self._report_key("gemini", self.gemini_api_key, resp.status_code, resp.headers, self._error_body(resp))
+        if resp.status_code == 200:
+            if monitor is not None and is_event_stream(resp.headers):
+                return self._read_stream(resp, monitor, gemini_delta, "gemini", self.gemini_api_key) or None
+            text = self._gemini_text(resp.json())
+            if text:
+                return text
+        logger.error(f"Gemini API error: {resp.status_code} {resp.text}")
+        return None
+
+    def _gemini_generate(self, prompt: str, check_header: bool = False,
+                         usage: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        return self._streamed(functools.partial(self._gemini_call, prompt), check_header, usage)
+
+    def _openrouter_generate(self, payload: Dict[str, Any], key: str, check_header: bool = False,
+                             usage: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        def generate(monitor: Optional[StreamMonitor]) -> Optional[str]:
+            result = self._call_openrouter_api(payload, api_key=key, monitor=monitor)
+            return result["choices"][0]["message"]["content"]
+        return self._streamed(generate, check_header, usage)
+
+    async def _aread_stream(self, resp: httpx.Response, monitor: StreamMonitor,
+                            delta: Callable[[Dict[str, Any]], str]) -> str:
+        async for event in asse_events(resp.aiter_lines()):
+            monitor.feed(delta(event))
+        return monitor.finish()
+
+    async def _agemini_call(self, client: AsyncPooledHTTPClient, prompt: str,
+                            monitor: Optional[StreamMonitor] = None) -> Optional[str]:
+        if monitor is None:
+            url, data = self._gemini_request(prompt)
+            try:
+                resp = await client.post(url, json=data, timeout=15)
+            except httpx.HTTPError:
+                key_pool.failure("gemini", self.gemini_api_key)
+                raise
+            return self._agemini_result(resp, self._gemini_text(resp.json()) if resp.status_code == 200 else None)
+        url, data = self._gemini_request(prompt, stream=True)
+        try:
+            async with client.stream('POST', url, json=data, timeout=15) as resp:
+                if resp.status_code != 200 or not is_event_stream(resp.headers):
+                    await resp.aread()
+                    text = self._gemini_text(resp.json()) if resp.status_code == 200 else None
+                    return self._agemini_result(resp, text)
+                self._report_key("gemini", self.gemini_api_key, resp.status_code, resp.headers, '')
+                return await self._aread_stream(resp, monitor, gemini_delta) or None
+        except httpx.TransportError:
+            key_pool.failure("gemini", self.gemini_api_key)
+            raise
+
+    def _agemini_result(self, resp: httpx.Response, text: Optional[str]) -> Optional[str]:
+        self._report_key("gemini", self.gemini_api_key, resp.status_code, resp.headers, resp.text)
+        if text:
+            return text
+        logger.error(f"Gemini API error: {resp.status_code} {resp.text}")
+        return None
+
+    async def _agemini_generate(self, client: AsyncPooledHTTPClient, prompt: str, check_header: bool = False,
+                                usage: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        return await self._astreamed(functools.partial(self._agemini_call, client, prompt), check_header, usage)
+
+    async def _aopenrouter_call(self, client: AsyncPooledHTTPClient, payload: Dict[str, Any], key: str,
+                                monitor: Optional[StreamMonitor] = None) -> Optional[str]:
+        headers = self._openrouter_headers(key)
+        if monitor is None:
+            try:
+                resp = await client.post(OPENROUTER_URL, headers=headers, json=payload, timeout=30)
+            except httpx.HTTPError:
+                key_pool.failure("openrouter", key)
+                raise
+            self._report_key("openrouter", key, resp.status_code, resp.headers, resp.text)
+            resp.raise_for_status()
+            return resp.json()["choices"][0]["message"]["content"]
+        try:
+            async with client.stream('POST', OPENROUTER_URL, headers=headers, json=dict(payload, stream=True),
+                                     timeout=30) as resp:
+                if resp.status_code >= 400 or not is_event_stream(resp.headers):
+                    await resp.aread()
+                    self._report_key("openrouter", key, resp.status_code, resp.headers, resp.text)
+                    resp.raise_for_status()
+                    return resp.json()["choices"][0]["message"]["content"]
+                self._report_key("openrouter", key, resp.status_code, resp.headers, '')
+                return await self._aread_stream(resp, monitor, openrouter_delta)
+        except httpx.TransportError:
+            key_pool.failure("openrouter", key)
+            raise
+
+    async def _aopenrouter_generate(self, client: AsyncPooledHTTPClient, payload: Dict[str, Any], key: str,
+                                    check_header: bool = False,
+                                    usage: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        return await self._astreamed(functools.partial(self._aopenrouter_call, client, payload, key),
+                                     check_header, usage)
+
+    def _routed_providers(self) -> List[str]:
+        """Провайдеры, между которыми выбирает маршрутизатор: все настроенные или только выбранный"""
+        if self.ai_provider not in ("gemini", "openrouter"):
+            logger.error(f"Unknown ai_provider: {self.ai_provider}")
+            return []
+        if not AI_ROUTING:
+            return [self.ai_provider]
+        return [self.ai_provider] + [p for p in ("openrouter", "gemini") if p != self.ai_provider]
+
+    def _configured_keys(self) -> List[Tuple[str, str]]:
+        """(провайдер, ключ) для всех настроенных ключей в порядке маршрутизации"""
+        keys: List[Tuple[str, str]] = []
+        for provider in self._routed_providers():
+            if provider == "gemini":
+                if self.gemini_api_key:
+                    keys.append(("gemini", self.gemini_api_key))
+            else:
+                keys.extend(("openrouter", key) for key in [self.api_key, self.backup_key, self.backup_key2] if key)
+        return keys
+
+    def _local_fallback_reason(self, attempts: List[Attempt]) -> Optional[str]:
+        """
+        Почему статью лучше резюмировать локально: все настроенные ключи на паузе
+        или маршрутизатор перегружен (см. ProviderRouter.overload_reason).
+        Без настроенных ключей локальное резюме не подставляется - это ошибка настройки
+        """
+        if not AI_LOCAL_FALLBACK:
+            return None
+        if not attempts:
+            return "all LLM keys are rate limited or disabled" if self._configured_keys() else None
+        return llm_router.overload_reason(attempts)
+
+    def _attempts(self, prompt: str, max_tokens: int, temperature: float,
+                  client: Optional[AsyncPooledHTTPClient] = None, check_header: bool = False,
+                  usage: Optional[Dict[str, Any]] = None) -> List[Attempt]:
+        """
+        Эндпоинты для запроса: Gemini и каждый ключ OpenRouter, кроме ключей
+        на паузе после 429 или с открытым автоматом (см. KeyPool).
+        С client вызовы возвращают корутины для асинхронного маршрутизатора.
+        check_header и usage передаются в _streamed
+        """
+        attempts: List[Attempt] = []
+        configured = self._configured_keys()
+        stream_args = {'check_header': check_header, 'usage': usage}
+        payload = self._openrouter_payload(prompt, max_tokens, temperature)
+        for provider, key in configured:
+            if not key_pool.available(provider, key):
+                continue
+            if provider == "gemini":
+                call = (functools.partial(self._agemini_generate, client, prompt, **stream_args) if client
+                        else functools.partial(self._gemini_generate, prompt, **stream_args))
+                attempts.append(Attempt(endpoint_name("gemini", self.gemini_model, key), "gemini", call))
+            else:
+                call = (functools.partial(self._aopenrouter_generate, client, payload, key, **stream_args)
+                        if client else functools.partial(self._openrouter_generate, payload, key, **stream_args))
+                attempts.append(Attempt(endpoint_name("openrouter", self.model, key), "openrouter", call))
+        if not attempts and configured:
+            logger.warning(f"All {len(configured)} LLM keys are rate limited or disabled, skipping request")
+        elif not attempts and self.ai_provider in ("gemini", "openrouter"):
+            env_name = "GEMINI_API_KEY" if self.ai_provider == "gemini" else "OPENROUTER_API_KEY"
+            logger.error(f"Cannot generate: {env_name} not set")
+        return attempts
+
+    def _generate_text(self, prompt: str, max_tokens: int = 500, temperature: float = 0.7,
+                       check_header: bool = False, usage: Optional[Dict[str, Any]] = None,
+                       allow_local: bool = False) -> Optional[str]:
+        """
+        Отправляет запрос самому быстрому работающему эндпоинту (провайдер и ключ)
+        и возвращает текст ответа. При ошибке пробуются остальные эндпоинты,
+        медленный ответ дублируется другому провайдеру (см. ProviderRouter).
+        check_header - обрывать и перезапрашивать ответ без эмодзи и хештегов в первой строке.
+        allow_local - бросать LLMUnavailable, если резюме лучше создать локально
+        """
+        attempts = self._attempts(prompt, max_tokens, temperature, check_header=check_header, usage=usage)
+        if allow_local:
+            reason = self._local_fallback_reason(attempts)
+            if reason:
+                raise LLMUnavailable(reason)
+        if not attempts:
+            return None
+        if has_app_context():
+            llm_router.ensure_seeded()
+        return llm_router.run(attempts, preferred=self.ai_provider)
+
+    async def agenerate_text(self, client: AsyncPooledHTTPClient, prompt: str, max_tokens: int = 500,
+                             temperature: float = 0.7, check_header: bool = False,
+                             usage: Optional[Dict[str, Any]] = None, allow_local: bool = False) -> Optional[str]:
+        """Асинхронный аналог _generate_text через общий асинхронный HTTP-клиент"""
+        attempts = self._attempts(prompt, max_tokens, temperature, client=client, check_header=check_header,
+                                  usage=usage)
+        if allow_local:
+            reason = self._local_fallback_reason(attempts)
+            if reason:
+                raise LLMUnavailable(reason)
+        if not attempts:
+            return None
+        return await llm_router.arun(attempts, preferred=self.ai_provider)
+
+    def summarize_article(self, article_data: Dict, style: str = "engaging",
+                          usage: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """usage, если передан, получает prompt_tokens отправленного запроса и ttft ответа"""
         start_time = time.time()
         prompt = self.build_summary_prompt(article_data, style)
         
         # Проверяем кэш
-        prompt_hash = self._get_prompt_hash(prompt)
+        prompt_hash = self._get_cache_key('summary', article_data, style=style, temperature=0.7)
         cached_response = self._get_cached_response(prompt_hash)
         if cached_response:
             logger.info(f"Используем кэшированный ответ для резюме (хэш: {prompt_hash[:8]})")
             return cached_response
-            
-        if self.ai_provider == "gemini":
-            api_key = self.gemini_api_key
-            if not api_key:
-                logger.error("Cannot summarize: GEMINI_API_KEY not set")
-                return None
-            url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash-001:generateContent?key={api_key}"
-            data = {
-                "contents": [
-                    {"parts": [{"text": prompt}]}
-                ]
-            }
-            try:
-                resp = requests.post(url, json=data, timeout=15)
-                if resp.status_code == 200:
-                    result = resp.json()
-                    summary = result.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-                    if summary:
-                        cleaned_summary = self._clean_summary(summary)
-                        # Сохраняем в кэш
-                        self._cache_response(prompt_hash, cleaned_summary)
-                        
-                        # Логируем время выполнения
-                        execution_time = time.time() - start_time
-                        logger.info(f"Gemini API: сгенерировано резюме за {execution_time:.2f}с")
-                        
-                        return cleaned_summary
-                logger.error(f"Gemini API error: {resp.status_code} {resp.text}")
-                return None
-            except Exception as e:
-                logger.error(f"Gemini API exception: {e}")
-                return None
-        elif self.ai_provider == "openrouter":
-            if not self.api_key:
-                logger.error("Cannot summarize: OPENROUTER_API_KEY not set")
-                return None
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 500,
-                "temperature": 0.7
-            }
-            for key in [self.api_key, self.backup_key, self.backup_key2]:
-                if not key:
-                    continue
-                try:
-                    result = self._call_openrouter_api(payload, api_key=key)
-                    logger.warning(f"OpenRouter success with key {key[:12] if key else 'None'}...")  # Покажет первые символы ключа
-                    response_content = result["choices"][0]["message"]["content"]
-                    if response_content:
-                        cleaned_summary = self._clean_summary(response_content.strip())
-                        # Сохраняем в кэш
-                        self._cache_response(prompt_hash, cleaned_summary)
-                        
-                        # Логируем время выполнения
-                        execution_time = time.time() - start_time
-                        logger.info(f"OpenRouter API: сгенерировано резюме за {execution_time:.2f}с")
-                        
-                        return cleaned_summary
-                except Exception as e:
-                    logger.warning(f"OpenRouter error with key {key[:12] if key else 'None'}...: {e}")
-                    continue
-            return None
-        else:
-            logger.error(f"Unknown ai_provider: {self.ai_provider}")
+        
+        self._record_usage(usage, prompt)
+        try:
+            response_content = self._generate_text(prompt, max_tokens=500, temperature=0.7,
+                                                   check_header=True, usage=usage, allow_local=True)
+        except LLMUnavailable as e:
+            return self.summarize_locally(article_data, usage=usage, reason=str(e))[0]
+        if not response_content:
             return None
+        
+        cleaned_summary = self._clean_summary(response_content.strip())
+        # Сохраняем в кэш
+        self._cache_response(prompt_hash, cleaned_summary, kind='summary')
+        
+        # Логируем время выполнения
+        execution_time = time.time() - start_time
+        logger.info(f"{self.ai_provider}: сгенерировано резюме за {execution_time:.2f}с")
+        
+        return cleaned_summary
 
     def build_hashtag_prompt(self, article_data: Dict[str, Any], custom_tags: str = "") -> str:
         """Builds a prompt for hashtag generation"""
@@ -261,100 +598,325 @@ class AIService:
 Только строку с эмодзи и хештегами:"""
         return prompt
 
+    def _finalize_hashtag_line(self, hashtag_line: str, article_data: Dict, custom_tags: str = "") -> str:
+        """Добавляет эмодзи по теме, если модель его не поставила, и пользовательские хештеги"""
+        hashtag_line = hashtag_line.strip()
+        content = article_data.get('content', '')[:1000]
+        if not EMOJI_PATTERN.search(hashtag_line):
+            if any(word in content.lower() for word in ['россия', 'рф', 'рубль', 'газпром']):
+                hashtag_line = '🇷🇺' + hashtag_line
+            elif any(word in content.lower() for word in ['сша', 'доллар', 'фрс']):
+                hashtag_line = '🇺🇸' + hashtag_line
+            elif any(word in content.lower() for word in ['китай', 'юань']):
+                hashtag_line = '🇨🇳' + hashtag_line
+            else:
+                hashtag_line = '💰' + hashtag_line
+        if custom_tags:
+            custom_list = [tag.strip() for tag in custom_tags.split() if tag.strip().startswith('#')]
+            if custom_list:
+                hashtag_line += ' ' + ' '.join(custom_list)
+        return hashtag_line
+
     def generate_hashtags(self, article_data: Dict, custom_tags: str = "") -> List[str]:
         start_time = time.time()
         prompt = self.build_hashtag_prompt(article_data, custom_tags)
         
         # Проверяем кэш
-        prompt_hash = self._get_prompt_hash(prompt, temperature=0.5)
+        prompt_hash = self._get_cache_key('hashtags', article_data, style=custom_tags, temperature=0.5)
         cached_response = self._get_cached_response(prompt_hash)
         if cached_response:
             logger.info(f"Используем кэшированный ответ для хештегов (хэш: {prompt_hash[:8]})")
             return [cached_response]
-            
-        if self.ai_provider == "gemini":
-            api_key = self.gemini_api_key
-            if not api_key:
-                logger.warning("Cannot generate hashtags: GEMINI_API_KEY not set")
-                return self._fallback_hashtags(article_data, custom_tags)
-            url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash-001:generateContent?key={api_key}"
-            data = {
-                "contents": [
-                    {"parts": [{"text": prompt}]}
-                ]
-            }
-            try:
-                resp = requests.post(url, json=data, timeout=15)
-                if resp.status_code == 200:
-                    result = resp.json()
-                    hashtags = result.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-                    if hashtags:
-                        hashtag_line = hashtags.strip()
-                        # Сохраняем в кэш
-                        self._cache_response(prompt_hash, hashtag_line)
-                        
-                        # Логируем время выполнения
-                        execution_time = time.time() - start_time
-                        logger.info(f"Gemini API: сгенерированы хештеги за {execution_time:.2f}с")
-                        
-                        return [hashtag_line]
-                logger.error(f"Gemini API error: {resp.status_code} {resp.text}")
-                return self._fallback_hashtags(article_data, custom_tags)
-            except Exception as e:
-                logger.error(f"Gemini API exception: {e}")
-                return self._fallback_hashtags(article_data, custom_tags)
-        elif self.ai_provider == "openrouter":
-            if not self.api_key:
-                logger.warning("Cannot generate hashtags: OPENROUTER_API_KEY not set")
-                return self._fallback_hashtags(article_data, custom_tags)
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 150,
-                "temperature": 0.5
-            }
-            for key in [self.api_key, self.backup_key, self.backup_key2]:
-                if not key:
-                    continue
-                try:
-                    result = self._call_openrouter_api(payload, api_key=key)
-                    hashtags_text = result["choices"][0]["message"]["content"].strip()
-                    if hashtags_text:
-                        lines = hashtags_text.split('\n')
-                        hashtag_line = lines[0].strip()
-                        content = article_data.get('content', '')[:1000]
-                        if not re.search(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]', hashtag_line):
-                            if any(word in content.lower() for word in ['россия', 'рф', 'рубль', 'газпром']):
-                                hashtag_line = '🇷🇺' + hashtag_line
-                            elif any(word in content.lower() for word in ['сша', 'доллар', 'фрс']):
-                                hashtag_line = '🇺🇸' + hashtag_line
-                            elif any(word in content.lower() for word in ['китай', 'юань']):
-                                hashtag_line = '🇨🇳' + hashtag_line
-                            else:
-                                hashtag_line = '💰' + hashtag_line
-                        if custom_tags:
-                            custom_list = [tag.strip() for tag in custom_tags.split() if tag.strip().startswith('#')]
-                            if custom_list:
-                                hashtag_line += ' ' + ' '.join(custom_list)
-                                
-                        # Сохраняем в кэш
-                        self._cache_response(prompt_hash, hashtag_line)
-                        
-                        # Логируем время выполнения
-                        execution_time = time.time() - start_time
-                        logger.info(f"OpenRouter API: сгенерированы хештеги за {execution_time:.2f}с")
-                        
-                        return [hashtag_line]
-                    return self._fallback_hashtags(article_data, custom_tags)
-                except Exception as e:
-                    logger.warning(f"OpenRouter error with key {key[:8] if key else 'None'}...: {e}")
-                    continue
+        
+        hashtags_text = self._generate_text(prompt, max_tokens=150, temperature=0.5)
+        if not hashtags_text or not hashtags_text.strip():
             return self._fallback_hashtags(article_data, custom_tags)
+        
+        hashtag_line = self._finalize_hashtag_line(hashtags_text.strip().split('\n')[0], article_data, custom_tags)
+        
+        # Сохраняем в кэш
+        self._cache_response(prompt_hash, hashtag_line, kind='hashtags')
+        
+        # Логируем время выполнения
+        execution_time = time.time() - start_time
+        logger.info(f"{self.ai_provider}: сгенерированы хештеги за {execution_time:.2f}с")
+        
+        return [hashtag_line]
+
+    def build_combined_prompt(self, article_data: Dict[str, Any], style: str) -> str:
+        """Builds a prompt that asks for the hashtag line and the summary in one response"""
+        prompt = self.build_summary_prompt(article_data, style, reserve_tokens=estimate_tokens(COMBINED_FORMAT))
+        return prompt + COMBINED_FORMAT
+
+    @staticmethod
+    def _record_usage(usage: Optional[Dict[str, Any]], prompt: str) -> None:
+        """Размер отправленного запроса для AnalyticsData.prompt_tokens"""
+        if usage is not None:
+            usage['prompt_tokens'] = estimate_tokens(prompt)
+
+    def _parse_combined_response(self, text: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Разбирает ответ комбинированного запроса на строку хештегов и текст резюме.
+        Если модель не соблюла разметку, весь ответ считается резюме,
+        а строка хештегов берется из его первой строки
+        """
+        text = text.strip()
+        hashtags_match = COMBINED_HASHTAGS_RE.search(text)
+        summary_match = COMBINED_SUMMARY_RE.search(text)
+        if summary_match:
+            summary = summary_match.group(1).strip()
         else:
-            logger.error(f"Unknown ai_provider: {self.ai_provider}")
-            return self._fallback_hashtags(article_data, custom_tags)
+            summary = COMBINED_HASHTAGS_RE.sub('', text, count=1).strip()
+        if hashtags_match:
+            hashtag_line = hashtags_match.group(1).strip()
+        else:
+            first_line = summary.split('\n')[0] if summary else ''
+            hashtag_line = ''.join(EMOJI_PATTERN.findall(first_line[:10])) + ' '.join(re.findall(r'#\w+', first_line))
+        # Строка хештегов валидна, только если в ней есть хотя бы один хештег
+        if not re.search(r'#\w+', hashtag_line):
+            hashtag_line = None
+        return hashtag_line, summary or None
+
+    def summarize_with_hashtags(self, article_data: Dict, style: str = "engaging",
+                                custom_tags: str = "", usage: Optional[Dict[str, Any]] = None
+                                ) -> Tuple[Optional[str], List[str]]:
+        """
+        Генерирует резюме и строку хештегов одним запросом к LLM.
+        Возвращает (резюме, [строка хештегов]); хештеги из _fallback_hashtags
+        используются, только если модель не вернула валидную строку.
+        usage, если передан, получает prompt_tokens отправленного запроса и ttft ответа
+        """
+        start_time = time.time()
+        cached = self._cached_combined(article_data, style, custom_tags)
+        if cached:
+            return cached
+        
+        prompt = self.build_combined_prompt(article_data, style)
+        self._record_usage(usage, prompt)
+        try:
+            response_content = self._generate_text(prompt, max_tokens=600, temperature=0.7,
+                                                   check_header=True, usage=usage, allow_local=True)
+        except LLMUnavailable as e:
+            return self.summarize_locally(article_data, custom_tags, usage=usage, reason=str(e))
+        result = self._finish_combined(response_content, article_data, style, custom_tags)
+        
+        execution_time = time.time() - start_time
+        logger.info(f"{self.ai_provider}: сгенерированы резюме и хештеги одним запросом за {execution_time:.2f}с")
+        
+        return result
+
+    async def asummarize_with_hashtags(self, client: AsyncPooledHTTPClient, article_data: Dict,
+                                       style: str = "engaging", custom_tags: str = "",
+                                       run_db: Optional[Callable[..., Awaitable[Any]]] = None,
+                                       usage: Optional[Dict[str, Any]] = None
+                                       ) -> Tuple[Optional[str], List[str]]:
+        """
+        Асинхронный аналог summarize_with_hashtags.
+        run_db выполняет работу с кэшем в базе вне цикла событий
+        """
+        async def db_call(func, *args):
+            if run_db:
+                return await run_db(func, *args)
+            return func(*args)
+
+        cached = await db_call(self._cached_combined, article_data, style, custom_tags)
+        if cached:
+            return cached
+        if not llm_router.seeded:
+            await db_call(llm_router.ensure_seeded)
+        prompt = self.build_combined_prompt(article_data, style)
+        self._record_usage(usage, prompt)
+        try:
+            response_content = await self.agenerate_text(client, prompt, max_tokens=600, temperature=0.7,
+                                                         check_header=True, usage=usage, allow_local=True)
+        except LLMUnavailable as e:
+            return self.summarize_locally(article_data, custom_tags, usage=usage, reason=str(e))
+        return await db_call(self._finish_combined, response_content, article_data, style, custom_tags)
+
+    def summarize_locally(self, article_data: Dict, custom_tags: str = "", usage: Optional[Dict[str, Any]] = None,
+                          reason: str = "") -> Tuple[Optional[str], List[str]]:
+        """
+        Резюме и хештеги без LLM: предложения статьи выбирает ExtractiveSummarizer,
+        эмодзи первой строки - topic_emoji из fix_political_references, хештеги - _fallback_hashtags.
+        В кэш не сохраняется, чтобы при перегенерации статья получила резюме от LLM.
+        usage получает provider="local" для аналитики
+        """
+        title = article_data.get('title', '') or ''
+        content = article_data.get('content', '') or ''
+        if reason:
+            logger.warning(f"LLM недоступна ({reason}), резюме создается локально")
+        topic_tags = re.findall(r'#\w+', self._fallback_hashtags(article_data)[0])
+        header = topic_emoji(f"{title} {content}") + ' ' + ' '.join(topic_tags)
+        summary = local_summarizer.summarize(title, content, header)
+        if summary and not self._validate_summary_quality(summary):
+            summary = None
+        if usage is not None:
+            # Запрос к LLM не отправлялся
+            usage.pop('prompt_tokens', None)
+            usage['provider'] = LOCAL_PROVIDER
+        return summary, self._fallback_hashtags(article_data, custom_tags)
+
+    def _cached_combined(self, article_data: Dict, style: str,
+                         custom_tags: str) -> Optional[Tuple[str, List[str]]]:
+        """Резюме и хештеги из кэша, если есть оба"""
+        summary_key = self._get_cache_key('summary', article_data, style=style, temperature=0.7)
+        hashtags_key = self._get_cache_key('hashtags', article_data, style=custom_tags, temperature=0.5)
+        cached_summary = self._get_cached_response(summary_key)
+        cached_hashtags = self._get_cached_response(hashtags_key)
+        if cached_summary and cached_hashtags:
+            logger.info(f"Используем кэшированные резюме и хештеги (хэш: {summary_key[:8]})")
+            return cached_summary, [cached_hashtags]
+        return None
+
+    def _finish_combined(self, response_content: Optional[str], article_data: Dict, style: str,
+                         custom_tags: str) -> Tuple[Optional[str], List[str]]:
+        """Разбирает комбинированный ответ и сохраняет результат в кэш"""
+        if not response_content:
+            return None, self._fallback_hashtags(article_data, custom_tags)
+        
+        summary_key = self._get_cache_key('summary', article_data, style=style, temperature=0.7)
+        hashtags_key = self._get_cache_key('hashtags', article_data, style=custom_tags, temperature=0.5)
+        hashtag_line, raw_summary = self._parse_combined_response(response_content)
+        
+        cleaned_summary = self._clean_summary(raw_summary)
+        self._cache_response(summary_key, cleaned_summary, kind='summary')
+        
+        if hashtag_line:
+            hashtags = [self._finalize_hashtag_line(hashtag_line, article_data, custom_tags)]
+            self._cache_response(hashtags_key, hashtags[0], kind='hashtags')
+        else:
+            logger.warning("Комбинированный ответ без строки хештегов, используем резервные хештеги")
+            hashtags = self._fallback_hashtags(article_data, custom_tags)
+        
+        return cleaned_summary, hashtags
+
+    def build_batch_prompt(self, articles: List[Dict[str, Any]], style: str) -> str:
+        """Builds a prompt that summarizes several short articles at once"""
+        style_hint = BATCH_STYLE_HINTS.get(style, BATCH_STYLE_HINTS['default'])
+        blocks = []
+        for index, article_data in enumerate(articles, 1):
+            blocks.append(f"=== СТАТЬЯ {index} ===\n"
+                          f"Заголовок: {article_data.get('title', '')}\n"
+                          f"Содержание: {article_data.get('content', '')}")
+        articles_text = "\n\n".join(blocks)
+        return f"""Ты - редактор финансового новостного канала. Создай отдельную сводку для Telegram-канала для каждой из {len(articles)} новостей ниже. Стиль: {style_hint}.
+
+{articles_text}
+
+ТРЕБОВАНИЯ К КАЖДОЙ СВОДКЕ:
+1. Начни с 1-2 эмодзи по теме (🇷🇺 для России, 🇺🇸 для США, 📊 для рынков), сразу после них хештеги (#компания #тема #регион)
+2. Основной текст краткий и информативный (2-4 предложения), абзацы разделяй пустой строкой
+3. Указывай конкретные цифры, проценты и факты
+4. ВАЖНО: Дональд Трамп сейчас действующий президент США (с 2025 года)
+5. Всегда завершай сводку полным предложением
+
+ФОРМАТ ОТВЕТА (строго, для каждой новости в том же порядке и с тем же номером):
+=== СТАТЬЯ N ===
+ХЕШТЕГИ: эмодзи и 3-4 хештега одной строкой
+РЕЗЮМЕ:
+текст сводки"""
+
+    def _parse_batch_response(self, text: str, count: int) -> Dict[int, str]:
+        """Разбивает ответ пакетного запроса на блоки по номерам статей (1..count)"""
+        blocks: Dict[int, str] = {}
+        parts = BATCH_DELIMITER_RE.split(text)
+        # split дает [преамбула, номер, блок, номер, блок, ...]
+        for number, block in zip(parts[1::2], parts[2::2]):
+            index = int(number)
+            if 1 <= index <= count and index not in blocks:
+                blocks[index] = block.strip()
+        return blocks
+
+    def summarize_batch(self, articles: List[Dict], style: str = "engaging", custom_tags: str = "",
+                        usage: Optional[Dict[str, Any]] = None,
+                        article_usage: Optional[Dict[Any, Dict[str, Any]]] = None
+                        ) -> Dict[Any, Tuple[Optional[str], List[str]]]:
+        """
+        Генерирует резюме и хештеги для нескольких коротких статей одним запросом.
+        Возвращает словарь article_id -> (резюме, [строка хештегов]).
+        Статьи, чей блок отсутствует или не прошел validate_summary_quality,
+        отправляются повторно по одной через summarize_with_hashtags.
+        Если LLM недоступна или перегружена (см. _local_fallback_reason), пакет резюмируется локально.
+        usage, если передан, получает prompt_tokens пакетного запроса и ttft ответа.
+        article_usage, если передан, получает usage каждой статьи: для статей из пакета -
+        поровну разделенные prompt_tokens пакета, для повторных запросов - их собственный
+        (в том числе provider="local"), для статей из кэша - пустой словарь
+        """
+        start_time = time.time()
+        results: Dict[Any, Tuple[Optional[str], List[str]]] = {}
+        pending: List[Dict] = []
+        if article_usage is None:
+            article_usage = {}
+        
+        # Статьи из кэша и длинные статьи в пакет не попадают
+        for article_data in articles:
+            summary_key = self._get_cache_key('summary', article_data, style=style, temperature=0.7)
+            hashtags_key = self._get_cache_key('hashtags', article_data, style=custom_tags, temperature=0.5)
+            cached_summary = self._get_cached_response(summary_key)
+            cached_hashtags = self._get_cached_response(hashtags_key)
+            if cached_summary and cached_hashtags:
+                results[article_data.get('article_id')] = (cached_summary, [cached_hashtags])
+                article_usage[article_data.get('article_id')] = {}
+            elif len(article_data.get('content') or '') <= BATCH_MAX_CONTENT_CHARS:
+                pending.append(article_data)
+        
+        failed: List[Dict] = [article_data for article_data in articles
+                              if article_data.get('article_id') not in results and article_data not in pending]
+        
+        if len(pending) > 1:
+            prompt = self.build_batch_prompt(pending, style)
+            batch_usage: Dict[str, Any] = {}
+            self._record_usage(batch_usage, prompt)
+            try:
+                response_content = self._generate_text(prompt, max_tokens=500 * len(pending), temperature=0.7,
+                                                       usage=batch_usage, allow_local=True)
+            except LLMUnavailable as e:
+                # Все ключи на паузе или очередь/задержка LLM выше порогов - весь пакет резюмируется локально
+                logger.warning(f"LLM недоступна ({e}), пакет из {len(pending)} статей резюмируется локально")
+                for article_data in pending:
+                    local_usage: Dict[str, Any] = {}
+                    results[article_data.get('article_id')] = self.summarize_locally(
+                        article_data, custom_tags=custom_tags, usage=local_usage)
+                    article_usage[article_data.get('article_id')] = local_usage
+            else:
+                if usage is not None:
+                    usage.update(batch_usage)
+                # Размер пакетного запроса делим поровну между статьями пакета
+                shared_usage = dict(batch_usage, prompt_tokens=batch_usage['prompt_tokens'] // len(pending))
+                blocks = self._parse_batch_response(response_content or '', len(pending))
+                batched = 0
+                for index, article_data in enumerate(pending, 1):
+                    hashtag_line, raw_summary = self._parse_combined_response(blocks.get(index, ''))
+                    cleaned_summary = self._clean_summary(raw_summary)
+                    if not cleaned_summary or not self._validate_summary_quality(cleaned_summary):
+                        failed.append(article_data)
+                        continue
+                    self._cache_response(
+                        self._get_cache_key('summary', article_data, style=style, temperature=0.7),
+                        cleaned_summary, kind='summary')
+                    if hashtag_line:
+                        hashtags = [self._finalize_hashtag_line(hashtag_line, article_data, custom_tags)]
+                        self._cache_response(
+                            self._get_cache_key('hashtags', article_data, style=custom_tags, temperature=0.5),
+                            hashtags[0], kind='hashtags')
+                    else:
+                        hashtags = self._fallback_hashtags(article_data, custom_tags)
+                    results[article_data.get('article_id')] = (cleaned_summary, hashtags)
+                    article_usage[article_data.get('article_id')] = dict(shared_usage)
+                    batched += 1
+                logger.info(f"{self.ai_provider}: пакет из {len(pending)} статей, {batched} резюме "
+                            f"получено за {time.time() - start_time:.2f}с")
+        else:
+            failed.extend(pending)
+        
+        # Повторно отправляем по одной только неудачные статьи
+        for article_data in failed:
+            single_usage: Dict[str, Any] = {}
+            results[article_data.get('article_id')] = self.summarize_with_hashtags(
+                article_data, style=style, custom_tags=custom_tags, usage=single_usage)
+            article_usage[article_data.get('article_id')] = single_usage
+        
+        return results
 
     def _fallback_hashtags(self, article_data: Dict, custom_tags: str = "") -> List[str]:
         """
@@ -9,6 +9,7 @@ from flask import Flask, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 import requests
+from http_client import http_client
 from werkzeug.middleware.proxy_fix import ProxyFix
 from logging.handlers import RotatingFileHandler
 
@@ -45,7 +46,7 @@ def check_gemini_models():
     api_key = os.getenv("GEMINI_API_KEY")
     url = f"https://generativelanguage.googleapis.com/v1/models?key={api_key}"
     try:
-        resp = requests.get(url, timeout=5)
+        resp = http_client.get(url, timeout=5)
         return resp.text, resp.status_code, {'Content-Type': 'application/json'}
     except requests.exceptions.RequestException as e:
         return {"error": f"Request error: {str(e)}"}, 500
@@ -60,7 +61,7 @@ def check_location():
     gemini_api_key = os.getenv("GEMINI_API_KEY")
     test_url = f"https://generativelanguage.googleapis.com/v1/models?key={gemini_api_key}"
     try:
-        resp = requests.get(test_url, timeout=5)
+        resp = http_client.get(test_url, timeout=5)
         google_status = resp.status_code
     except requests.exceptions.RequestException as e:
         google_status = f"Request error: {str(e)}"
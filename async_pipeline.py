@@ -0,0 +1,389 @@
+# Last modified: 2024-03-26
+import os
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app import app
+from db import db
+from models import BotSettings, SchedulerLease, STATUS_DISCOVERED, STATUS_FETCHED
+from sources import NewsSource, parse_feed
+from dates import DATE_MIN
+from ai_service import AIService
+from llm_router import llm_router
+from http_client import AsyncPooledHTTPClient
+from scheduler import NewsScheduler, LEADER_LEASE_NAME, news_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Сколько статей этап захватывает за раз: все они обрабатываются одновременно
+ASYNC_BATCH_SIZE = int(os.environ.get("PIPELINE_ASYNC_BATCH_SIZE", "100"))
+ASYNC_IDLE_SLEEP = int(os.environ.get("PIPELINE_ASYNC_IDLE_SLEEP", "15"))
+# Заголовки браузера, которые не стоит передавать httpx (сжатие он выбирает сам)
+_SKIPPED_SITE_HEADERS = {'accept-encoding', 'connection'}
+
+
+class AsyncPipelineEngine:
+    """
+    Асинхронный движок конвейера - альтернатива потокам NewsScheduler.
+    Ленты, статьи, LLM-провайдеры и Telegram опрашиваются через один
+    AsyncPooledHTTPClient с семафорами на каждый хост, поэтому один процесс
+    держит сотни запросов в полете. Вся работа с базой идет в одном
+    отдельном потоке с контекстом приложения (у объектов NewsArticle
+    одна сессия), разбор HTML - в пуле потоков цикла событий.
+    Переходы состояний и сохранение результатов берутся у NewsScheduler.
+    """
+
+    def __init__(self, scheduler: Optional[NewsScheduler] = None, batch_size: int = ASYNC_BATCH_SIZE,
+                 idle_sleep: int = ASYNC_IDLE_SLEEP, stage_workers: Optional[Dict[str, int]] = None):
+        self.scheduler = scheduler or news_scheduler
+        self.queue = self.scheduler.queue
+        self.batch_size = batch_size
+        self.idle_sleep = idle_sleep
+        self.stage_workers = {'fetch': 1, 'summarize': 1}
+        if stage_workers:
+            self.stage_workers.update(stage_workers)
+        self.running = False
+        self.client: Optional[AsyncPooledHTTPClient] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline-db",
+                                               initializer=self._push_app_context)
+        self._site_headers = {name: value for name, value in self.scheduler.scraper.session.headers.items()
+                              if name.lower() not in _SKIPPED_SITE_HEADERS}
+
+    @staticmethod
+    def _push_app_context() -> None:
+        # Контекст живет все время жизни потока базы данных
+        app.app_context().push()
+
+    @staticmethod
+    def _call_db(func: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return func(*args)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    async def _db(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Выполняет синхронную работу с базой в потоке базы данных"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, functools.partial(self._call_db, func, *args))
+
+    async def _cpu(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Выполняет разбор HTML в пуле потоков цикла событий"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args))
+
+    async def _sleep(self, seconds: float) -> None:
+        """Пауза, которую прерывает stop()"""
+        if self._stop_event is None:
+            await asyncio.sleep(seconds)
+            return
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _with_client(self, func: Callable[..., Any], *args: Any) -> Any:
+        async with AsyncPooledHTTPClient() as client:
+            self.client = client
+            try:
+                return await func(*args)
+            finally:
+                self.client = None
+
+    async def _fetch_page(self, url: str) -> Optional[bytes]:
+        try:
+            response = await self.client.get(url, headers=self._site_headers, timeout=20)
+            response.raise_for_status()
+            return response.content
+        except Exception as e:
+            logger.error(f"Error downloading {url}: {e}")
+            return None
+
+    # Этапы конвейера
+
+    async def _fetch_listing(self, source: NewsSource, url: str,
+                             parse: Callable[[bytes], List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+        """Условный запрос ленты. None - лента недоступна или пуста, пустой список - не изменилась"""
+        scraper = self.scheduler.scraper
+        try:
+            headers = {**self._site_headers, **scraper.listing_tracker.request_headers(url)}
+            response = await self.client.get(url, headers=headers, timeout=source.timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except Exception as e:
+            logger.error(f"Error downloading {url}: {e}")
+            return None
+        try:
+            return await self._cpu(scraper.changed_listing_items, source, url, response.status_code,
+                                   response.headers, functools.partial(parse, response.content), response.content)
+        except Exception as e:
+            logger.error(f"Error parsing listing {url}: {e}")
+            return None
+
+    async def _discover_source(self, source: NewsSource) -> List[Dict[str, Any]]:
+        """Новости источника: из фида, если он есть, иначе из HTML-ленты"""
+        # Данные прошлого незавершенного опроса не должны попасть в commit() этого
+        self.scheduler.scraper.listing_tracker.discard([source])
+        items = None
+        if source.feed_url:
+            items = await self._fetch_listing(
+                source, source.feed_url,
+                lambda content: parse_feed([content], source.limit, source.url, source.link_pattern))
+        if items is None and source.has_listing:
+            items = await self._fetch_listing(
+                source, source.url, functools.partial(self.scheduler.scraper.parse_source, source))
+        return items or []
+
+    async def discover(self, force: bool = False) -> Tuple[int, int, int, Dict[str, float]]:
+        """Загружает ленты источников, у которых истек интервал опроса, и ставит новые статьи в очередь"""
+        stage_times = {}
+        sources = self.scheduler.due_sources(force)
+        if not sources:
+            return 0, 0, 0, stage_times
+        stage_start = time.time()
+        news_items: List[Dict[str, Any]] = []
+        results = await asyncio.gather(*(self._discover_source(source) for source in sources))
+        for source, items in zip(sources, results):
+            self.scheduler.poller.observe(source, items)
+            news_items += items
+        news_items.sort(key=lambda x: x.get('published_at') or DATE_MIN, reverse=True)
+        stage_times['listing'] = time.time() - stage_start
+
+        stage_start = time.time()
+        discovered_count, skipped_count = await self._db(self.scheduler._enqueue_listed, sources, news_items)
+        stage_times['dedup'] = time.time() - stage_start
+        await self._db(self.scheduler._daily_cleanup)
+
+        logger.warning(f"Discovered {discovered_count} new articles, {skipped_count} already known")
+        return discovered_count, skipped_count, len(news_items), stage_times
+
+    async def _fetch_article(self, url: str) -> Optional[Dict[str, Any]]:
+        html = await self._fetch_page(url)
+        if not html:
+            return None
+        try:
+            article_data = await self._cpu(self.scheduler.extraction_pool.extract, html, url)
+        except Exception as e:
+            logger.error(f"Error extracting {url}: {e}")
+            return None
+        if article_data:
+            self.scheduler.scraper.cache_article(url, article_data)
+        return article_data
+
+    def _claim_urls(self, limit: int) -> List[Tuple[Any, str]]:
+        # URL читаем в потоке базы: после commit атрибуты объектов истекают
+        return [(article, article.url) for article in self.queue.claim(STATUS_DISCOVERED, limit)]
+
+    async def run_fetch_stage(self) -> int:
+        """Загружает все захваченные статьи одновременно. Возвращает число захваченных статей"""
+        claimed = await self._db(self._claim_urls, self.batch_size)
+        if not claimed:
+            return 0
+        start_time = time.time()
+        fetched = await asyncio.gather(*(self._fetch_article(url) for _, url in claimed))
+        for (article, _), article_data in zip(claimed, fetched):
+            await self._db(self.scheduler._apply_fetched, article, article_data)
+        logger.warning(f"Fetched {sum(1 for data in fetched if data)}/{len(claimed)} articles "
+                       f"in {time.time() - start_time:.2f}s")
+        return len(claimed)
+
+    def _claim_for_summary(self, limit: int) -> Tuple[int, Tuple[str, str, str], List[Tuple[Any, Dict[str, Any]]]]:
+        llm_router.report_backlog(self.queue.counts().get(STATUS_FETCHED, 0))
+        claimed = self.queue.claim(STATUS_FETCHED, limit)
+        articles = self.scheduler._skip_near_duplicates(claimed)
+        settings = BotSettings.get_current()
+        ai_settings = (getattr(settings, "ai_provider", "openrouter"), settings.summary_style, settings.custom_hashtags)
+        return len(claimed), ai_settings, [(article, self.scheduler._article_data_for(article)) for article in articles]
+
+    def _store_summary(self, article: Any, ai_provider: str, summary: Optional[str], hashtags: List[str],
+                       summary_time: float, usage: Optional[Dict[str, Any]] = None) -> None:
+        try:
+            success = self.scheduler._save_ai_result(article, ai_provider, summary, hashtags, summary_time, 0.0,
+                                                     usage)
+            self.scheduler._finish_summarize(article, success)
+        except Exception as e:
+            db.session.rollback()
+            self.queue.fail(article, e)
+
+    async def _summarize_one(self, ai_service: AIService, article: Any, article_data: Dict[str, Any],
+                             style: str, custom_tags: str) -> None:
+        start_time = time.time()
+        usage: Dict[str, Any] = {}
+        try:
+            summary, hashtags = await ai_service.asummarize_with_hashtags(
+                self.client, article_data, style=style, custom_tags=custom_tags, run_db=self._db, usage=usage)
+        except Exception as e:
+            logger.error(f"Error processing article with AI: {e}")
+            summary, hashtags = None, []
+        await self._db(self._store_summary, article, ai_service.ai_provider, summary, hashtags,
+                       time.time() - start_time, usage)
+
+    async def run_summarize_stage(self) -> int:
+        """Генерирует резюме для всех захваченных статей одновременно"""
+        claimed_count, (ai_provider, style, custom_tags), pending = await self._db(
+            self._claim_for_summary, self.batch_size)
+        if pending:
+            ai_service = AIService(ai_provider=ai_provider)
+            await asyncio.gather(*(self._summarize_one(ai_service, article, article_data, style, custom_tags)
+                                   for article, article_data in pending))
+        return claimed_count
+
+    def _claim_posts(self) -> Tuple[Optional[str], List[Tuple[Any, int, str]]]:
+        settings = BotSettings.get_current()
+        posts = []
+        for article in self.scheduler._claim_for_posting(settings):
+            if not article.summary:
+                self.queue.fail(article, "Article has no summary")
+                continue
+            posts.append((article, article.id, self.scheduler._telegram_message_for(article)))
+        return settings.channel_id, posts
+
+    async def post_pending(self) -> int:
+        """Публикует статьи по одной с паузой, не останавливая остальные этапы"""
+        channel_id, posts = await self._db(self._claim_posts)
+        posted_count = 0
+        for article, article_id, message in posts:
+            result = await self.scheduler.telegram_service.send_message_async(
+                self.client, channel_id, message, article_id, run_db=self._db)
+            if await self._db(self.scheduler._finish_post, article, result):
+                posted_count += 1
+            # Small delay between posts
+            await self._sleep(2)
+        if posted_count > 0:
+            logger.warning(f"Posted {posted_count} articles to channel")
+        return posted_count
+
+    # Циклы
+
+    def _leader_settings(self) -> Optional[Tuple[bool, int]]:
+        if not self.scheduler._is_leader():
+            return None
+        settings = BotSettings.get_current()
+        return settings.posting_enabled, settings.posting_interval
+
+    async def _leader_loop(self) -> None:
+        """Поиск новостей и публикация - только в процессе-лидере"""
+        last_post_time = datetime.min
+        while self.running:
+            try:
+                leader_settings = await self._db(self._leader_settings)
+                if leader_settings:
+                    posting_enabled, posting_interval = leader_settings
+                    current_time = datetime.utcnow()
+                    await self.discover()
+                    if posting_enabled and current_time - last_post_time > timedelta(minutes=posting_interval):
+                        await self.post_pending()
+                        last_post_time = current_time
+            except Exception as e:
+                logger.error(f"Error in async scheduler loop: {e}")
+            await self._sleep(self.scheduler._loop_sleep())
+
+    async def _stage_loop(self, stage: str, run_stage: Callable[[], Any]) -> None:
+        while self.running:
+            try:
+                processed = await run_stage()
+            except Exception as e:
+                logger.error(f"Error in async {stage} stage: {e}")
+                processed = 0
+            # Очередь пуста - ждем, иначе сразу берем следующую пачку
+            if not processed:
+                await self._sleep(self.idle_sleep)
+
+    async def _run_loops(self) -> None:
+        stages = {'fetch': self.run_fetch_stage, 'summarize': self.run_summarize_stage}
+        loops = [self._leader_loop()]
+        for stage, count in self.stage_workers.items():
+            loops += [self._stage_loop(stage, stages[stage]) for _ in range(count)]
+        await asyncio.gather(*loops)
+
+    async def run(self) -> None:
+        """Работает до вызова stop()"""
+        self.running = True
+        self._stop_event = asyncio.Event()
+        logger.warning(f"Async pipeline started ({self.queue.worker_id}, batch={self.batch_size}, "
+                       f"stages: {self.stage_workers})")
+        try:
+            await self._with_client(self._run_loops)
+        finally:
+            try:
+                await self._db(SchedulerLease.release, LEADER_LEASE_NAME, self.queue.worker_id)
+            except Exception as e:
+                logger.error(f"Error releasing scheduler lease: {e}")
+            self._stop_event = None
+            logger.warning("Async pipeline stopped")
+
+    def stop(self) -> None:
+        """Останавливает циклы; вызывается из потока цикла событий (например, обработчиком сигнала)"""
+        self.running = False
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    def close(self) -> None:
+        """Закрывает сессию базы данных, поток базы данных и процессы извлечения"""
+        self._db_executor.submit(db.session.remove).result()
+        self._db_executor.shutdown(wait=True)
+        self.scheduler.extraction_pool.shutdown()
+
+    # Ручной запуск
+
+    async def scrape_once(self) -> None:
+        """Поиск новостей и все этапы конвейера до опустошения очереди"""
+        logger.info("Starting async news scrape...")
+        start_time = time.time()
+        discovered_count, skipped_count, listed_count, stage_times = await self.discover(force=True)
+
+        stage_start = time.time()
+        fetched_count = 0
+        while True:
+            processed = await self.run_fetch_stage()
+            if not processed:
+                break
+            fetched_count += processed
+        stage_times['fetch'] = time.time() - stage_start
+
+        stage_start = time.time()
+        summarized_count = 0
+        while True:
+            processed = await self.run_summarize_stage()
+            if not processed:
+                break
+            summarized_count += processed
+        stage_times['ai'] = time.time() - stage_start
+
+        stage_times['total'] = time.time() - start_time
+        self.scheduler.last_scrape_stats = {
+            'finished_at': datetime.utcnow(),
+            'stage_times': stage_times,
+            'listed': listed_count,
+            'new': discovered_count,
+            'skipped': skipped_count,
+            'fetch_attempted': fetched_count,
+            'ai_attempted': summarized_count,
+            'queue': await self._db(self.queue.counts),
+            'http': self.client.stats(),
+        }
+        logger.warning("Async scrape stage times: " + ", ".join(
+            f"{stage}={seconds:.2f}s" for stage, seconds in stage_times.items()))
+
+    async def post_article(self, article_id: int, channel_id: Optional[str] = None) -> Dict[str, Any]:
+        prepared = await self._db(self.scheduler._prepare_manual_post, article_id, channel_id)
+        if isinstance(prepared, dict):
+            return prepared
+        article, target_channel, message = prepared
+        result = await self.scheduler.telegram_service.send_message_async(
+            self.client, target_channel, message, article_id, run_db=self._db)
+        return await self._db(self.scheduler._finish_manual_post, article, result)
+
+    def manual_scrape(self) -> None:
+        """Manually trigger a news scrape"""
+        asyncio.run(self._with_client(self.scrape_once))
+
+    def manual_post(self, article_id: int, channel_id: Optional[str] = None) -> Dict[str, Any]:
+        """Manually post a specific article"""
+        return asyncio.run(self._with_client(self.post_article, article_id, channel_id))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# Last modified: 2024-03-26
+"""
+Микробенчмарк разбора дат публикации.
+
+Использование:
+    python benchmarks/bench_dates.py [--number 20000]
+
+Для каждого формата из лент и фидов выводится время одного вызова parse_date
+в микросекундах и результат, а также время extract_html_date на странице статьи.
+"""
+import argparse
+import os
+import sys
+import timeit
+from typing import Dict
+
+import trafilatura
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dates import parse_date, extract_html_date
+
+SAMPLES = [
+    '12.03.2025',
+    '12.03.2025 10:15',
+    '12.03',
+    '12 марта 2025, 10:15',
+    'вчера в 18:40',
+    '5 минут назад',
+    '2025-03-12T10:15:00+03:00',
+    'Wed, 12 Mar 2025 10:15:00 +0300',
+    'Главное за день',
+]
+
+ARTICLE_PAGE = ('<html><head><meta property="og:title" content="Заголовок">'
+                '<meta property="article:published_time" content="2025-03-12T10:15:00+03:00"></head>'
+                '<body><article><h1>Заголовок</h1>' + '<p>Текст статьи.</p>' * 200 +
+                '</article></body></html>')
+
+
+def run(number: int) -> Dict[str, float]:
+    results = {}
+    for text in SAMPLES:
+        seconds = timeit.timeit(lambda: parse_date(text), number=number)
+        results[text] = seconds / number * 1e6
+        print(f"  {text:36} {results[text]:7.2f} us  -> {parse_date(text)}")
+
+    tree = trafilatura.load_html(ARTICLE_PAGE)
+    seconds = timeit.timeit(lambda: extract_html_date(tree), number=max(1, number // 10))
+    results['extract_html_date'] = seconds / max(1, number // 10) * 1e6
+    print(f"  {'extract_html_date (meta)':36} {results['extract_html_date']:7.2f} us")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк разбора дат")
+    parser.add_argument('--number', type=int, default=20000, help="вызовов на формат")
+    args = parser.parse_args()
+    run(args.number)
+
+
+if __name__ == '__main__':
+    main()
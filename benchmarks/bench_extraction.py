@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Last modified: 2024-03-26
+"""
+Бенчмарк извлечения статей на сохраненных страницах.
+
+Сравнивает прежний путь (trafilatura и BeautifulSoup разбирают HTML
+независимо друг от друга) с extract_article_data, которая разбирает
+документ один раз.
+
+Использование:
+    python benchmarks/bench_extraction.py <каталог с .html> [--repeat N]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import trafilatura
+from bs4 import BeautifulSoup
+
+from scraper import extract_article_data
+
+
+def legacy_extract(html: bytes) -> dict:
+    """Повторяет прежнюю логику get_article_content без сетевых запросов"""
+    content = trafilatura.extract(html)
+    soup = BeautifulSoup(html, 'html.parser')
+    title_elem = soup.find(['h1', 'h2'], class_=re.compile(r'(title|heading)', re.I))
+    quotes = [q.get_text(strip=True) for q in soup.find_all(['blockquote', 'q', 'cite'])]
+    tags = [t.get_text(strip=True) for t in soup.find_all(['a', 'span'], class_=re.compile(r'(tag|category|label)', re.I))]
+    date_elem = soup.find(class_=re.compile(r'(?i)(date|time|published)'))
+    return {
+        'title': title_elem.get_text(strip=True) if title_elem else '',
+        'content': content,
+        'quotes': quotes,
+        'tags': tags,
+        'date': date_elem.get_text(strip=True) if date_elem else None,
+    }
+
+
+def run(name, func, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for url, html in pages:
+            func(html, url)
+    elapsed = time.perf_counter() - start
+    total = len(pages) * repeat
+    print(f"{name:<10} {total} страниц за {elapsed:.2f}s: "
+          f"{elapsed / total * 1000:.1f} мс/страница, {total / elapsed:.1f} страниц/с")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages_dir', help='каталог с сохраненными HTML-страницами')
+    parser.add_argument('--repeat', type=int, default=5, help='число повторов (по умолчанию 5)')
+    args = parser.parse_args()
+
+    pages = []
+    for name in sorted(os.listdir(args.pages_dir)):
+        if name.endswith(('.html', '.htm')):
+            with open(os.path.join(args.pages_dir, name), 'rb') as f:
+                pages.append((f"file://{name}", f.read()))
+    if not pages:
+        print(f"В каталоге {args.pages_dir} нет HTML-страниц")
+        return 1
+
+    total_bytes = sum(len(html) for _, html in pages)
+    print(f"Загружено {len(pages)} страниц, {total_bytes / 1024:.0f} КБ")
+    # Прежний путь скачивал каждую страницу дважды
+    print(f"Трафик на цикл: прежний {2 * total_bytes / 1024:.0f} КБ, новый {total_bytes / 1024:.0f} КБ")
+
+    legacy = run('legacy', lambda html, url: legacy_extract(html), pages, args.repeat)
+    single = run('single', extract_article_data, pages, args.repeat)
+    print(f"Ускорение разбора: x{legacy / single:.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
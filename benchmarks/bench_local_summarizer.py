@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Last modified: 2024-03-26
+"""
+Бенчмарк локального экстрактивного резюме (ExtractiveSummarizer).
+
+Использование:
+    python benchmarks/bench_local_summarizer.py [--articles 1000] [--sentences 30]
+
+Статьи собираются из типичных предложений финансовых новостей в случайном
+порядке. Выводится число статей в секунду для ранжирования предложений
+и для полного пути AIService.summarize_locally (заголовок, хештеги, проверка формата).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_summarizer import ExtractiveSummarizer
+from ai_service import AIService
+
+SENTENCES = [
+    "Газпром в первом квартале увеличил экспорт газа в Китай на {n}% по сравнению с прошлым годом.",
+    "Совет директоров Сбербанка рекомендовал выплатить дивиденды в размере {n} рублей на акцию.",
+    "Банк России сохранил ключевую ставку на уровне {n}% годовых, следует из сообщения регулятора.",
+    "Индекс Мосбиржи по итогам торгов снизился на {n}% на фоне падения цен на нефть.",
+    "Выручка компании за год выросла на {n}% и составила 2,1 трлн рублей.",
+    "Аналитики ожидают, что курс доллара к концу года составит около {n} рублей.",
+    "ФРС США оставила базовую ставку без изменений, отметив замедление инфляции.",
+    "Минфин разместил облигации федерального займа на {n} млрд рублей при спросе вдвое выше.",
+    "Цены на нефть марки Brent поднялись до {n} долларов за баррель после решения ОПЕК+.",
+    "Роснефть сообщила о запуске нового месторождения с добычей {n} тысяч баррелей в сутки.",
+    "Эксперты связывают рост котировок с ожиданиями снижения налоговой нагрузки на отрасль.",
+    "Компания планирует направить на инвестиционную программу {n} млрд рублей в следующем году.",
+]
+
+
+def make_article(rng: random.Random, sentences: int) -> dict:
+    text = ' '.join(rng.choice(SENTENCES).format(n=rng.randint(1, 99)) for _ in range(sentences))
+    return {'title': rng.choice(SENTENCES).split(',')[0], 'content': text, 'quotes': []}
+
+
+def measure(name: str, func, articles: list) -> float:
+    start_time = time.perf_counter()
+    for article in articles:
+        func(article)
+    elapsed = time.perf_counter() - start_time
+    rate = len(articles) / elapsed
+    print(f"  {name:32} {rate:9.0f} статей/с  ({elapsed / len(articles) * 1000:.2f} мс на статью)")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк локального экстрактивного резюме")
+    parser.add_argument('--articles', type=int, default=1000, help="число статей")
+    parser.add_argument('--sentences', type=int, default=30, help="предложений в статье")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    articles = [make_article(rng, args.sentences) for _ in range(args.articles)]
+    summarizer = ExtractiveSummarizer()
+    service = AIService()
+
+    print(f"{args.articles} статей по {args.sentences} предложений:")
+    measure('ExtractiveSummarizer.select', lambda a: summarizer.select(a['title'], a['content']), articles)
+    measure('AIService.summarize_locally', service.summarize_locally, articles)
+    print("\nПример:\n" + (service.summarize_locally(articles[0])[0] or '-'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# Last modified: 2024-03-26
+"""
+Сравнение парсеров HTML на сохраненных страницах лент.
+
+Использование:
+    python benchmarks/bench_parsers.py rbc saved/rbc.html saved/rbc2.html --backends lxml html.parser --repeat 5
+
+Для каждого парсера выводится среднее время разбора и число новостей,
+а также расхождения в найденных адресах с первым парсером из списка.
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sources import source_registry
+from scraper import SmartLabScraper
+
+
+def compare_parsers(source_name: str, paths: List[str], backends: List[str], repeat: int = 3) -> Dict[str, Dict]:
+    source = source_registry.get(source_name)
+    if source is None:
+        raise ValueError(f"Unknown source '{source_name}'")
+    pages = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+
+    results = {}
+    for backend in backends:
+        scraper = SmartLabScraper(html_parser=backend)
+        urls = []
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            urls = [[item['url'] for item in scraper.parse_source(source, page)] for page in pages]
+        elapsed = (time.perf_counter() - start_time) / (repeat * len(pages))
+        results[backend] = {'ms_per_page': round(elapsed * 1000, 2), 'items': sum(map(len, urls)), 'urls': urls}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение парсеров HTML на сохраненных лентах")
+    parser.add_argument('source', help="имя источника из реестра")
+    parser.add_argument('paths', nargs='+', help="сохраненные страницы ленты")
+    parser.add_argument('--backends', nargs='+', default=['lxml', 'html.parser'])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    results = compare_parsers(args.source, args.paths, args.backends, args.repeat)
+    baseline = results[args.backends[0]]['urls']
+    for backend, result in results.items():
+        print(f"{backend:12} {result['ms_per_page']:8.2f} ms/page  {result['items']:4} items")
+        for path, expected, found in zip(args.paths, baseline, result['urls']):
+            if found != expected:
+                print(f"  {path}: missing {sorted(set(expected) - set(found))}, extra {sorted(set(found) - set(expected))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# Last modified: 2024-03-26
+"""
+Бенчмарк скрапера на записанном архиве HTTP-ответов, без обращения к сайтам.
+
+Запись архива (ленты всех источников и до N статей из каждой):
+    python benchmarks/bench_scraper.py record archive.db [--articles 20]
+
+Замер на архиве:
+    python benchmarks/bench_scraper.py replay archive.db [--repeat 3]
+
+Выводит страниц в секунду и среднее время в мс по этапам:
+разбор лент по источникам, загрузка статьи из архива, извлечение текста.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraper import SmartLabScraper, extract_article_data
+from scrape_cache import ScrapeCache
+from sources import source_registry
+
+
+def _scraper(mode: str, path: str) -> SmartLabScraper:
+    # Без кэша: каждый проход действительно загружает и разбирает страницы
+    return SmartLabScraper(cache=ScrapeCache(memory_bytes=0, path=None), archive=f"{mode}:{path}")
+
+
+def record(path: str, articles_per_source: int) -> None:
+    scraper = _scraper('record', path)
+    for source in source_registry.enabled():
+        items = scraper.get_source_news(source)
+        for item in items[:articles_per_source]:
+            scraper.get_article_content(item['url'])
+        print(f"{source.name}: {len(items)} listing items, {min(len(items), articles_per_source)} articles recorded")
+
+
+def replay(path: str, repeat: int) -> Dict[str, List[float]]:
+    timings: Dict[str, List[float]] = defaultdict(list)
+    pages = 0
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        scraper = _scraper('replay', path)
+
+        def timed_extract(html, url):
+            extract_start = time.perf_counter()
+            try:
+                return extract_article_data(html, url)
+            finally:
+                timings['extract'].append(time.perf_counter() - extract_start)
+
+        scraper.extractor = timed_extract
+        for source in source_registry.enabled():
+            stage_start = time.perf_counter()
+            items = scraper.get_source_news(source)
+            timings[f"listing:{source.name}"].append(time.perf_counter() - stage_start)
+            pages += 1
+            for item in items:
+                stage_start = time.perf_counter()
+                extracts = len(timings['extract'])
+                scraper.get_article_content(item['url'])
+                # Статьи, которых нет в архиве, не считаем
+                if len(timings['extract']) > extracts:
+                    timings['article'].append(time.perf_counter() - stage_start)
+                    pages += 1
+    elapsed = time.perf_counter() - start_time
+
+    print(f"{pages} pages in {elapsed:.2f}s: {pages / elapsed:.1f} pages/sec")
+    for stage, values in sorted(timings.items()):
+        print(f"  {stage:24} {len(values):5} x {sum(values) / len(values) * 1000:8.2f} ms")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк скрапера на архиве HTTP-ответов")
+    parser.add_argument('mode', choices=['record', 'replay'])
+    parser.add_argument('archive', help="файл архива SQLite")
+    parser.add_argument('--articles', type=int, default=20, help="статей из каждого источника при записи")
+    parser.add_argument('--repeat', type=int, default=3, help="число проходов при замере")
+    args = parser.parse_args()
+
+    if args.mode == 'record':
+        record(args.archive, args.articles)
+    else:
+        replay(args.archive, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
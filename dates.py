@@ -0,0 +1,185 @@
+# Last modified: 2024-03-26
+import re
+import logging
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+MSK = ZoneInfo("Europe/Moscow")
+# Меньше любой даты публикации, для сортировки новостей без даты
+DATE_MIN = datetime.min.replace(tzinfo=timezone.utc)
+
+# Месяцы по первым трем буквам: "марта", "мар", "Март", "мая", "май"
+_MONTHS = {'янв': 1, 'фев': 2, 'мар': 3, 'апр': 4, 'мая': 5, 'май': 5, 'июн': 6,
+           'июл': 7, 'авг': 8, 'сен': 9, 'окт': 10, 'ноя': 11, 'дек': 12}
+_RELATIVE_UNITS = {'сек': 'seconds', 'мин': 'minutes', 'час': 'hours', 'дн': 'days', 'ден': 'days',
+                   'сут': 'days', 'нед': 'weeks'}
+_DAY_OFFSETS = {'сегодня': 0, 'вчера': 1, 'позавчера': 2}
+_WORD_NUMBERS = {'одну': 1, 'одна': 1, 'один': 1, 'две': 2, 'два': 2, 'три': 3, 'четыре': 4, 'пять': 5}
+
+_TIME = r'(?:\D{0,4}?(\d{1,2}):(\d{2}))?'
+_ISO_RE = re.compile(r'\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?(?:Z|[+-]\d{2}:?\d{2})?')
+_NUMERIC_RE = re.compile(r'\b(\d{1,2})\.(\d{1,2})(?:\.(\d{4}|\d{2}))?\b' + _TIME)
+_MONTH_NAME_RE = re.compile(r'\b(\d{1,2})\s+([а-яё]{3,8})\.?(?:\s+(\d{4}))?(?:\s*г\.?)?' + _TIME, re.IGNORECASE)
+_DAY_WORD_RE = re.compile(r'\b(позавчера|вчера|сегодня)\b' + _TIME, re.IGNORECASE)
+# Единица - отдельное слово в одной из своих форм: "частично назад" - не "час назад"
+_RELATIVE_RE = re.compile(r'(\d+|одну|одна|один|две|два|три|четыре|пять)?\s*(?<![а-яё])'
+                          r'(сек(?:унд[уы]?)?|мин(?:ут[уы]?)?|час(?:а|ов)?|дн(?:я|ей)|день|сут(?:ки|ок)'
+                          r'|нед(?:ел[юиь]|ель)?|полчаса)(?![а-яё])\.?\s+назад', re.IGNORECASE)
+_JUST_NOW_RE = re.compile(r'только что|^сейчас$', re.IGNORECASE)
+_TIME_ONLY_RE = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*$')
+_URL_DATE_RE = re.compile(r'/(\d{4})/(\d{2})/(\d{2})/')
+
+# Дата публикации в разметке статьи, в порядке надежности
+_META_DATE_XPATH = etree.XPath(
+    "//meta[@property='article:published_time' or @name='article:published_time'"
+    " or @itemprop='datePublished' or @name='pubdate' or @name='publish-date']/@content")
+_TIME_DATETIME_XPATH = etree.XPath("//time/@datetime")
+_CLASS_DATE_XPATH = etree.XPath(
+    "//*[re:test(@class, '(date|time|published)', 'i')]",
+    namespaces={'re': 'http://exslt.org/regular-expressions'})
+
+
+def now_msk() -> datetime:
+    return datetime.now(MSK)
+
+
+def as_msk(value: datetime) -> datetime:
+    """Приводит дату к Europe/Moscow; наивные даты из разметки сайтов считаются московскими"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=MSK)
+    return value.astimezone(MSK)
+
+
+def _at(day: datetime, hour: Optional[str], minute: Optional[str]) -> datetime:
+    if hour is None:
+        return day.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day.replace(hour=int(hour), minute=int(minute), second=0, microsecond=0)
+
+
+def _without_year(day: int, month: int, hour: Optional[str], minute: Optional[str], now: datetime) -> datetime:
+    """Дата без года: текущий год, а если она еще не наступила - прошлый (лента на стыке лет)"""
+    value = _at(datetime(now.year, month, day, tzinfo=MSK), hour, minute)
+    if value > now + timedelta(days=1):
+        value = value.replace(year=now.year - 1)
+    return value
+
+
+def _year(text: str) -> int:
+    year = int(text)
+    return year + 2000 if year < 100 else year
+
+
+def parse_iso_date(text: str) -> Optional[datetime]:
+    match = _ISO_RE.search(text)
+    if not match:
+        return None
+    try:
+        return as_msk(datetime.fromisoformat(match.group(0)))
+    except ValueError:
+        return None
+
+
+def parse_date(text: Optional[str], now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Дата публикации из текста ленты, фида или разметки, aware в Europe/Moscow.
+    Понимает ISO 8601, RFC 822, dd.mm.yyyy и dd.mm, "12 марта 2025, 10:00",
+    "вчера в 18:40", "5 минут назад" и время без даты. None, если даты в тексте нет.
+    """
+    text = (text or '').strip()
+    if not text:
+        return None
+    now = as_msk(now) if now else now_msk()
+    try:
+        match = _RELATIVE_RE.search(text)
+        if match:
+            count, unit = match.groups()
+            unit = unit.lower()
+            if unit == 'полчаса':
+                return now - timedelta(minutes=30)
+            amount = int(count) if count and count.isdigit() else _WORD_NUMBERS.get((count or '').lower(), 1)
+            prefix = next(prefix for prefix in _RELATIVE_UNITS if unit.startswith(prefix))
+            return now - timedelta(**{_RELATIVE_UNITS[prefix]: amount})
+        if _JUST_NOW_RE.search(text):
+            return now
+
+        parsed = parse_iso_date(text)
+        if parsed:
+            return parsed
+
+        match = _DAY_WORD_RE.search(text)
+        if match:
+            word, hour, minute = match.groups()
+            return _at(now - timedelta(days=_DAY_OFFSETS[word.lower()]), hour, minute)
+
+        match = _NUMERIC_RE.search(text)
+        if match:
+            day, month, year, hour, minute = match.groups()
+            if year:
+                return _at(datetime(_year(year), int(month), int(day), tzinfo=MSK), hour, minute)
+            return _without_year(int(day), int(month), hour, minute, now)
+
+        match = _MONTH_NAME_RE.search(text)
+        if match and match.group(2)[:3].lower() in _MONTHS:
+            day, month_name, year, hour, minute = match.groups()
+            month = _MONTHS[month_name[:3].lower()]
+            if year:
+                return _at(datetime(int(year), month, int(day), tzinfo=MSK), hour, minute)
+            return _without_year(int(day), month, hour, minute, now)
+
+        match = _TIME_ONLY_RE.match(text)
+        if match:
+            return _at(now, *match.groups())
+    except ValueError:
+        # 31.02, 25:61 и подобное
+        return None
+
+    # RFC 822 из RSS: "Wed, 12 Mar 2025 10:00:00 +0300"
+    try:
+        return as_msk(parsedate_to_datetime(text))
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def date_from_url(url: str, pattern: re.Pattern = _URL_DATE_RE) -> Optional[datetime]:
+    """Дата из URL вида /yyyy/mm/dd/"""
+    match = pattern.search(url)
+    if not match:
+        return None
+    try:
+        year, month, day = map(int, match.groups()[:3])
+        return datetime(year, month, day, tzinfo=MSK)
+    except ValueError:
+        return None
+
+
+def _element_text(element) -> str:
+    try:
+        return ' '.join(element.text_content().split())
+    except Exception:
+        return ""
+
+
+def extract_html_date(tree) -> Optional[datetime]:
+    """
+    Дата публикации из дерева lxml страницы: meta article:published_time
+    и datePublished, затем <time datetime>, затем текст элементов с классом date/time
+    """
+    for value in _META_DATE_XPATH(tree):
+        parsed = parse_iso_date(value) or parse_date(value)
+        if parsed:
+            return parsed
+    for value in _TIME_DATETIME_XPATH(tree):
+        parsed = parse_iso_date(value)
+        if parsed:
+            return parsed
+    for element in _CLASS_DATE_XPATH(tree):
+        parsed = parse_date(_element_text(element))
+        if parsed:
+            return parsed
+    return None
@@ -0,0 +1,113 @@
+# Last modified: 2024-03-26
+import os
+import re
+import random
+import hashlib
+import logging
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Статьи с оценкой сходства Жаккара не ниже DEDUP_THRESHOLD считаются одной новостью
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.5"))
+# С какими статьями сравнивать: опубликованные за последние DEDUP_WINDOW_HOURS часов
+DEDUP_WINDOW_HOURS = int(os.environ.get("DEDUP_WINDOW_HOURS", "48"))
+
+NUM_PERMUTATIONS = 64
+# 16 полос по 4 строки: пары со сходством около 0.5 и выше почти всегда попадают в общую полосу
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+# Русские слова сравниваем по первым буквам, чтобы "прибыль" и "прибыли" совпадали
+STEM_LENGTH = 5
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_random = random.Random(20240326)
+_PERMUTATIONS = [(_random.randrange(1, _MERSENNE_PRIME), _random.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(NUM_PERMUTATIONS)]
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _tokens(title: str, content: str) -> Set[str]:
+    # Короткие слова (предлоги, союзы) не отличают одну новость от другой, числа оставляем
+    words = _WORD_RE.findall(f"{title or ''} {content or ''}".lower())
+    return {word[:STEM_LENGTH] for word in words if len(word) > 2 or word.isdigit()}
+
+
+def minhash_signature(title: str, content: str) -> Optional[List[int]]:
+    """MinHash-подпись множества основ слов заголовка и текста, None для пустого текста"""
+    tokens = _tokens(title, content)
+    if not tokens:
+        return None
+    hashes = [int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+              for token in tokens]
+    return [min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashes) for a, b in _PERMUTATIONS]
+
+
+def pack_signature(signature: List[int]) -> str:
+    return ''.join(f"{value:08x}" for value in signature)
+
+
+def unpack_signature(packed: str) -> Optional[List[int]]:
+    if not packed or len(packed) != NUM_PERMUTATIONS * 8:
+        return None
+    return [int(packed[i:i + 8], 16) for i in range(0, len(packed), 8)]
+
+
+def estimate_similarity(first: List[int], second: List[int]) -> float:
+    """Оценка сходства Жаккара по доле совпавших минимумов"""
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_PERMUTATIONS
+
+
+class MinHashLSHIndex:
+    """
+    LSH-индекс MinHash-подписей.
+    Подпись делится на полосы, статьи с хотя бы одной совпавшей полосой
+    становятся кандидатами, для них сходство оценивается по всей подписи.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self._buckets: List[Dict[Tuple[int, ...], Set[int]]] = [{} for _ in range(LSH_BANDS)]
+        self._signatures: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    @staticmethod
+    def _bands(signature: List[int]) -> List[Tuple[int, ...]]:
+        return [tuple(signature[i * LSH_ROWS:(i + 1) * LSH_ROWS]) for i in range(LSH_BANDS)]
+
+    def add(self, key: int, signature: List[int]) -> None:
+        self._signatures[key] = signature
+        for bucket, band in zip(self._buckets, self._bands(signature)):
+            bucket.setdefault(band, set()).add(key)
+
+    def remove(self, key: int) -> None:
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for bucket, band in zip(self._buckets, self._bands(signature)):
+            keys = bucket.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del bucket[band]
+
+    def keys(self) -> Set[int]:
+        return set(self._signatures)
+
+    def find(self, signature: List[int],
+             accept: Optional[Callable[[int], bool]] = None) -> Optional[Tuple[int, float]]:
+        """Самая похожая статья не ниже порога: (key, сходство) или None"""
+        candidates: Set[int] = set()
+        for bucket, band in zip(self._buckets, self._bands(signature)):
+            candidates |= bucket.get(band, set())
+        best = None
+        for key in candidates:
+            if accept and not accept(key):
+                continue
+            similarity = estimate_similarity(signature, self._signatures[key])
+            if similarity >= self.threshold and (best is None or (similarity, -key) > (best[1], -best[0])):
+                best = (key, similarity)
+        return best
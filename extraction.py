@@ -0,0 +1,101 @@
+# Last modified: 2024-03-26
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from threading import BoundedSemaphore, Lock
+from typing import Any, Dict, Optional, Union
+
+from scraper import extract_article_data
+
+logger = logging.getLogger(__name__)
+
+# Число процессов извлечения текста; 0 - извлекать в вызывающем потоке
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", "2"))
+# Сколько секунд ждать разбора одной страницы, после чего процессы перезапускаются
+EXTRACT_TIMEOUT = float(os.environ.get("EXTRACT_TIMEOUT", "30"))
+
+_WARMUP_PAGE = b"<html><body><article><h1 class='title'>warmup</h1><p>warmup</p></article></body></html>"
+
+
+def _warm_worker() -> None:
+    """Инициализация процесса: trafilatura и lxml загружаются один раз, а не на каждую задачу"""
+    logging.getLogger('trafilatura').setLevel(logging.ERROR)
+    try:
+        extract_article_data(_WARMUP_PAGE, 'https://warmup.local/')
+    except Exception:
+        pass
+
+
+class ExtractionPool:
+    """
+    Извлечение статей из HTML в пуле процессов.
+    trafilatura и BeautifulSoup держат GIL, поэтому потоки загрузки
+    передают сырые байты страницы в отдельные процессы. Одновременно
+    отправляется не больше задач, чем процессов, так что таймаут отсчитывается
+    от начала разбора; зависший разбор завершается перезапуском пула.
+    """
+
+    def __init__(self, workers: int = EXTRACT_WORKERS, timeout: float = EXTRACT_TIMEOUT):
+        self.workers = max(0, workers)
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = BoundedSemaphore(max(1, self.workers))
+        self._lock = Lock()
+        self._stats = {'extracted': 0, 'timeouts': 0, 'restarts': 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: процессы не наследуют потоки и соединения с базой родителя.
+                # Дочерний процесс заново импортирует __main__ родителя (worker.py), поэтому
+                # тяжелые модули там импортируются только внутри main()
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=_warm_worker)
+            return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor, kill: bool = False) -> None:
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._stats['restarts'] += 1
+        if kill:
+            # ProcessPoolExecutor не умеет отменять запущенную задачу - завершаем процессы
+            for process in list((getattr(executor, '_processes', None) or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def extract(self, html: Union[bytes, str], url: str) -> Optional[Dict[str, Any]]:
+        """Данные статьи, как у extract_article_data; None при ошибке или таймауте"""
+        if self.workers == 0:
+            return extract_article_data(html, url)
+        with self._slots:
+            # Вторая попытка - если пул перезапустили из-за зависшей соседней задачи
+            for _ in range(2):
+                executor = self._get_executor()
+                try:
+                    result = executor.submit(extract_article_data, html, url).result(timeout=self.timeout)
+                except FuturesTimeoutError:
+                    logger.error(f"Extraction of {url} timed out after {self.timeout}s, restarting workers")
+                    self._stats['timeouts'] += 1
+                    self._reset(executor, kill=True)
+                    return None
+                except BrokenProcessPool:
+                    logger.warning(f"Extraction pool broken while parsing {url}, retrying")
+                    self._reset(executor)
+                    continue
+                self._stats['extracted'] += 1
+                return result
+        return None
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'workers': self.workers, 'running': self._executor is not None, **self._stats}
@@ -0,0 +1,90 @@
+# Last modified: 2024-03-26
+import os
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import BoundedSemaphore, Lock
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = int(os.environ.get("SCRAPER_MAX_WORKERS", "8"))
+DEFAULT_PER_HOST_LIMIT = int(os.environ.get("SCRAPER_PER_HOST_LIMIT", "3"))
+
+
+class ConcurrentFetcher:
+    """
+    Параллельная загрузка статей через пул потоков.
+    Общее число одновременных запросов ограничено max_workers,
+    число запросов к одному домену - per_host_limit.
+    """
+
+    def __init__(self, fetch_func: Callable[[str], Optional[Dict[str, Any]]],
+                 max_workers: Optional[int] = None, per_host_limit: Optional[int] = None):
+        self.fetch_func = fetch_func
+        self.max_workers = max(1, max_workers or DEFAULT_MAX_WORKERS)
+        self.per_host_limit = max(1, per_host_limit or DEFAULT_PER_HOST_LIMIT)
+        self._host_semaphores: Dict[str, BoundedSemaphore] = {}
+        self._lock = Lock()
+
+    def _get_host_semaphore(self, host: str) -> BoundedSemaphore:
+        """Возвращает семафор для домена, создавая его при первом обращении"""
+        with self._lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = BoundedSemaphore(self.per_host_limit)
+                self._host_semaphores[host] = semaphore
+            return semaphore
+
+    def _fetch_one(self, url: str) -> Optional[Dict[str, Any]]:
+        host = urlparse(url).netloc.lower()
+        with self._get_host_semaphore(host):
+            return self.fetch_func(url)
+
+    @staticmethod
+    def _interleave_by_host(urls: List[str]) -> List[str]:
+        """
+        Чередует URL разных доменов, чтобы потоки пула не простаивали
+        в ожидании семафора одного и того же домена
+        """
+        by_host: "OrderedDict[str, List[str]]" = OrderedDict()
+        for url in urls:
+            by_host.setdefault(urlparse(url).netloc.lower(), []).append(url)
+        result: List[str] = []
+        queues = list(by_host.values())
+        while queues:
+            for queue in queues:
+                result.append(queue.pop(0))
+            queues = [queue for queue in queues if queue]
+        return result
+
+    def fetch_all(self, urls: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Загружает все URL параллельно.
+        Возвращает словарь url -> данные статьи (None при ошибке)
+        """
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        if not urls:
+            return results
+
+        start_time = time.time()
+        ordered = self._interleave_by_host(list(dict.fromkeys(urls)))
+        workers = min(self.max_workers, len(ordered))
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as executor:
+            futures = {executor.submit(self._fetch_one, url): url for url in ordered}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    results[url] = future.result()
+                except Exception as e:
+                    logger.error(f"Error fetching {url}: {e}")
+                    results[url] = None
+
+        execution_time = time.time() - start_time
+        fetched = sum(1 for data in results.values() if data)
+        logger.warning(f"Fetched {fetched}/{len(ordered)} articles in {execution_time:.2f}s "
+                       f"(workers={workers}, per_host={self.per_host_limit})")
+        return results
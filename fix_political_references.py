@@ -48,18 +48,7 @@ def fix_political_references(text):
         lower_text = text.lower()
         
         # Выбираем подходящие эмодзи
-        if any(word in lower_text for word in ['россия', 'рф', 'рубль']):
-            emoji = '🇷🇺'
-        elif any(word in lower_text for word in ['сша', 'америк', 'доллар']):
-            emoji = '🇺🇸'
-        elif any(word in lower_text for word in ['китай', 'юань']):
-            emoji = '🇨🇳'
-        elif any(word in lower_text for word in ['нефть', 'газ', 'энергетик']):
-            emoji = '🛢'
-        elif any(word in lower_text for word in ['финанс', 'банк', 'акци']):
-            emoji = '💰'
-        else:
-            emoji = '📊'
+        emoji = topic_emoji(lower_text)
             
         # Выбираем подходящие хештеги
         if not hashtags:
@@ -90,4 +79,22 @@ def fix_political_references(text):
             
         text = '\n'.join(lines)
     
-    return text
\ No newline at end of file
+    return text
+
+
+def topic_emoji(text):
+    """
+    Эмодзи по теме новости для первой строки сводки
+    """
+    lower_text = text.lower()
+    if any(word in lower_text for word in ['россия', 'рф', 'рубль']):
+        return '🇷🇺'
+    elif any(word in lower_text for word in ['сша', 'америк', 'доллар']):
+        return '🇺🇸'
+    elif any(word in lower_text for word in ['китай', 'юань']):
+        return '🇨🇳'
+    elif any(word in lower_text for word in ['нефть', 'газ', 'энергетик']):
+        return '🛢'
+    elif any(word in lower_text for word in ['финанс', 'банк', 'акци']):
+        return '💰'
+    return '📊'
@@ -0,0 +1,127 @@
+# Last modified: 2024-03-26
+import os
+import io
+import json
+import time
+import zlib
+import sqlite3
+import logging
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+logger = logging.getLogger(__name__)
+
+# Запись или воспроизведение ответов скрапера: "record:/path/archive.db" или "replay:/path/archive.db"
+SCRAPER_HTTP_ARCHIVE = os.environ.get("SCRAPER_HTTP_ARCHIVE", "")
+
+# Заголовки, которые описывают передачу, а не содержимое: тело в архиве уже раскодировано
+_TRANSPORT_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length', 'connection'}
+
+
+class HTTPArchive:
+    """
+    Архив HTTP-ответов в SQLite: статус, заголовки и сжатое zlib тело
+    на каждую пару (метод, URL). Повторная запись заменяет ответ.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS responses ("
+                           "method TEXT, url TEXT, status INTEGER, reason TEXT, headers TEXT, body BLOB, "
+                           "elapsed REAL, recorded_at REAL, PRIMARY KEY (method, url))")
+        self._conn.commit()
+        self._lock = Lock()
+
+    def save(self, method: str, url: str, status: int, reason: str, headers: Dict[str, str],
+             body: bytes, elapsed: float) -> None:
+        headers = {name: value for name, value in headers.items() if name.lower() not in _TRANSPORT_HEADERS}
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (method.upper(), url, status, reason, json.dumps(headers),
+                                zlib.compress(body), elapsed, time.time()))
+            self._conn.commit()
+
+    def load(self, method: str, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT status, reason, headers, body, elapsed FROM responses "
+                                     "WHERE method = ? AND url = ?", (method.upper(), url)).fetchone()
+        if not row:
+            return None
+        status, reason, headers, body, elapsed = row
+        return {'status': status, 'reason': reason, 'headers': json.loads(headers),
+                'body': zlib.decompress(body), 'elapsed': elapsed}
+
+    def urls(self) -> List[str]:
+        with self._lock:
+            return [url for url, in self._conn.execute("SELECT url FROM responses ORDER BY recorded_at")]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Адаптер requests, который сохраняет каждый полученный ответ в архив"""
+
+    def __init__(self, archive: HTTPArchive, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.archive = archive
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        response = super().send(request, **kwargs)
+        # content читает поток целиком; iter_content потом отдает уже прочитанное тело
+        self.archive.save(request.method, request.url, response.status_code, response.reason,
+                          dict(response.headers), response.content, response.elapsed.total_seconds())
+        return response
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Адаптер requests, который отвечает из архива без сетевых запросов"""
+
+    def __init__(self, archive: HTTPArchive, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.archive = archive
+        self.misses = 0
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        entry = self.archive.load(request.method, request.url)
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        if entry is None:
+            self.misses += 1
+            response.status_code = 404
+            response.reason = 'Not In Archive'
+            body = b''
+        else:
+            response.status_code = entry['status']
+            response.reason = entry['reason']
+            response.headers = CaseInsensitiveDict(entry['headers'])
+            body = entry['body']
+        response.raw = io.BytesIO(body)
+        response._content = body
+        response._content_consumed = True
+        response.encoding = get_encoding_from_headers(response.headers)
+        return response
+
+
+def install_archive(session: requests.Session, spec: str = SCRAPER_HTTP_ARCHIVE) -> Optional[HTTPAdapter]:
+    """Подключает запись или воспроизведение к сессии по строке вида "record:путь" или "replay:путь\""""
+    if not spec:
+        return None
+    mode, _, path = spec.partition(':')
+    if mode not in ('record', 'replay') or not path:
+        logger.error(f"Invalid SCRAPER_HTTP_ARCHIVE '{spec}', expected record:<path> or replay:<path>")
+        return None
+    archive = HTTPArchive(path)
+    adapter_class = RecordingAdapter if mode == 'record' else ReplayAdapter
+    adapter = adapter_class(archive, pool_connections=20, pool_maxsize=20)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    logger.warning(f"Scraper HTTP archive: {mode} {path}")
+    return adapter
@@ -0,0 +1,260 @@
+# Last modified: 2024-03-26
+import os
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from threading import Lock
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "3.05"))
+DEFAULT_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "30"))
+DEFAULT_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "10"))
+DEFAULT_RETRIES = int(os.environ.get("HTTP_RETRIES", "3"))
+DEFAULT_BACKOFF = float(os.environ.get("HTTP_RETRY_BACKOFF", "0.5"))
+# Асинхронный клиент: общее число соединений и одновременных запросов к одному хосту
+ASYNC_MAX_CONNECTIONS = int(os.environ.get("HTTP_ASYNC_MAX_CONNECTIONS", "200"))
+ASYNC_PER_HOST_LIMIT = int(os.environ.get("HTTP_ASYNC_PER_HOST_LIMIT", "10"))
+
+# Размер пула соединений для хостов, к которым бот обращается чаще всего
+HOST_POOL_SIZES = {
+    'openrouter.ai': 20,
+    'generativelanguage.googleapis.com': 10,
+    'api.telegram.org': 10,
+}
+
+# Повторяем только идемпотентные запросы: повтор POST может, например, дважды отправить сообщение
+RETRY_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class PooledHTTPClient:
+    """
+    Общий HTTP-клиент с keep-alive соединениями.
+    Для каждого хоста из host_pool_sizes монтируется отдельный адаптер
+    с собственным пулом, остальные хосты используют общий адаптер.
+    Идемпотентные запросы повторяются с экспоненциальной задержкой.
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, host_pool_sizes: Optional[Dict[str, int]] = None,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES, backoff_factor: float = DEFAULT_BACKOFF):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.session = requests.Session()
+        self._adapters: Dict[str, HTTPAdapter] = {}
+        self._stats_lock = Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=backoff_factor, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=RETRY_METHODS, raise_on_status=False)
+        default_adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', default_adapter)
+        self.session.mount('https://', default_adapter)
+        self._adapters['*'] = default_adapter
+
+        for host, size in (HOST_POOL_SIZES if host_pool_sizes is None else host_pool_sizes).items():
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=retry)
+            self.session.mount(f'https://{host}/', adapter)
+            self._adapters[host] = adapter
+
+    def _timeout(self, timeout: Union[None, float, Tuple[float, float]]) -> Tuple[float, float]:
+        """Число задает таймаут чтения, таймаут соединения берется из настроек"""
+        if timeout is None:
+            return self.connect_timeout, self.read_timeout
+        if isinstance(timeout, tuple):
+            return timeout
+        return min(self.connect_timeout, timeout), timeout
+
+    def _record(self, host: str, elapsed: float, error: bool) -> None:
+        with self._stats_lock:
+            stats = self._stats.setdefault(host, {'requests': 0, 'errors': 0, 'total_time': 0.0})
+            stats['requests'] += 1
+            stats['total_time'] += elapsed
+            if error:
+                stats['errors'] += 1
+
+    def request(self, method: str, url: str, timeout: Union[None, float, Tuple[float, float]] = None,
+                **kwargs: Any) -> requests.Response:
+        host = urlparse(url).netloc.lower()
+        start_time = time.time()
+        error = True
+        try:
+            response = self.session.request(method, url, timeout=self._timeout(timeout), **kwargs)
+            error = response.status_code >= 500
+            return response
+        finally:
+            self._record(host, time.time() - start_time, error)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Статистика клиента: число запросов, ошибок и среднее время по хостам,
+        а также состояние пулов соединений urllib3 (открыто соединений, простаивает в пуле)
+        """
+        pools = {}
+        for name, adapter in self._adapters.items():
+            for key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is None:
+                    continue
+                pools[f"{pool.scheme}://{pool.host}"] = {
+                    'adapter': name,
+                    'maxsize': pool.pool.maxsize if pool.pool is not None else 0,
+                    'opened_connections': pool.num_connections,
+                    'idle_connections': pool.pool.qsize() if pool.pool is not None else 0,
+                    'requests': pool.num_requests,
+                }
+        with self._stats_lock:
+            hosts = {
+                host: {
+                    'requests': int(stats['requests']),
+                    'errors': int(stats['errors']),
+                    'avg_time': round(stats['total_time'] / stats['requests'], 3) if stats['requests'] else 0,
+                }
+                for host, stats in self._stats.items()
+            }
+        return {'hosts': hosts, 'pools': pools}
+
+
+class AsyncPooledHTTPClient:
+    """
+    Асинхронный аналог PooledHTTPClient поверх httpx.AsyncClient.
+    Число одновременных запросов к каждому хосту ограничено семафором
+    (размер из host_pool_sizes или per_host_limit), общее - max_connections.
+    Идемпотентные запросы повторяются с экспоненциальной задержкой.
+    Создается внутри работающего цикла событий и закрывается через aclose()
+    или async with.
+    """
+
+    def __init__(self, max_connections: int = ASYNC_MAX_CONNECTIONS, per_host_limit: int = ASYNC_PER_HOST_LIMIT,
+                 host_pool_sizes: Optional[Dict[str, int]] = None,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES, backoff_factor: float = DEFAULT_BACKOFF,
+                 headers: Optional[Dict[str, str]] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.per_host_limit = per_host_limit
+        self.host_pool_sizes = HOST_POOL_SIZES if host_pool_sizes is None else host_pool_sizes
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.client = httpx.AsyncClient(
+            headers=headers,
+            follow_redirects=True,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._in_flight = 0
+
+    async def __aenter__(self) -> "AsyncPooledHTTPClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        # Все обращения идут из одного цикла событий, блокировка не нужна
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.host_pool_sizes.get(host, self.per_host_limit))
+            self._semaphores[host] = semaphore
+        return semaphore
+
+    def _timeout(self, timeout: Union[None, float, Tuple[float, float]]) -> httpx.Timeout:
+        if timeout is None:
+            return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+        if isinstance(timeout, tuple):
+            return httpx.Timeout(timeout[1], connect=timeout[0])
+        return httpx.Timeout(timeout, connect=min(self.connect_timeout, timeout))
+
+    def _record(self, host: str, elapsed: float, error: bool) -> None:
+        stats = self._stats.setdefault(host, {'requests': 0, 'errors': 0, 'total_time': 0.0})
+        stats['requests'] += 1
+        stats['total_time'] += elapsed
+        if error:
+            stats['errors'] += 1
+
+    async def request(self, method: str, url: str, timeout: Union[None, float, Tuple[float, float]] = None,
+                      **kwargs: Any) -> httpx.Response:
+        host = urlparse(url).hostname or ''
+        retries = self.retries if method.upper() in RETRY_METHODS else 0
+        async with self._host_semaphore(host):
+            self._in_flight += 1
+            try:
+                attempt = 0
+                while True:
+                    start_time = time.time()
+                    try:
+                        response = await self.client.request(method, url, timeout=self._timeout(timeout), **kwargs)
+                    except httpx.TransportError:
+                        self._record(host, time.time() - start_time, True)
+                        if attempt >= retries:
+                            raise
+                    else:
+                        self._record(host, time.time() - start_time, response.status_code >= 500)
+                        if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                            return response
+                    await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+                    attempt += 1
+            finally:
+                self._in_flight -= 1
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, timeout: Union[None, float, Tuple[float, float]] = None,
+                     **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """Потоковый запрос без повторов: тело читается через aiter_lines() внутри async with"""
+        host = urlparse(url).hostname or ''
+        async with self._host_semaphore(host):
+            self._in_flight += 1
+            start_time = time.time()
+            error = True
+            try:
+                async with self.client.stream(method, url, timeout=self._timeout(timeout), **kwargs) as response:
+                    error = response.status_code >= 500
+                    yield response
+            finally:
+                self._record(host, time.time() - start_time, error)
+                self._in_flight -= 1
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика по хостам и число запросов в полете"""
+        hosts = {
+            host: {
+                'requests': int(stats['requests']),
+                'errors': int(stats['errors']),
+                'avg_time': round(stats['total_time'] / stats['requests'], 3) if stats['requests'] else 0,
+                'limit': self.host_pool_sizes.get(host, self.per_host_limit),
+            }
+            for host, stats in self._stats.items()
+        }
+        return {'hosts': hosts, 'in_flight': self._in_flight}
+
+
+# Общий клиент для AI-провайдеров, Telegram и служебных проверок
+http_client = PooledHTTPClient()
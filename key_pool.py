@@ -0,0 +1,277 @@
+# Last modified: 2024-03-26
+import os
+import re
+import hashlib
+import logging
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from typing import Any, Dict, Mapping, Optional, Set
+
+from flask import has_app_context
+from db import db
+from models import APIKeyState
+
+logger = logging.getLogger(__name__)
+
+# Пауза для ключа после 429 без Retry-After, секунды
+AI_KEY_COOLDOWN = float(os.environ.get("AI_KEY_COOLDOWN", "60"))
+# Автомат отключения: после стольких ошибок подряд ключ не используется AI_BREAKER_OPEN_SECONDS,
+# затем пропускается один пробный запрос
+AI_BREAKER_FAILURES = int(os.environ.get("AI_BREAKER_FAILURES", "3"))
+AI_BREAKER_OPEN_SECONDS = float(os.environ.get("AI_BREAKER_OPEN_SECONDS", "120"))
+# Как часто сверять состояние ключей с базой, секунды
+AI_KEY_POOL_SYNC = float(os.environ.get("AI_KEY_POOL_SYNC", "5"))
+# Дневные лимиты бесплатных моделей сбрасываются не позже чем через сутки
+MAX_COOLDOWN = 24 * 3600
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+_RETRY_DELAY_RE = re.compile(r'"retryDelay"\s*:\s*"(\d+(?:\.\d+)?)s"')
+
+
+def key_id(key: str) -> str:
+    """Короткий хэш ключа: по нему ключ виден в статистике и базе, сам ключ не раскрывается"""
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]
+
+
+def _timestamp(value: Optional[datetime]) -> float:
+    return (value - datetime(1970, 1, 1)).total_seconds() if value else 0.0
+
+
+def _datetime(value: float) -> Optional[datetime]:
+    return datetime.utcfromtimestamp(value) if value else None
+
+
+def _reset_time(value: str, now: float) -> Optional[float]:
+    """X-RateLimit-Reset: у OpenRouter это время в миллисекундах, у других - секунды или задержка"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if number > 1e12:
+        return number / 1000
+    if number > 1e9:
+        return number
+    return now + number
+
+
+def retry_after(headers: Optional[Mapping[str, str]], body: str = '', now: Optional[float] = None) -> Optional[float]:
+    """Момент (epoch), когда ключ снова можно использовать, по ответу 429; None, если ответ этого не говорит"""
+    now = now or time.time()
+    headers = {name.lower(): value for name, value in (headers or {}).items()}
+    value = headers.get('retry-after')
+    if value:
+        value = value.strip()
+        if value.isdigit():
+            return now + int(value)
+        try:
+            return parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            pass
+    if headers.get('x-ratelimit-reset'):
+        return _reset_time(headers['x-ratelimit-reset'], now)
+    # Gemini сообщает задержку в теле ответа: "retryDelay": "37s"
+    match = _RETRY_DELAY_RE.search(body or '')
+    if match:
+        return now + float(match.group(1))
+    return None
+
+
+class _KeyState:
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.updated_at = 0.0
+        # Пока идет пробный запрос полуоткрытого автомата - до этого момента; в базу не пишется
+        self.trial_until = 0.0
+
+
+class KeyPool:
+    """
+    Состояние ключей API провайдеров LLM, общее для потоков процесса
+    и через таблицу api_key_state - для всех процессов.
+    Ключ пропускается, пока действует пауза после 429 (по Retry-After или
+    X-RateLimit-Reset), пока исчерпана квота из X-RateLimit-Remaining и пока
+    открыт автомат отключения после нескольких ошибок подряд.
+    """
+
+    def __init__(self, failure_threshold: int = AI_BREAKER_FAILURES, open_seconds: float = AI_BREAKER_OPEN_SECONDS,
+                 default_cooldown: float = AI_KEY_COOLDOWN, sync_interval: float = AI_KEY_POOL_SYNC,
+                 clock=time.time):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.default_cooldown = default_cooldown
+        self.sync_interval = sync_interval
+        self.clock = clock
+        self._keys: Dict[str, _KeyState] = {}
+        self._dirty: Set[str] = set()
+        self._lock = Lock()
+        self._last_sync = 0.0
+        self._stats = {'skipped': 0, 'rate_limited': 0, 'breaker_opened': 0}
+
+    def _state(self, provider: str, key: str) -> _KeyState:
+        kid = key_id(key)
+        state = self._keys.get(kid)
+        if state is None:
+            state = self._keys[kid] = _KeyState(provider)
+        return state
+
+    def _touch(self, key: str, state: _KeyState) -> None:
+        state.updated_at = self.clock()
+        self._dirty.add(key_id(key))
+
+    def available(self, provider: str, key: str) -> bool:
+        """Можно ли отправить запрос с этим ключом сейчас"""
+        self.sync()
+        now = self.clock()
+        with self._lock:
+            state = self._state(provider, key)
+            if state.cooldown_until > now or (state.remaining == 0 and state.reset_at > now):
+                self._stats['skipped'] += 1
+                return False
+            if state.state in (STATE_OPEN, STATE_HALF_OPEN):
+                # Пауза прошла: пропускаем один пробный запрос, остальные ждут его результата.
+                # Если результат так и не пришел, через open_seconds пропускается следующий
+                if state.state == STATE_HALF_OPEN and state.trial_until > now:
+                    self._stats['skipped'] += 1
+                    return False
+                state.state = STATE_HALF_OPEN
+                state.trial_until = now + self.open_seconds
+            return True
+
+    def success(self, provider: str, key: str, headers: Optional[Mapping[str, str]] = None) -> None:
+        """Успешный ответ: автомат закрывается, квота обновляется по заголовкам X-RateLimit-*"""
+        now = self.clock()
+        lowered = {name.lower(): value for name, value in (headers or {}).items()}
+        with self._lock:
+            state = self._state(provider, key)
+            changed = state.state != STATE_CLOSED or state.failures or state.cooldown_until
+            state.state = STATE_CLOSED
+            state.failures = 0
+            state.cooldown_until = 0.0
+            state.trial_until = 0.0
+            if 'x-ratelimit-remaining' in lowered:
+                try:
+                    state.remaining = int(float(lowered['x-ratelimit-remaining']))
+                    state.reset_at = _reset_time(lowered.get('x-ratelimit-reset'), now) or 0.0
+                    changed = changed or state.remaining == 0
+                except ValueError:
+                    pass
+            if changed:
+                self._touch(key, state)
+        if changed:
+            self.flush()
+
+    def rate_limited(self, provider: str, key: str, headers: Optional[Mapping[str, str]] = None,
+                     body: str = '') -> None:
+        """Ответ 429: ключ не используется до сброса лимита"""
+        now = self.clock()
+        until = retry_after(headers, body, now) or now + self.default_cooldown
+        until = min(until, now + MAX_COOLDOWN)
+        with self._lock:
+            state = self._state(provider, key)
+            state.cooldown_until = max(state.cooldown_until, until)
+            state.remaining = 0
+            state.reset_at = state.cooldown_until
+            state.trial_until = 0.0
+            self._stats['rate_limited'] += 1
+            self._touch(key, state)
+        logger.warning(f"{provider} key {key_id(key)} rate limited for {until - now:.0f}s")
+        self.flush()
+
+    def failure(self, provider: str, key: str) -> None:
+        """Ошибка запроса (таймаут, 5xx): после failure_threshold подряд автомат открывается"""
+        now = self.clock()
+        with self._lock:
+            state = self._state(provider, key)
+            state.failures += 1
+            state.trial_until = 0.0
+            if state.state != STATE_HALF_OPEN and state.failures < self.failure_threshold:
+                return
+            state.state = STATE_OPEN
+            state.cooldown_until = max(state.cooldown_until, now + self.open_seconds)
+            self._stats['breaker_opened'] += 1
+            self._touch(key, state)
+        logger.warning(f"{provider} key {key_id(key)} disabled for {self.open_seconds:.0f}s "
+                       f"after {state.failures} failures")
+        self.flush()
+
+    def sync(self, force: bool = False) -> None:
+        """Записывает изменения в базу и читает состояние, записанное другими процессами"""
+        if not has_app_context() or (not force and self.clock() - self._last_sync < self.sync_interval):
+            return
+        self._last_sync = self.clock()
+        self.flush()
+        try:
+            rows = APIKeyState.query.all()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Key pool sync failed: {e}")
+            return
+        with self._lock:
+            for row in rows:
+                if row.key_id in self._dirty:
+                    continue
+                state = self._keys.get(row.key_id)
+                if state is None:
+                    state = self._keys[row.key_id] = _KeyState(row.provider)
+                if _timestamp(row.updated_at) <= state.updated_at:
+                    continue
+                state.state = row.state
+                state.failures = row.failures
+                state.cooldown_until = _timestamp(row.cooldown_until)
+                state.remaining = row.remaining
+                state.reset_at = _timestamp(row.reset_at)
+                state.updated_at = _timestamp(row.updated_at)
+
+    def flush(self) -> None:
+        """Сохраняет измененные состояния ключей; вне контекста приложения - при следующей синхронизации"""
+        if not has_app_context() or not self._dirty:
+            return
+        with self._lock:
+            dirty = {kid: self._keys[kid] for kid in self._dirty}
+            self._dirty = set()
+        try:
+            for kid, state in dirty.items():
+                row = db.session.get(APIKeyState, kid)
+                if row is None:
+                    row = APIKeyState(key_id=kid, provider=state.provider)
+                    db.session.add(row)
+                row.state = state.state
+                row.failures = state.failures
+                row.cooldown_until = _datetime(state.cooldown_until)
+                row.remaining = state.remaining
+                row.reset_at = _datetime(state.reset_at)
+                row.updated_at = _datetime(state.updated_at)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            with self._lock:
+                self._dirty.update(dirty)
+            logger.warning(f"Key pool store failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        now = self.clock()
+        with self._lock:
+            keys = {
+                f"{state.provider}:{kid}": {
+                    'state': state.state,
+                    'failures': state.failures,
+                    'cooldown': max(0, round(state.cooldown_until - now)),
+                    'remaining': state.remaining,
+                }
+                for kid, state in self._keys.items()
+            }
+            return {'keys': keys, **self._stats}
+
+
+# Общий пул процесса: AIService создается на каждую статью, а паузы ключей должны сохраняться
+key_pool = KeyPool()
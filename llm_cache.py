@@ -0,0 +1,134 @@
+# Last modified: 2024-03-26
+import os
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Any, Dict, Optional
+from flask import has_app_context
+from db import db
+from models import LLMCacheEntry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = int(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000"))
+MEMORY_MAX_ENTRIES = 500
+# last_used_at обновляется не чаще раза в минуту, чтобы попадания не превращались в запись
+TOUCH_INTERVAL = timedelta(minutes=1)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Нормализует текст для ключа кэша: регистр и пробелы не влияют на ключ"""
+    return _WHITESPACE_RE.sub(' ', text or '').strip().lower()
+
+
+def make_cache_key(kind: str, article_data: Dict[str, Any], provider: str, model: str,
+                   style: str = "", temperature: float = 0.7) -> str:
+    """Ключ кэша: хэш нормализованного заголовка и текста + параметры генерации"""
+    content_hash = hashlib.sha256(
+        (normalize_text(article_data.get('title')) + '\n' + normalize_text(article_data.get('content'))).encode('utf-8')
+    ).hexdigest()
+    key_input = f"{kind}|{content_hash}|{provider}|{model}|{style}|{temperature}"
+    return hashlib.sha256(key_input.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Двухуровневый кэш ответов LLM: LRU в памяти процесса и таблица
+    llm_cache_entry, общая для всех воркеров gunicorn и worker.py.
+    Записи живут ttl секунд, при превышении max_entries удаляются
+    давно не использованные
+    """
+
+    def __init__(self, ttl_seconds: int = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 memory_max_entries: int = MEMORY_MAX_ENTRIES):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self.memory_max_entries = memory_max_entries
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = Lock()
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if not entry:
+                return None
+            expires_at, value = entry
+            if expires_at < datetime.utcnow():
+                self._memory.pop(key, None)
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _memory_set(self, key: str, value: str, expires_at: datetime) -> None:
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._memory_get(key)
+        if value:
+            return value
+        # Вне контекста приложения работаем только с памятью
+        if not has_app_context():
+            return None
+        try:
+            now = datetime.utcnow()
+            entry = db.session.get(LLMCacheEntry, key)
+            if not entry or entry.expires_at < now:
+                return None
+            if now - entry.last_used_at > TOUCH_INTERVAL:
+                entry.last_used_at = now
+                entry.hits = (entry.hits or 0) + 1
+                db.session.commit()
+            self._memory_set(key, entry.response, entry.expires_at)
+            return entry.response
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"LLM cache lookup failed: {e}")
+            return None
+
+    def set(self, key: str, value: str, kind: str = "", provider: str = "", model: str = "") -> None:
+        if not value:
+            return
+        now = datetime.utcnow()
+        expires_at = now + self.ttl
+        self._memory_set(key, value, expires_at)
+        if not has_app_context():
+            return
+        try:
+            entry = db.session.get(LLMCacheEntry, key)
+            if entry:
+                entry.response = value
+                entry.expires_at = expires_at
+                entry.last_used_at = now
+            else:
+                db.session.add(LLMCacheEntry(key=key, kind=kind, provider=provider, model=model,
+                                             response=value, created_at=now, last_used_at=now,
+                                             expires_at=expires_at))
+            db.session.commit()
+            self._evict(now)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"LLM cache store failed: {e}")
+
+    def _evict(self, now: datetime) -> None:
+        """Удаляет просроченные записи и самые давно использованные сверх лимита"""
+        LLMCacheEntry.query.filter(LLMCacheEntry.expires_at < now).delete(synchronize_session=False)
+        excess = LLMCacheEntry.query.count() - self.max_entries
+        if excess > 0:
+            stale_keys = [row.key for row in LLMCacheEntry.query.with_entities(LLMCacheEntry.key)
+                          .order_by(LLMCacheEntry.last_used_at.asc()).limit(excess).all()]
+            LLMCacheEntry.query.filter(LLMCacheEntry.key.in_(stale_keys)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+# Общий экземпляр на процесс: AIService создается заново для каждой статьи
+llm_cache = LLMResponseCache()
@@ -0,0 +1,352 @@
+# Last modified: 2024-03-26
+import os
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+from key_pool import key_id
+
+logger = logging.getLogger(__name__)
+
+# Выбирать самый быстрый провайдер из настроенных, а не только выбранный в BotSettings
+AI_ROUTING = os.environ.get("AI_ROUTING", "1") != "0"
+# Дублировать запрос другому провайдеру, если ответа нет дольше p90 задержки
+AI_HEDGE = os.environ.get("AI_HEDGE", "1") != "0"
+# Дублирующий запрос отправляется не раньше чем через столько секунд
+AI_HEDGE_MIN_DELAY = float(os.environ.get("AI_HEDGE_MIN_DELAY", "3"))
+# Сколько последних замеров задержки хранить на эндпоинт
+AI_LATENCY_WINDOW = int(os.environ.get("AI_LATENCY_WINDOW", "50"))
+# Оценка задержки, пока по провайдеру нет ни замеров, ни аналитики
+DEFAULT_LATENCY = 10.0
+# Меньше замеров - p90 считается ненадежным и берется удвоенная медиана
+MIN_SAMPLES_FOR_P90 = 5
+ROUTER_THREADS = 16
+# Пороги перегрузки, после которых статьи резюмируются локально (0 - не проверять):
+# число загруженных статей в очереди на резюме (общей для всех процессов,
+# см. report_backlog) и ожидаемая задержка лучшего эндпоинта в секундах
+AI_LOCAL_BACKLOG = int(os.environ.get("AI_LOCAL_BACKLOG", "50"))
+AI_LOCAL_MAX_LATENCY = float(os.environ.get("AI_LOCAL_MAX_LATENCY", "60"))
+# При перегрузке по задержке раз в столько секунд запрос все же уходит в LLM, чтобы обновить замеры
+AI_LOCAL_PROBE_INTERVAL = float(os.environ.get("AI_LOCAL_PROBE_INTERVAL", "30"))
+
+
+class Attempt(NamedTuple):
+    """Один вариант выполнения запроса: эндпоинт (провайдер, модель, ключ) и вызов"""
+    endpoint: str
+    provider: str
+    call: Callable[[], Any]
+
+
+def endpoint_name(provider: str, model: str, key: Optional[str] = None) -> str:
+    """Имя эндпоинта для статистики; вместо ключа - короткий хэш, чтобы ключ не попал в логи"""
+    return f"{provider}:{model}:{key_id(key) if key else '-'}"
+
+
+def _quantile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _EndpointState:
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+
+
+class ProviderRouter:
+    """
+    Маршрутизация запросов к LLM по провайдерам, моделям и ключам.
+    Для каждого эндпоинта хранятся последние задержки успешных ответов и ошибки.
+    Запрос уходит самому быстрому эндпоинту; если ответа нет дольше p90 его
+    задержки, запрос дублируется другому провайдеру и берется первый ответ.
+    Пока замеров нет, задержка оценивается по AnalyticsData.summary_generation_time.
+    Ключи на паузе после 429 и с открытым автоматом отсеивает KeyPool до маршрутизации.
+    overload_reason() сообщает, что очередь статей на резюме или ожидаемая задержка
+    больше порогов и статью лучше резюмировать локально.
+    """
+
+    def __init__(self, hedge: bool = AI_HEDGE, min_hedge_delay: float = AI_HEDGE_MIN_DELAY,
+                 window: int = AI_LATENCY_WINDOW, max_backlog: int = AI_LOCAL_BACKLOG,
+                 max_latency: float = AI_LOCAL_MAX_LATENCY, probe_interval: float = AI_LOCAL_PROBE_INTERVAL):
+        self.hedge = hedge
+        self.min_hedge_delay = min_hedge_delay
+        self.window = window
+        self.max_backlog = max_backlog
+        self.max_latency = max_latency
+        self.probe_interval = probe_interval
+        self.in_flight = 0
+        self.backlog = 0
+        self._last_probe = 0.0
+        self.seeded = False
+        self._endpoints: Dict[str, _EndpointState] = {}
+        # Оценка по провайдеру из аналитики: (медиана, p90)
+        self._priors: Dict[str, tuple] = {}
+        self._lock = Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats = {'hedged': 0, 'hedge_wins': 0, 'fallbacks': 0, 'overloaded': 0}
+
+    def _state(self, endpoint: str) -> _EndpointState:
+        state = self._endpoints.get(endpoint)
+        if state is None:
+            state = self._endpoints[endpoint] = _EndpointState(self.window)
+        return state
+
+    def seed(self, latencies: Dict[str, List[float]]) -> None:
+        """Начальные оценки задержки по провайдерам: provider -> список времен генерации"""
+        with self._lock:
+            for provider, values in latencies.items():
+                if values:
+                    self._priors[provider] = (_quantile(values, 0.5), _quantile(values, 0.9))
+            self.seeded = True
+
+    def seed_from_analytics(self, limit: int = 1000) -> None:
+        """Оценки по последним записям AnalyticsData. Нужен контекст приложения"""
+        from models import AnalyticsData
+        rows = (AnalyticsData.query
+                .with_entities(AnalyticsData.ai_provider, AnalyticsData.summary_generation_time)
+                .filter(AnalyticsData.summary_generation_time > 0)
+                .order_by(AnalyticsData.id.desc())
+                .limit(limit).all())
+        latencies: Dict[str, List[float]] = {}
+        for provider, seconds in rows:
+            latencies.setdefault(provider, []).append(seconds)
+        self.seed(latencies)
+        logger.info(f"LLM router seeded from {len(rows)} analytics records: "
+                    + ", ".join(f"{p}={v[0]:.1f}s" for p, v in self._priors.items()))
+
+    def ensure_seeded(self) -> None:
+        if self.seeded:
+            return
+        try:
+            self.seed_from_analytics()
+        except Exception as e:
+            logger.warning(f"Could not seed LLM router from analytics: {e}")
+            self.seeded = True
+
+    def record(self, endpoint: str, latency: float, ok: bool) -> None:
+        with self._lock:
+            state = self._state(endpoint)
+            state.requests += 1
+            if ok:
+                state.latencies.append(latency)
+            else:
+                state.errors += 1
+
+    def expected_latency(self, attempt: Attempt) -> float:
+        state = self._endpoints.get(attempt.endpoint)
+        if state and state.latencies:
+            return _quantile(list(state.latencies), 0.5)
+        return self._priors.get(attempt.provider, (DEFAULT_LATENCY,))[0]
+
+    def hedge_delay(self, attempt: Attempt) -> float:
+        """Через сколько секунд без ответа дублировать запрос: p90 задержки эндпоинта"""
+        state = self._endpoints.get(attempt.endpoint)
+        if state and len(state.latencies) >= MIN_SAMPLES_FOR_P90:
+            p90 = _quantile(list(state.latencies), 0.9)
+        elif attempt.provider in self._priors:
+            p90 = self._priors[attempt.provider][1]
+        else:
+            p90 = 2 * self.expected_latency(attempt)
+        return max(self.min_hedge_delay, p90)
+
+    def rank(self, attempts: List[Attempt], preferred: Optional[str] = None) -> List[Attempt]:
+        """
+        Эндпоинты по возрастанию ожидаемой задержки, при равенстве -
+        выбранный провайдер и исходный порядок ключей
+        """
+        with self._lock:
+            order = {attempt.endpoint: index for index, attempt in enumerate(attempts)}
+            return sorted(attempts, key=lambda a: (self.expected_latency(a), a.provider != preferred,
+                                                   order[a.endpoint]))
+
+    def report_backlog(self, count: int) -> None:
+        """
+        Число статей со статусом fetched, ждущих резюме. Этап summarize сообщает его
+        перед захватом статей: запросов в работе у процесса мало (один поток summarize
+        по умолчанию), а отставание видно только по общей очереди
+        """
+        with self._lock:
+            self.backlog = count
+
+    def overload_reason(self, attempts: List[Attempt]) -> Optional[str]:
+        """
+        Причина не отправлять запрос в LLM: очередь на резюме длиннее max_backlog
+        или даже самый быстрый эндпоинт отвечает дольше max_latency. None - можно отправлять
+        """
+        with self._lock:
+            reason = None
+            if self.max_backlog and self.backlog >= self.max_backlog:
+                reason = f"LLM backlog: {self.backlog} fetched articles >= {self.max_backlog}"
+            elif self.max_latency and attempts:
+                best = min(self.expected_latency(attempt) for attempt in attempts)
+                now = time.time()
+                if best > self.max_latency:
+                    if now - self._last_probe < self.probe_interval:
+                        reason = f"expected LLM latency {best:.1f}s > {self.max_latency:.0f}s"
+                    else:
+                        # Пробный запрос: без него медленный эндпоинт никогда не получит новых замеров
+                        self._last_probe = now
+            if reason:
+                self._stats['overloaded'] += 1
+            return reason
+
+    def _enter(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def _leave(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    @staticmethod
+    def _pop_hedge(queue: List[Attempt], provider: str) -> Attempt:
+        """Следующий эндпоинт другого провайдера, а если других нет - следующий по очереди"""
+        for index, attempt in enumerate(queue):
+            if attempt.provider != provider:
+                return queue.pop(index)
+        return queue.pop(0)
+
+    def _timed(self, attempt: Attempt) -> Any:
+        start_time = time.time()
+        result = None
+        try:
+            result = attempt.call()
+        except Exception as e:
+            logger.warning(f"LLM endpoint {attempt.endpoint} error: {e}")
+        self.record(attempt.endpoint, time.time() - start_time, bool(result))
+        return result
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=ROUTER_THREADS, thread_name_prefix='llm-router')
+            return self._executor
+
+    def run(self, attempts: List[Attempt], preferred: Optional[str] = None) -> Any:
+        self._enter()
+        try:
+            return self._run(attempts, preferred)
+        finally:
+            self._leave()
+
+    def _run(self, attempts: List[Attempt], preferred: Optional[str] = None) -> Any:
+        """
+        Выполняет запрос через самый быстрый эндпоинт и возвращает первый непустой ответ.
+        При ошибке сразу пробуется следующий эндпоинт; опоздавший дубль
+        дорабатывает в фоне и попадает только в статистику
+        """
+        queue = self.rank(attempts, preferred)
+        if not self.hedge or len(queue) < 2:
+            for index, attempt in enumerate(queue):
+                if index:
+                    self._stats['fallbacks'] += 1
+                result = self._timed(attempt)
+                if result:
+                    return result
+            return None
+
+        executor = self._get_executor()
+        pending: Dict[Any, Attempt] = {}
+        hedged: Optional[Attempt] = None
+        first = queue.pop(0)
+        pending[executor.submit(self._timed, first)] = first
+        while pending:
+            timeout = self.hedge_delay(first) if hedged is None and queue else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = self._pop_hedge(queue, first.provider)
+                self._stats['hedged'] += 1
+                logger.info(f"No answer from {first.endpoint} after {timeout:.1f}s, hedging to {hedged.endpoint}")
+                pending[executor.submit(self._timed, hedged)] = hedged
+                continue
+            for future in done:
+                attempt = pending.pop(future)
+                result = future.result()
+                if result:
+                    if attempt is hedged:
+                        self._stats['hedge_wins'] += 1
+                    return result
+            if not pending and queue:
+                self._stats['fallbacks'] += 1
+                attempt = queue.pop(0)
+                pending[executor.submit(self._timed, attempt)] = attempt
+        return None
+
+    async def _atimed(self, attempt: Attempt) -> Any:
+        start_time = time.time()
+        result = None
+        try:
+            result = await attempt.call()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"LLM endpoint {attempt.endpoint} error: {e}")
+        self.record(attempt.endpoint, time.time() - start_time, bool(result))
+        return result
+
+    async def arun(self, attempts: List[Attempt], preferred: Optional[str] = None) -> Any:
+        self._enter()
+        try:
+            return await self._arun(attempts, preferred)
+        finally:
+            self._leave()
+
+    async def _arun(self, attempts: List[Attempt], preferred: Optional[str] = None) -> Any:
+        """Асинхронный аналог run: call возвращает корутину, проигравший дубль отменяется"""
+        queue = self.rank(attempts, preferred)
+        if not queue:
+            return None
+        pending: Dict[asyncio.Task, Attempt] = {}
+        hedged: Optional[Attempt] = None
+        first = queue.pop(0)
+        pending[asyncio.ensure_future(self._atimed(first))] = first
+        try:
+            while pending:
+                timeout = self.hedge_delay(first) if self.hedge and hedged is None and queue else None
+                done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = self._pop_hedge(queue, first.provider)
+                    self._stats['hedged'] += 1
+                    logger.info(f"No answer from {first.endpoint} after {timeout:.1f}s, "
+                                f"hedging to {hedged.endpoint}")
+                    pending[asyncio.ensure_future(self._atimed(hedged))] = hedged
+                    continue
+                for task in done:
+                    attempt = pending.pop(task)
+                    result = task.result()
+                    if result:
+                        if attempt is hedged:
+                            self._stats['hedge_wins'] += 1
+                        return result
+                if not pending and queue:
+                    self._stats['fallbacks'] += 1
+                    attempt = queue.pop(0)
+                    pending[asyncio.ensure_future(self._atimed(attempt))] = attempt
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {}
+            for name, state in self._endpoints.items():
+                latencies = list(state.latencies)
+                endpoints[name] = {
+                    'requests': state.requests,
+                    'errors': state.errors,
+                    'p50': round(_quantile(latencies, 0.5), 2) if latencies else None,
+                    'p90': round(_quantile(latencies, 0.9), 2) if latencies else None,
+                }
+            return {'endpoints': endpoints, 'in_flight': self.in_flight,
+                    'backlog': self.backlog,
+                    'priors': {p: round(v[0], 2) for p, v in self._priors.items()}, **self._stats}
+
+
+# Общий маршрутизатор процесса: AIService создается на каждую статью, статистика должна жить дольше
+llm_router = ProviderRouter()
@@ -0,0 +1,139 @@
+# Last modified: 2024-03-26
+import os
+import re
+import json
+import time
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Получать ответы LLM потоком (SSE): первый токен приходит раньше, а неудачный ответ можно оборвать
+AI_STREAMING = os.environ.get("AI_STREAMING", "1") != "0"
+# Сколько раз сразу перезапрашивать ответ, оборванный из-за первой строки; последняя попытка не обрывается
+AI_STREAM_RETRIES = int(os.environ.get("AI_STREAM_RETRIES", "1"))
+# Эмодзи должен стоять в первых символах строки, как требует validate_summary_quality
+HEADER_EMOJI_CHARS = 10
+# Первая строка длиннее этого без хештега считается ошибкой формата, не дожидаясь переноса строки
+HEADER_MAX_CHARS = 200
+
+EMOJI_PATTERN = re.compile(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]')
+HASHTAG_RE = re.compile(r'#\w+')
+# Метка строки хештегов комбинированного формата
+HEADER_LABEL = 'ХЕШТЕГИ'
+HEADER_LABEL_RE = re.compile(r'^ХЕШТЕГИ[\*\s]*:[\*\s]*', re.IGNORECASE)
+
+
+class GenerationRejected(Exception):
+    """Генерация оборвана: первая строка ответа не соответствует формату канала"""
+
+
+def header_verdict(text: str, complete: bool = False) -> Optional[bool]:
+    """
+    Проверка первой строки ответа по мере его получения: эмодзи в начале и хотя бы один хештег.
+    Метка "ХЕШТЕГИ:" комбинированного формата пропускается.
+    Возвращает None, пока решение принять нельзя; complete - ответ получен целиком
+    """
+    stripped = text.lstrip('*\r\n\t ')
+    newline = stripped.find('\n')
+    line_done = complete or newline >= 0
+    line = stripped if newline < 0 else stripped[:newline]
+    label = HEADER_LABEL_RE.match(line)
+    if label:
+        line = line[label.end():]
+    elif not line_done and HEADER_LABEL.startswith(line.rstrip(':* ').upper()):
+        # Метка еще не пришла целиком
+        return None
+    if EMOJI_PATTERN.search(line[:HEADER_EMOJI_CHARS]) and HASHTAG_RE.search(line):
+        return True
+    if line_done or len(line) > HEADER_MAX_CHARS:
+        return False
+    if len(line) >= HEADER_EMOJI_CHARS and not EMOJI_PATTERN.search(line[:HEADER_EMOJI_CHARS]):
+        return False
+    return None
+
+
+class StreamMonitor:
+    """
+    Собирает текст потокового ответа, замеряет время до первого токена (TTFT)
+    и, если check_header, проверяет первую строку: feed() бросает GenerationRejected,
+    как только строка заведомо не проходит header_verdict
+    """
+
+    def __init__(self, check_header: bool = False, clock: Callable[[], float] = time.monotonic):
+        self.check_header = check_header
+        self.clock = clock
+        self.started = clock()
+        self.ttft: Optional[float] = None
+        self._parts = []
+        self._decided = not check_header
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._parts)
+
+    def feed(self, delta: str) -> None:
+        if not delta:
+            return
+        if self.ttft is None:
+            self.ttft = self.clock() - self.started
+        self._parts.append(delta)
+        if not self._decided:
+            verdict = header_verdict(self.text)
+            if verdict is False:
+                raise GenerationRejected(f"bad header line: {self.text[:60]!r}")
+            self._decided = verdict is True
+
+    def finish(self) -> str:
+        """Текст ответа после конца потока; короткий ответ проверяется целиком"""
+        if not self._decided and not header_verdict(self.text, complete=True):
+            raise GenerationRejected(f"bad header line: {self.text[:60]!r}")
+        return self.text
+
+
+def is_event_stream(headers: Any) -> bool:
+    """Ответ пришел потоком SSE; ошибки и прокси без поддержки потока отвечают обычным JSON"""
+    return 'text/event-stream' in str(headers.get('content-type', ''))
+
+
+def _sse_data(line: Union[str, bytes]) -> Optional[str]:
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+    # Комментарии (": OPENROUTER PROCESSING"), event: и id: не несут текста
+    if not line.startswith('data:'):
+        return None
+    return line[5:].strip()
+
+
+def sse_events(lines: Iterable[Union[str, bytes]]) -> Iterator[Dict[str, Any]]:
+    """JSON-события потока SSE до "[DONE]" """
+    for line in lines:
+        data = _sse_data(line)
+        if data == '[DONE]':
+            return
+        if data:
+            yield json.loads(data)
+
+
+async def asse_events(lines: AsyncIterator[str]) -> AsyncIterator[Dict[str, Any]]:
+    """Асинхронный аналог sse_events для httpx Response.aiter_lines()"""
+    async for line in lines:
+        data = _sse_data(line)
+        if data == '[DONE]':
+            return
+        if data:
+            yield json.loads(data)
+
+
+def openrouter_delta(event: Dict[str, Any]) -> str:
+    """Фрагмент текста из события потока chat/completions"""
+    if 'error' in event:
+        raise ValueError(f"OpenRouter stream error: {event['error']}")
+    choices = event.get('choices') or [{}]
+    return (choices[0].get('delta') or {}).get('content') or ''
+
+
+def gemini_delta(event: Dict[str, Any]) -> str:
+    """Фрагмент текста из события streamGenerateContent"""
+    parts = (event.get('candidates') or [{}])[0].get('content', {}).get('parts') or []
+    return ''.join(part.get('text', '') for part in parts)
@@ -0,0 +1,142 @@
+# Last modified: 2024-03-26
+import os
+import re
+import time
+import logging
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from prompt_budget import split_sentences
+
+logger = logging.getLogger(__name__)
+
+# Резюмировать статьи локально, когда LLM недоступна или перегружена
+AI_LOCAL_FALLBACK = os.environ.get("AI_LOCAL_FALLBACK", "1") != "0"
+# Сколько предложений статьи попадает в локальное резюме
+LOCAL_SUMMARY_SENTENCES = int(os.environ.get("AI_LOCAL_SUMMARY_SENTENCES", "3"))
+# validate_summary_quality не пропускает абзацы длиннее 200 символов
+MAX_PARAGRAPH_CHARS = 200
+# Подписи к фото, даты и прочие короткие фрагменты в резюме не берутся
+MIN_SENTENCE_CHARS = 40
+# Параметры TextRank: коэффициент затухания и число итераций степенного метода
+DAMPING = 0.85
+TEXTRANK_ITERATIONS = 30
+# Предложение почти повторяет уже выбранное (косинусная близость выше порога) - пропускаем
+MAX_REDUNDANCY = 0.6
+# Вместо морфологии слова сравниваются по первым символам: "нефти" и "нефтью" совпадают
+STEM_LENGTH = 6
+
+_WORD_RE = re.compile(r'[а-яёa-z0-9]{3,}')
+STOP_WORDS = frozenset("""
+что как это для его она они был была были было будет при также уже еще если или
+чем так все всех этот этого этой эти того при после более над под без между через
+который которая которые которых году года лет заявил заявила сообщил сообщила
+""".split())
+
+
+def _stems(sentence: str) -> List[str]:
+    return [word[:STEM_LENGTH] for word in _WORD_RE.findall(sentence.lower()) if word not in STOP_WORDS]
+
+
+class ExtractiveSummarizer:
+    """
+    Локальное экстрактивное резюме без обращения к LLM.
+    Предложения статьи переводятся в векторы TF-IDF, матрица их косинусной
+    близости задает граф, а ранг предложения считается TextRank
+    с персонализацией: переходы чаще ведут к началу статьи и к предложениям,
+    близким к заголовку. Лучшие предложения без повторов выводятся в исходном
+    порядке отдельными абзацами, каждый не длиннее MAX_PARAGRAPH_CHARS
+    """
+
+    def __init__(self, sentences: int = LOCAL_SUMMARY_SENTENCES):
+        self.sentences = sentences
+        self._lock = Lock()
+        self._stats = {'summaries': 0, 'empty': 0, 'total_time': 0.0}
+
+    def rank(self, title: str, sentences: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Ранг TextRank каждого предложения и нормированные векторы TF-IDF предложений"""
+        stems = [_stems(sentence) for sentence in sentences]
+        vocabulary: Dict[str, int] = {}
+        rows, cols = [], []
+        for row, words in enumerate(stems):
+            for word in words:
+                rows.append(row)
+                cols.append(vocabulary.setdefault(word, len(vocabulary)))
+        count = len(sentences)
+        if not vocabulary:
+            return np.full(count, 1.0 / count), np.zeros((count, 0))
+
+        tf = np.zeros((count, len(vocabulary)))
+        np.add.at(tf, (np.array(rows), np.array(cols)), 1.0)
+        idf = np.log((1.0 + count) / (1.0 + np.count_nonzero(tf, axis=0))) + 1.0
+        vectors = np.log1p(tf) * idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1.0)
+
+        similarity = vectors @ vectors.T
+        np.fill_diagonal(similarity, 0.0)
+        out_weight = similarity.sum(axis=1, keepdims=True)
+        # Предложение без общих слов с остальными переходит в любое с равной вероятностью
+        transition = np.where(out_weight > 0, similarity / np.where(out_weight > 0, out_weight, 1.0), 1.0 / count)
+
+        title_vector = np.zeros(len(vocabulary))
+        for word in _stems(title):
+            index = vocabulary.get(word)
+            if index is not None:
+                title_vector[index] = idf[index]
+        title_similarity = vectors @ title_vector
+        if title_similarity.any():
+            title_similarity /= title_similarity.max()
+        personalization = 1.0 / np.arange(1, count + 1) + title_similarity
+        personalization /= personalization.sum()
+
+        scores = np.full(count, 1.0 / count)
+        for _ in range(TEXTRANK_ITERATIONS):
+            scores = (1.0 - DAMPING) * personalization + DAMPING * (transition.T @ scores)
+        return scores, vectors
+
+    def select(self, title: str, content: str) -> List[str]:
+        """Лучшие предложения статьи в исходном порядке"""
+        candidates = [sentence for sentence in split_sentences(content or '')
+                      if MIN_SENTENCE_CHARS <= len(sentence) <= MAX_PARAGRAPH_CHARS
+                      and not sentence.endswith(('?', '…', '...'))]
+        if not candidates:
+            return []
+        scores, vectors = self.rank(title or '', candidates)
+        chosen: List[int] = []
+        for index in np.argsort(-scores, kind='stable'):
+            if chosen and vectors.shape[1] and (vectors[chosen] @ vectors[index]).max() > MAX_REDUNDANCY:
+                continue
+            chosen.append(int(index))
+            if len(chosen) == self.sentences:
+                break
+        return [candidates[index] for index in sorted(chosen)]
+
+    def summarize(self, title: str, content: str, header: str) -> Optional[str]:
+        """
+        Резюме в формате канала: первая строка header (эмодзи и хештеги),
+        затем выбранные предложения через пустую строку.
+        None, если в статье нет подходящих предложений
+        """
+        start_time = time.time()
+        selected = self.select(title, content)
+        summary = '\n\n'.join([header] + selected) if selected else None
+        with self._lock:
+            self._stats['summaries' if summary else 'empty'] += 1
+            self._stats['total_time'] += time.time() - start_time
+        return summary
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self._stats['summaries'] + self._stats['empty']
+            return {
+                'summaries': self._stats['summaries'],
+                'empty': self._stats['empty'],
+                'avg_ms': round(self._stats['total_time'] / calls * 1000, 3) if calls else 0,
+            }
+
+
+# Общий экземпляр для всех AIService
+local_summarizer = ExtractiveSummarizer()
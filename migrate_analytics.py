@@ -0,0 +1,35 @@
+# Last modified: 2024-03-26
+from app import app
+from models import db
+import logging
+from sqlalchemy import inspect, text
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Колонки аналитики генерации, которых нет в старых базах
+ANALYTICS_COLUMNS = {
+    'prompt_tokens': "INTEGER",
+    'ttft': "FLOAT",
+}
+
+def migrate_analytics():
+    try:
+        with app.app_context():
+            existing = {column['name'] for column in inspect(db.engine).get_columns('analytics_data')}
+            for name, ddl in ANALYTICS_COLUMNS.items():
+                if name not in existing:
+                    db.session.execute(text(f"ALTER TABLE analytics_data ADD COLUMN {name} {ddl}"))
+                    logger.info(f"Added column analytics_data.{name}")
+            db.session.commit()
+            logger.info("Analytics migration complete.")
+    except Exception as e:
+        logger.error(f"Error during migration: {e}")
+        raise
+
+if __name__ == "__main__":
+    migrate_analytics()
@@ -0,0 +1,71 @@
+# Last modified: 2024-03-26
+from app import app
+from models import db, NewsArticle, STATUS_FETCHED, STATUS_SUMMARIZED, STATUS_POSTED
+import logging
+from sqlalchemy import bindparam, inspect, text
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Колонки состояния конвейера, которых нет в старых базах
+PIPELINE_COLUMNS = {
+    'status': f"VARCHAR(20) NOT NULL DEFAULT '{STATUS_FETCHED}'",
+    'attempts': "INTEGER NOT NULL DEFAULT 0",
+    'next_attempt_at': "TIMESTAMP",
+    'last_error': "TEXT",
+    'locked_by': "VARCHAR(64)",
+    'locked_until': "TIMESTAMP",
+    'minhash': "TEXT",
+    'cluster_id': "INTEGER REFERENCES news_article (id) ON DELETE SET NULL",
+}
+
+def migrate_pipeline_state():
+    try:
+        with app.app_context():
+            existing = {column['name'] for column in inspect(db.engine).get_columns('news_article')}
+            for name, ddl in PIPELINE_COLUMNS.items():
+                if name not in existing:
+                    db.session.execute(text(f"ALTER TABLE news_article ADD COLUMN {name} {ddl}"))
+                    logger.info(f"Added column news_article.{name}")
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_article_queue ON news_article (status, next_attempt_at)"))
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_article_cluster ON news_article (cluster_id)"))
+            db.session.commit()
+
+            # Выставляем состояние существующим статьям
+            posted = NewsArticle.query.filter(NewsArticle.is_posted == True).update(
+                {NewsArticle.status: STATUS_POSTED}, synchronize_session=False)
+            summarized = NewsArticle.query.filter(
+                NewsArticle.is_posted == False,
+                NewsArticle.summary.isnot(None)
+            ).update({NewsArticle.status: STATUS_SUMMARIZED}, synchronize_session=False)
+            db.session.commit()
+            logger.info(f"Marked {posted} articles as posted, {summarized} as summarized")
+
+            # Повторные публикации мешают уникальному индексу: оставляем самую раннюю
+            duplicates = db.session.execute(text(
+                "SELECT p.id FROM posting_log p WHERE p.status IN ('pending', 'success') AND EXISTS ("
+                " SELECT 1 FROM posting_log q WHERE q.article_id = p.article_id"
+                " AND q.channel_id = p.channel_id AND q.status IN ('pending', 'success') AND q.id < p.id)"
+            )).scalars().all()
+            if duplicates:
+                db.session.execute(text("UPDATE posting_log SET status = 'duplicate' WHERE id IN :ids").bindparams(
+                    bindparam('ids', expanding=True)), {'ids': duplicates})
+                logger.info(f"Marked {len(duplicates)} repeated posting logs as duplicate")
+            db.session.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_posting_log_article_channel "
+                "ON posting_log (article_id, channel_id) WHERE status IN ('pending', 'success')"))
+            db.session.commit()
+
+            logger.info("Migration to pipeline state complete.")
+    except Exception as e:
+        logger.error(f"Error during migration: {e}")
+        raise
+
+if __name__ == "__main__":
+    migrate_pipeline_state()
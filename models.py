@@ -10,9 +10,25 @@ from zoneinfo import ZoneInfo
 MSK = ZoneInfo("Europe/Moscow")
 UTC = ZoneInfo("UTC")
 
+def to_msk(value: datetime) -> datetime:
+    """Приводит дату к Europe/Moscow, наивные даты считаются UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return value.astimezone(MSK)
+
 import logging
 logger = logging.getLogger(__name__)
 
+# Состояния статьи в конвейере обработки
+STATUS_DISCOVERED = 'discovered'  # найдена в ленте источника, в original_content пока превью
+STATUS_FETCHED = 'fetched'        # текст статьи загружен
+STATUS_SUMMARIZED = 'summarized'  # резюме и хештеги готовы
+STATUS_POSTED = 'posted'          # опубликована в канале
+STATUS_FAILED = 'failed'          # исчерпаны попытки обработки
+STATUS_DUPLICATE = 'duplicate'    # та же новость уже есть в другом источнике (см. cluster_id)
+PIPELINE_STATUSES = (STATUS_DISCOVERED, STATUS_FETCHED, STATUS_SUMMARIZED, STATUS_POSTED, STATUS_FAILED,
+                     STATUS_DUPLICATE)
+
 class NewsArticle(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     url = db.Column(db.String(255), unique=True, nullable=False)
@@ -23,6 +39,17 @@ class NewsArticle(db.Model):
     hashtags = db.Column(db.String(255), nullable=True)
     is_posted = db.Column(db.Boolean, default=False)
     posted_at = db.Column(db.DateTime, nullable=True)
+    # Состояние в конвейере обработки
+    status = db.Column(db.String(20), nullable=False, default=STATUS_FETCHED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    # Аренда задачи воркером: пока locked_until в будущем, другие воркеры статью не берут
+    locked_by = db.Column(db.String(64), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    # MinHash-подпись заголовка и текста (hex, см. dedup.py) и первая статья кластера почти одинаковых новостей
+    minhash = db.Column(db.Text, nullable=True)
+    cluster_id = db.Column(db.Integer, db.ForeignKey('news_article.id', ondelete='SET NULL'), nullable=True)
 
     def __init__(self, **kwargs):
         super().__init__()
@@ -109,6 +136,92 @@ class PostingLog(db.Model):
             else:
                 self.posted_at = self.posted_at.astimezone(MSK)
 
+    @classmethod
+    def reserve(cls, article_id: int, channel_id: str):
+        """
+        Резервирует публикацию статьи в канале записью со статусом pending.
+        Уникальный индекс по (article_id, channel_id) для pending/success
+        гарантирует, что статья уйдет в канал не больше одного раза.
+        Возвращает запись или None, если публикация уже есть
+        """
+        from sqlalchemy.exc import IntegrityError
+        log_entry = cls(article_id=article_id, channel_id=channel_id, status='pending')
+        db.session.add(log_entry)
+        try:
+            db.session.commit()
+            return log_entry
+        except IntegrityError:
+            db.session.rollback()
+            return None
+
+class SchedulerLease(db.Model):
+    """Аренда роли лидера: разовые задачи планировщика выполняет только держатель аренды"""
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(64), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    @classmethod
+    def acquire(cls, name: str, holder: str, ttl_seconds: int) -> bool:
+        """Захватывает или продлевает аренду. Возвращает True, если holder - лидер"""
+        from sqlalchemy import or_
+        from sqlalchemy.exc import IntegrityError
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=ttl_seconds)
+        try:
+            updated = cls.query.filter(
+                cls.name == name,
+                or_(cls.holder == holder, cls.expires_at < now)
+            ).update({cls.holder: holder, cls.expires_at: expires_at}, synchronize_session=False)
+            db.session.commit()
+            if updated:
+                return True
+            if db.session.get(cls, name):
+                return False
+            db.session.add(cls(name=name, holder=holder, expires_at=expires_at))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            # Аренду одновременно создал другой процесс
+            db.session.rollback()
+            return False
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Ошибка захвата аренды {name}: {e}")
+            return False
+
+    @classmethod
+    def release(cls, name: str, holder: str) -> None:
+        """Освобождает аренду, если она принадлежит holder"""
+        try:
+            cls.query.filter_by(name=name, holder=holder).delete()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Ошибка освобождения аренды {name}: {e}")
+
+class LLMCacheEntry(db.Model):
+    """Кэш ответов LLM, общий для всех процессов"""
+    key = db.Column(db.String(64), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # summary, hashtags
+    provider = db.Column(db.String(20), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+
+class APIKeyState(db.Model):
+    """Состояние ключа API, общее для всех процессов: квота, пауза после 429 и автомат отключения"""
+    key_id = db.Column(db.String(16), primary_key=True)  # хэш ключа, сам ключ не хранится
+    provider = db.Column(db.String(20), nullable=False)
+    state = db.Column(db.String(10), nullable=False, default='closed')  # closed, open, half_open
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    cooldown_until = db.Column(db.DateTime, nullable=True)
+    remaining = db.Column(db.Integer, nullable=True)
+    reset_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 class AnalyticsData(db.Model):
     """Модель для хранения аналитических данных"""
     id = db.Column(db.Integer, primary_key=True)
@@ -118,6 +231,8 @@ class AnalyticsData(db.Model):
     hashtags_generation_time = db.Column(db.Float, nullable=True)
     summary_length = db.Column(db.Integer, nullable=True)
     hashtags_count = db.Column(db.Integer, nullable=True)
+    prompt_tokens = db.Column(db.Integer, nullable=True)  # оценка размера запроса к LLM
+    ttft = db.Column(db.Float, nullable=True)  # время до первого токена потокового ответа, с
     views_count = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.now(MSK))
     
@@ -146,4 +261,10 @@ class AnalyticsData(db.Model):
 # Добавляем индексы для оптимизации запросов
 Index('idx_article_created', NewsArticle.created_at)
 Index('idx_article_posted', NewsArticle.is_posted, NewsArticle.summary.isnot(None))
-Index('idx_posting_log_date', PostingLog.posted_at)
\ No newline at end of file
+Index('idx_article_queue', NewsArticle.status, NewsArticle.next_attempt_at)
+Index('idx_article_cluster', NewsArticle.cluster_id)
+Index('idx_posting_log_date', PostingLog.posted_at)
+# Не больше одной активной или успешной публикации статьи в канале
+Index('uq_posting_log_article_channel', PostingLog.article_id, PostingLog.channel_id, unique=True,
+      postgresql_where=PostingLog.status.in_(['pending', 'success']),
+      sqlite_where=PostingLog.status.in_(['pending', 'success']))
\ No newline at end of file
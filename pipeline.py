@@ -0,0 +1,125 @@
+# Last modified: 2024-03-26
+import os
+import logging
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import or_
+from db import db
+from models import NewsArticle, STATUS_FAILED, PIPELINE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = int(os.environ.get("PIPELINE_LEASE_SECONDS", "300"))
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get("PIPELINE_MAX_ATTEMPTS", "5"))
+DEFAULT_BASE_BACKOFF = int(os.environ.get("PIPELINE_BASE_BACKOFF", "60"))
+DEFAULT_MAX_BACKOFF = int(os.environ.get("PIPELINE_MAX_BACKOFF", "3600"))
+
+
+class PipelineQueue:
+    """
+    Очередь задач конвейера поверх таблицы NewsArticle.
+    Воркер захватывает статьи в нужном состоянии на время аренды (lease),
+    после обработки переводит их в следующее состояние или откладывает
+    повторную попытку с экспоненциальной задержкой.
+    """
+
+    def __init__(self, worker_id: Optional[str] = None, lease_seconds: int = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, base_backoff: int = DEFAULT_BASE_BACKOFF,
+                 max_backoff: int = DEFAULT_MAX_BACKOFF):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+    def _claimable_query(self, status: str, now: datetime):
+        return NewsArticle.query.filter(
+            NewsArticle.status == status,
+            or_(NewsArticle.next_attempt_at.is_(None), NewsArticle.next_attempt_at <= now),
+            or_(NewsArticle.locked_until.is_(None), NewsArticle.locked_until <= now),
+        )
+
+    def claim(self, status: str, limit: int = 10) -> List[NewsArticle]:
+        """
+        Захватывает до limit статей в состоянии status.
+        На PostgreSQL используется SELECT ... FOR UPDATE SKIP LOCKED,
+        на остальных СУБД - условный UPDATE по токену захвата
+        """
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=self.lease_seconds)
+        token = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"[:64]
+        query = self._claimable_query(status, now).order_by(NewsArticle.created_at.desc()).limit(limit)
+
+        try:
+            if db.engine.dialect.name == 'postgresql':
+                articles = query.with_for_update(skip_locked=True).all()
+                for article in articles:
+                    article.locked_by = token
+                    article.locked_until = lease_until
+                db.session.commit()
+                return articles
+
+            # SQLite: запись в базу сериализуется, поэтому условный UPDATE атомарен
+            ids = [row.id for row in query.with_entities(NewsArticle.id).all()]
+            if not ids:
+                return []
+            self._claimable_query(status, now).filter(NewsArticle.id.in_(ids)).update(
+                {NewsArticle.locked_by: token, NewsArticle.locked_until: lease_until},
+                synchronize_session=False,
+            )
+            db.session.commit()
+            return NewsArticle.query.filter(NewsArticle.locked_by == token).order_by(
+                NewsArticle.created_at.desc()).all()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Ошибка захвата задач '{status}': {e}")
+            return []
+
+    def _unlock(self, article: NewsArticle) -> None:
+        article.locked_by = None
+        article.locked_until = None
+
+    def complete(self, article: NewsArticle, new_status: str) -> None:
+        """Переводит статью в следующее состояние конвейера"""
+        if new_status not in PIPELINE_STATUSES:
+            raise ValueError(f"Unknown pipeline status: {new_status}")
+        article.status = new_status
+        article.attempts = 0
+        article.next_attempt_at = None
+        article.last_error = None
+        self._unlock(article)
+        db.session.commit()
+
+    def fail(self, article: NewsArticle, error: str) -> None:
+        """Фиксирует неудачную попытку и планирует повтор с задержкой"""
+        article.attempts = (article.attempts or 0) + 1
+        article.last_error = str(error)[:1000]
+        if article.attempts >= self.max_attempts:
+            article.status = STATUS_FAILED
+            article.next_attempt_at = None
+            logger.error(f"Статья {article.id} переведена в failed после {article.attempts} попыток: {error}")
+        else:
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (article.attempts - 1))
+            article.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            logger.warning(f"Статья {article.id}: попытка {article.attempts} не удалась, повтор через {delay}с: {error}")
+        self._unlock(article)
+        db.session.commit()
+
+    def release(self, article: NewsArticle) -> None:
+        """Возвращает статью в очередь без учета попытки"""
+        self._unlock(article)
+        db.session.commit()
+
+    def requeue(self, article: NewsArticle, status: str) -> None:
+        """Возвращает статью (например, из failed) в указанное состояние"""
+        self.complete(article, status)
+
+    @staticmethod
+    def counts() -> Dict[str, int]:
+        """Количество статей в каждом состоянии конвейера"""
+        rows = db.session.query(NewsArticle.status, db.func.count(NewsArticle.id)).group_by(NewsArticle.status).all()
+        result = {status: 0 for status in PIPELINE_STATUSES}
+        result.update({status: count for status, count in rows})
+        return result
@@ -0,0 +1,129 @@
+# Last modified: 2024-03-26
+import os
+import heapq
+import random
+import logging
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы интервала опроса источника, минуты
+POLL_MIN_INTERVAL = float(os.environ.get("POLL_MIN_INTERVAL", "2"))
+POLL_MAX_INTERVAL = float(os.environ.get("POLL_MAX_INTERVAL", "60"))
+# Сколько новых статей в среднем ожидаем найти за один опрос
+POLL_TARGET_NEW = float(os.environ.get("POLL_TARGET_NEW", "1"))
+# Случайное отклонение интервала, доля: источники не опрашиваются синхронно
+POLL_JITTER = float(os.environ.get("POLL_JITTER", "0.1"))
+# Вес последнего наблюдения в скользящей оценке частоты публикаций
+POLL_RATE_SMOOTHING = 0.3
+
+
+class _SourceState:
+    def __init__(self, interval: float):
+        self.interval = interval
+        # Новых статей в минуту; начальная оценка дает интервал из описания источника
+        self.rate = POLL_TARGET_NEW / interval
+        self.next_poll = 0.0
+        self.last_poll: Optional[float] = None
+        self.seen_urls: Optional[Set[str]] = None
+
+
+class AdaptivePollScheduler:
+    """
+    Очередь опроса источников с приоритетом по времени следующего опроса.
+    По каждому источнику оценивается частота появления новых статей,
+    и следующий опрос назначается так, чтобы в среднем находить
+    target_new статей, в пределах [min_interval, max_interval] с джиттером.
+    """
+
+    def __init__(self, min_interval: float = POLL_MIN_INTERVAL, max_interval: float = POLL_MAX_INTERVAL,
+                 target_new: float = POLL_TARGET_NEW, jitter: float = POLL_JITTER,
+                 clock: Callable[[], float] = time.time):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_new = target_new
+        self.jitter = jitter
+        self.clock = clock
+        self._states: Dict[str, _SourceState] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._lock = Lock()
+
+    def _clamp(self, interval: float) -> float:
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def _state(self, source: Any) -> _SourceState:
+        state = self._states.get(source.name)
+        if state is None:
+            state = self._states[source.name] = _SourceState(self._clamp(source.poll_interval))
+            heapq.heappush(self._heap, (state.next_poll, source.name))
+        return state
+
+    def _schedule(self, name: str, state: _SourceState, now: float) -> None:
+        delay = state.interval * 60 * random.uniform(1 - self.jitter, 1 + self.jitter)
+        state.next_poll = now + delay
+        heapq.heappush(self._heap, (state.next_poll, name))
+
+    def due(self, sources: List[Any], force: bool = False) -> List[Any]:
+        """
+        Источники, время опроса которых наступило (все - при force).
+        Следующий опрос сразу назначается по текущему интервалу,
+        observe() уточняет его по результатам.
+        """
+        now = self.clock()
+        by_name = {source.name: source for source in sources}
+        with self._lock:
+            for source in sources:
+                self._state(source)
+            due_names: Set[str] = set(by_name) if force else set()
+            while self._heap and self._heap[0][0] <= now:
+                next_poll, name = heapq.heappop(self._heap)
+                state = self._states.get(name)
+                # Устаревшие записи кучи (после переназначения) пропускаем
+                if state is not None and next_poll == state.next_poll and name in by_name:
+                    due_names.add(name)
+            for name in due_names:
+                self._schedule(name, self._states[name], now)
+        return [source for source in sources if source.name in due_names]
+
+    def observe(self, source: Any, items: Optional[List[Dict[str, Any]]]) -> None:
+        """
+        Учитывает результат опроса: сколько статей появилось в ленте
+        с прошлого раза. Пустой список - лента не изменилась.
+        """
+        now = self.clock()
+        with self._lock:
+            state = self._state(source)
+            urls = {item['url'] for item in items or []}
+            # Частоту оцениваем, когда есть с чем сравнить: лента уже была получена хотя бы раз
+            if state.seen_urls:
+                new_count = len(urls - state.seen_urls) if urls else 0
+                elapsed = max((now - state.last_poll) / 60, self.min_interval / 2)
+                state.rate = (POLL_RATE_SMOOTHING * new_count / elapsed
+                              + (1 - POLL_RATE_SMOOTHING) * state.rate)
+                state.interval = self._clamp(self.target_new / state.rate if state.rate > 0 else self.max_interval)
+            state.last_poll = now
+            if urls:
+                state.seen_urls = urls
+            self._schedule(source.name, state, now)
+        logger.info(f"Next poll of {source.name} in {state.interval:.1f} min ({state.rate * 60:.1f} new/h)")
+
+    def next_poll_in(self) -> Optional[float]:
+        """Секунд до ближайшего опроса"""
+        with self._lock:
+            if not self._states:
+                return None
+            return max(0.0, min(state.next_poll for state in self._states.values()) - self.clock())
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        now = self.clock()
+        with self._lock:
+            return {
+                name: {
+                    'interval_minutes': round(state.interval, 2),
+                    'new_per_hour': round(state.rate * 60, 2),
+                    'next_poll_in': round(max(0.0, state.next_poll - now), 1),
+                }
+                for name, state in self._states.items()
+            }
@@ -0,0 +1,105 @@
+# Last modified: 2024-03-26
+import os
+import re
+import logging
+from typing import Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Бюджет запроса к LLM в токенах по моделям; AI_PROMPT_BUDGETS="модель=токены,..." переопределяет
+DEFAULT_PROMPT_BUDGET = int(os.environ.get("AI_PROMPT_TOKEN_BUDGET", "2500"))
+MODEL_PROMPT_BUDGETS: Dict[str, int] = {
+    'deepseek/deepseek-r1-0528:free': 2500,
+    'gemini-2.0-flash-001': 4000,
+}
+# Сколько токенов статьи оставлять, даже если шаблон запроса съел почти весь бюджет
+MIN_CONTENT_TOKENS = 300
+# Символов на токен: кириллица в BPE-токенизаторах дробится мельче латиницы
+CYRILLIC_CHARS_PER_TOKEN = 2.8
+LATIN_CHARS_PER_TOKEN = 4.0
+# Первые предложения новости обычно содержат главное
+LEAD_SENTENCES = 3
+
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?…])\s+|\n+')
+_NUMBER_RE = re.compile(r'\d')
+_UNIT_RE = re.compile(r'%|₽|\$|€|млрд|млн|трлн|руб|долл|б\.п\.|п\.п\.', re.IGNORECASE)
+_QUOTE_RE = re.compile(r'[«»„“”"]|:\s*[—–-]')
+_WORD_RE = re.compile(r'\w{4,}')
+
+
+def _parse_budgets(value: str) -> Dict[str, int]:
+    budgets = {}
+    for part in value.split(','):
+        model, _, tokens = part.strip().rpartition('=')
+        if model and tokens.isdigit():
+            budgets[model] = int(tokens)
+    return budgets
+
+
+MODEL_PROMPT_BUDGETS.update(_parse_budgets(os.environ.get("AI_PROMPT_BUDGETS", "")))
+
+
+def prompt_token_budget(model: str) -> int:
+    return MODEL_PROMPT_BUDGETS.get(model, DEFAULT_PROMPT_BUDGET)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Быстрая оценка числа токенов без токенизатора: длина строки в символах и в байтах UTF-8.
+    Кириллица занимает два байта, так что разница длин - число не-ASCII символов
+    """
+    if not text:
+        return 0
+    chars = len(text)
+    non_ascii = len(text.encode('utf-8')) - chars
+    return int(non_ascii / CYRILLIC_CHARS_PER_TOKEN + (chars - non_ascii) / LATIN_CHARS_PER_TOKEN) + 1
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_SPLIT_RE.split(text) if sentence and sentence.strip()]
+
+
+def _sentence_score(index: int, sentence: str, title_words: set, quotes: Sequence[str]) -> float:
+    score = 0.0
+    if index < LEAD_SENTENCES:
+        score += 3.0 - 0.5 * index
+    if _NUMBER_RE.search(sentence):
+        score += 2.0
+        if _UNIT_RE.search(sentence):
+            score += 1.0
+    if _QUOTE_RE.search(sentence) or any(quote[:40] in sentence for quote in quotes):
+        score += 2.0
+    if title_words:
+        score += len(title_words.intersection(word.lower() for word in _WORD_RE.findall(sentence))) / len(title_words)
+    if len(sentence) < 25:
+        score -= 1.0
+    return score
+
+
+def trim_to_budget(text: str, budget: int, title: str = '', quotes: Sequence[str] = ()) -> str:
+    """
+    Экстрактивное сокращение текста до budget токенов: предложения получают баллы
+    за место в начале статьи, цифры и проценты, цитаты и слова из заголовка,
+    берутся лучшие, пока помещаются, и выводятся в исходном порядке
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    sentences = split_sentences(text)
+    title_words = {word.lower() for word in _WORD_RE.findall(title or '')}
+    quotes = [quote for quote in quotes if quote]
+    ranked = sorted(range(len(sentences)),
+                    key=lambda i: (-_sentence_score(i, sentences[i], title_words, quotes), i))
+    chosen = []
+    used = 0
+    for index in ranked:
+        tokens = estimate_tokens(sentences[index]) + 1
+        if used + tokens > budget:
+            continue
+        chosen.append(index)
+        used += tokens
+    if not chosen:
+        # Даже лучшее предложение не помещается: обрезаем его по границе слова
+        best = sentences[ranked[0]] if sentences else text
+        limit = int(budget * CYRILLIC_CHARS_PER_TOKEN)
+        return best[:limit].rsplit(' ', 1)[0]
+    return ' '.join(sentences[index] for index in sorted(chosen))
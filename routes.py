@@ -4,14 +4,19 @@ from dotenv import load_dotenv
 load_dotenv()
 from flask import render_template, request, redirect, url_for, flash, jsonify
 from app import app, db
-from models import NewsArticle, BotSettings, PostingLog, AnalyticsData
+from models import NewsArticle, BotSettings, PostingLog, AnalyticsData, STATUS_SUMMARIZED
+from pipeline import PipelineQueue
 from scraper import SmartLabScraper
 from ai_service import AIService
 from telegram_bot import TelegramBotService
-from scheduler import news_scheduler
+from scheduler import news_scheduler, scheduler_runs_in_web
 import logging
 from datetime import datetime, timedelta
-import requests
+from http_client import http_client
+from llm_router import llm_router
+from key_pool import key_pool
+from local_summarizer import local_summarizer
+from sources import source_registry
 from flask import current_app
 import os
 import json
@@ -54,7 +59,7 @@ def test_gemini_api():
         url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
         params = {"key": ai_service.gemini_api_key}
         json_data = {"contents": [{"parts": [{"text": "Say hello"}]}]}
-        resp = requests.post(url, params=params, json=json_data, timeout=10)
+        resp = http_client.post(url, params=params, json=json_data, timeout=10)
         if resp.status_code == 200:
             return jsonify({"success": True, "message": "Gemini API доступен"})
         else:
@@ -68,7 +73,7 @@ def test_openrouter_api():
     api_key = current_app.config.get('OPENROUTER_API_KEY')
     headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
     try:
-        resp = requests.get("https://openrouter.ai/api/v1", headers=headers, timeout=10)
+        resp = http_client.get("https://openrouter.ai/api/v1", headers=headers, timeout=10)
         if resp.status_code == 200:
             return jsonify({"success": True, "message": "OpenRouter API доступен"})
         else:
@@ -142,11 +147,12 @@ def settings():
             db.session.commit()
             flash('Настройки успешно сохранены!', 'success')
             
-            # Start scheduler if posting is enabled
-            if settings.posting_enabled:
-                news_scheduler.start()
-            else:
-                news_scheduler.stop()
+            # Start scheduler if posting is enabled (в режиме worker им управляет worker.py)
+            if scheduler_runs_in_web():
+                if settings.posting_enabled:
+                    news_scheduler.start()
+                else:
+                    news_scheduler.stop()
                 
         except ValueError as e:
             flash('Ошибка в настройках: проверьте числовые значения', 'error')
@@ -250,6 +256,8 @@ def edit_summary(article_id):
         summary = request.form.get('summary', '').strip()
         if summary:
             article.summary = summary
+            if not article.is_posted:
+                article.status = STATUS_SUMMARIZED
             db.session.commit()
             flash('Резюме успешно обновлено!', 'success')
         else:
@@ -282,21 +290,27 @@ def regenerate_summary(article_id):
         # Замеряем время генерации
         start_time = time.time()
         
-        # Generate new summary
-        summary = ai_service.summarize_article(article_data, style=settings.summary_style)
+        # Generate new summary and hashtags in one request
+        usage = {}
+        summary, hashtags = ai_service.summarize_with_hashtags(
+            article_data,
+            style=settings.summary_style,
+            custom_tags=settings.custom_hashtags,
+            usage=usage
+        )
         
         summary_time = time.time() - start_time
         
         if summary:
             article.summary = summary
+            if not article.is_posted:
+                # Статья возвращается в очередь на публикацию, в том числе из failed
+                article.status = STATUS_SUMMARIZED
+                article.attempts = 0
+                article.next_attempt_at = None
             
-            # Замеряем время генерации хештегов
-            hashtags_start_time = time.time()
-            
-            # Also regenerate hashtags
-            hashtags = ai_service.generate_hashtags(article_data, custom_tags=settings.custom_hashtags)
-            
-            hashtags_time = time.time() - hashtags_start_time
+            # Хештеги получены тем же запросом
+            hashtags_time = 0.0
             
             if hashtags:
                 article.hashtags = ' '.join(hashtags)
@@ -312,10 +326,14 @@ def regenerate_summary(article_id):
                     )
                     db.session.add(analytics)
                 
+                # Резюме могло быть создано локально, без LLM
+                analytics.ai_provider = usage.get('provider') or ai_service.ai_provider
                 analytics.summary_generation_time = summary_time
                 analytics.hashtags_generation_time = hashtags_time
                 analytics.summary_length = len(summary)
                 analytics.hashtags_count = len(hashtags) if hashtags else 0
+                analytics.prompt_tokens = usage.get('prompt_tokens')
+                analytics.ttft = usage.get('ttft')
                 db.session.commit()
             except Exception as analytics_error:
                 logger.error(f"Ошибка при сохранении аналитики: {analytics_error}")
@@ -443,7 +461,7 @@ def api_stats():
         
         # Статистика по источникам
         sources = {}
-        for domain in ['smartlab.news', 'rbc.ru', 'vedomosti.ru']:
+        for domain in [source.domain for source in source_registry.all()]:
             count = NewsArticle.query.filter(NewsArticle.url.like(f'%{domain}%')).count()
             sources[domain] = count
         
@@ -455,7 +473,18 @@ def api_stats():
             'recent_articles': recent_count,
             'avg_summary_time': round(avg_summary_time, 2),
             'avg_hashtags_time': round(avg_hashtags_time, 2),
-            'sources': sources
+            'sources': sources,
+            'last_scrape': news_scheduler.last_scrape_stats,
+            'queue': PipelineQueue.counts(),
+            'http': http_client.stats(),
+            'listings': news_scheduler.scraper.listing_tracker.stats(),
+            'polling': news_scheduler.poller.stats(),
+            'seen_urls': news_scheduler.seen_urls.stats(),
+            'extraction': news_scheduler.extraction_pool.stats(),
+            'scrape_cache': news_scheduler.scraper.cache.stats(),
+            'llm_router': llm_router.stats(),
+            'llm_keys': key_pool.stats(),
+            'local_summarizer': local_summarizer.stats()
         })
         
     except Exception as e:
@@ -491,8 +520,29 @@ def api_analytics():
                 'articles': articles_count
             })
         
+        # Время генерации резюме в зависимости от размера запроса, шаг 500 токенов
+        bucket = (AnalyticsData.prompt_tokens // 500) * 500
+        latency_by_size = [
+            {'prompt_tokens': int(size), 'avg_time': round(avg_time, 2), 'count': count}
+            for size, avg_time, count in db.session.query(
+                bucket, db.func.avg(AnalyticsData.summary_generation_time), db.func.count(AnalyticsData.id)
+            ).filter(AnalyticsData.prompt_tokens.isnot(None)).group_by(bucket).order_by(bucket).all()
+        ]
+        
+        # Время до первого токена и полное время генерации по провайдерам
+        ttft_by_provider = [
+            {'provider': provider, 'avg_ttft': round(avg_ttft, 2), 'avg_time': round(avg_time or 0, 2),
+             'count': count}
+            for provider, avg_ttft, avg_time, count in db.session.query(
+                AnalyticsData.ai_provider, db.func.avg(AnalyticsData.ttft),
+                db.func.avg(AnalyticsData.summary_generation_time), db.func.count(AnalyticsData.id)
+            ).filter(AnalyticsData.ttft.isnot(None)).group_by(AnalyticsData.ai_provider).all()
+        ]
+        
         return jsonify({
-            'daily_stats': result
+            'daily_stats': result,
+            'latency_by_prompt_size': latency_by_size,
+            'ttft_by_provider': ttft_by_provider
         })
         
     except Exception as e:
@@ -530,7 +580,7 @@ def analytics():
     
     # Статистика по источникам
     sources = {}
-    for domain in ['smartlab.news', 'rbc.ru', 'vedomosti.ru']:
+    for domain in [source.domain for source in source_registry.all()]:
         count = NewsArticle.query.filter(NewsArticle.url.like(f'%{domain}%')).count()
         sources[domain] = count
     
@@ -577,6 +627,9 @@ def analytics():
 # Initialize scheduler on startup - using newer Flask pattern
 def initialize_scheduler():
     """Initialize the news scheduler"""
+    if not scheduler_runs_in_web():
+        logger.info("SCHEDULER_MODE=worker: scheduler runs in worker.py processes")
+        return
     try:
         settings = BotSettings.get_current()
         if settings.posting_enabled:
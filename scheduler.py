@@ -2,279 +2,733 @@
 from dotenv import load_dotenv
 
 load_dotenv()
+import os
 import logging
 import time
 from datetime import datetime, timedelta
-from threading import Thread
+from threading import Lock, Thread
+from urllib.parse import urlparse
+from sqlalchemy.exc import IntegrityError
 from app import app
 from db import db
-from models import NewsArticle, BotSettings, PostingLog
+from models import (NewsArticle, BotSettings, PostingLog, SchedulerLease, to_msk,
+                    STATUS_DISCOVERED, STATUS_FETCHED, STATUS_SUMMARIZED, STATUS_POSTED, STATUS_DUPLICATE)
 from scraper import SmartLabScraper
+from sources import NewsSource, source_registry
+from dates import DATE_MIN, now_msk
+from polling import AdaptivePollScheduler
+from seen_urls import SeenURLFilter, canonicalize_url
+from fetcher import ConcurrentFetcher
+from extraction import ExtractionPool
+from dedup import (MinHashLSHIndex, minhash_signature, pack_signature, unpack_signature,
+                   DEDUP_WINDOW_HOURS)
+from pipeline import PipelineQueue
 from ai_service import AIService
+from llm_router import llm_router
 from telegram_bot import TelegramBotService
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+LEADER_LEASE_NAME = 'news_scheduler'
+# Генерировать резюме и хештеги одним запросом к LLM (AI_COMBINED_GENERATION=0 - двумя)
+COMBINED_GENERATION = os.environ.get("AI_COMBINED_GENERATION", "1") != "0"
+# При очереди fetched больше AI_BATCH_THRESHOLD короткие статьи суммаризуются пакетами по AI_BATCH_SIZE
+AI_BATCH_THRESHOLD = int(os.environ.get("AI_BATCH_THRESHOLD", "10"))
+AI_BATCH_SIZE = int(os.environ.get("AI_BATCH_SIZE", "5"))
+# Связывать почти одинаковые новости разных источников до генерации резюме (DEDUP_ENABLED=0 - отключить)
+DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "1") != "0"
+# Статусы статей, с которыми сравниваются новые
+DEDUP_STATUSES = (STATUS_FETCHED, STATUS_SUMMARIZED, STATUS_POSTED, STATUS_DUPLICATE)
+# Новые подписи загружаются из базы порциями
+DEDUP_SYNC_CHUNK = 500
+
+def scheduler_runs_in_web() -> bool:
+    """
+    SCHEDULER_MODE=web (по умолчанию) - планировщик запускается в процессах gunicorn,
+    SCHEDULER_MODE=worker - только в отдельных процессах worker.py
+    """
+    return os.environ.get("SCHEDULER_MODE", "web").lower() == "web"
+
 class NewsScheduler:
     def __init__(self):
         self.scraper = SmartLabScraper()
+        # Разбор загруженных статей в отдельных процессах
+        self.extraction_pool = ExtractionPool()
+        self.scraper.extractor = self.extraction_pool.extract
+        self.fetcher = ConcurrentFetcher(self.scraper.get_article_content)
+        self.last_scrape_stats = {}
         self.telegram_service = TelegramBotService()
+        self.queue = PipelineQueue()
         self.running = False
         self.thread = None
+        self.workers = []
+        # Размер пачки и пауза простоя для воркеров этапов конвейера
+        self.stage_batch_size = 20
+        self.stage_idle_sleep = 15
+        # Число потоков-воркеров на каждый этап конвейера
+        self.stage_workers = {
+            'fetch': int(os.environ.get("PIPELINE_FETCH_WORKERS", "1")),
+            'summarize': int(os.environ.get("PIPELINE_SUMMARIZE_WORKERS", "1")),
+        }
+        # Аренда лидера продлевается на каждой итерации основного цикла (раз в 60с)
+        self.leader_lease_seconds = 180
+        # Очередь опроса источников с адаптивными интервалами
+        self.poller = AdaptivePollScheduler()
+        # Адреса статей, которые уже есть в базе
+        self.seen_urls = SeenURLFilter()
+        # LSH-индекс подписей статей за DEDUP_WINDOW_HOURS: живет между пачками, из базы
+        # догружаются только новые статьи, вышедшие из окна удаляются (см. _sync_dedup_index)
+        self.dedup_index = MinHashLSHIndex()
+        # article_id -> (первая статья кластера, источник)
+        self._dedup_articles: Dict[int, Tuple[int, str]] = {}
+        self._dedup_lock = Lock()
 
 
-    def start(self):
-        """Start the scheduler in a background thread"""
+    def start(self, stage_workers: Optional[dict] = None):
+        """Start the scheduler and pipeline stage workers in background threads"""
         if not self.running:
             self.running = True
+            if stage_workers:
+                self.stage_workers.update(stage_workers)
             self.thread = Thread(target=self._run_scheduler, daemon=True)
             self.thread.start()
-            logger.info("News scheduler started")
+            self.workers = [
+                Thread(target=self._run_stage_worker, args=(stage,), daemon=True, name=f"pipeline-{stage}-{i}")
+                for stage, count in self.stage_workers.items()
+                for i in range(count)
+            ]
+            for worker in self.workers:
+                worker.start()
+            logger.info(f"News scheduler started ({self.queue.worker_id}, workers: {self.stage_workers})")
 
     def stop(self):
         """Stop the scheduler"""
         self.running = False
         if self.thread:
             self.thread.join(timeout=5)
+        for worker in self.workers:
+            worker.join(timeout=5)
+        self.workers = []
+        self.extraction_pool.shutdown()
+        try:
+            with app.app_context():
+                SchedulerLease.release(LEADER_LEASE_NAME, self.queue.worker_id)
+        except Exception as e:
+            logger.error(f"Error releasing scheduler lease: {e}")
         logger.info("News scheduler stopped")
 
+    def _is_leader(self) -> bool:
+        """Only the lease holder runs discovery and posting across all processes"""
+        return SchedulerLease.acquire(LEADER_LEASE_NAME, self.queue.worker_id, self.leader_lease_seconds)
+
     def _run_scheduler(self):
         """Main scheduler loop"""
-        last_scrape_time = datetime.min
         last_post_time = datetime.min
         
         while self.running:
             try:
                 with app.app_context():
-                    settings = BotSettings.get_current()
-                    
-                    current_time = datetime.utcnow()
-                    
-                    # Scrape news every 15 minutes
-                    if current_time - last_scrape_time > timedelta(minutes=15):
-                        self._scrape_and_process_news()
-                        last_scrape_time = current_time
-                    
-                    # Post news based on settings
-                    if (settings.posting_enabled and 
-                        current_time - last_post_time > timedelta(minutes=settings.posting_interval)):
-                        self._post_pending_articles(settings)
-                        last_post_time = current_time
+                    # Остальные процессы выполняют только этапы конвейера
+                    if self._is_leader():
+                        settings = BotSettings.get_current()
+                        
+                        current_time = datetime.utcnow()
+                        
+                        # Discover news in sources whose poll interval has passed, stage workers do the rest
+                        self._discover_news()
+                        
+                        # Post news based on settings
+                        if (settings.posting_enabled and 
+                            current_time - last_post_time > timedelta(minutes=settings.posting_interval)):
+                            self._post_pending_articles(settings)
+                            last_post_time = current_time
                 
-                # Sleep for 60 seconds before next check
-                time.sleep(60)
+                # Sleep until the next source poll is due, at most 60 seconds
+                time.sleep(self._loop_sleep())
                 
             except Exception as e:
                 logger.error(f"Error in scheduler loop: {e}")
                 time.sleep(60)  # Wait before retrying
 
+    def _run_stage_worker(self, stage: str):
+        """Worker loop that claims articles for one pipeline stage"""
+        while self.running:
+            try:
+                with app.app_context():
+                    if stage == 'fetch':
+                        processed = self._run_fetch_stage()
+                    else:
+                        processed = self._run_summarize_stage()
+                # Очередь пуста - ждем, иначе сразу берем следующую пачку
+                if not processed:
+                    time.sleep(self.stage_idle_sleep)
+            except Exception as e:
+                logger.error(f"Error in {stage} worker: {e}")
+                time.sleep(self.stage_idle_sleep)
+
+    def due_sources(self, force: bool = False) -> List[NewsSource]:
+        """Источники, время опроса которых наступило, все - при force"""
+        return self.poller.due(self.scraper.listing_sources(), force)
+
+    def _loop_sleep(self) -> float:
+        """Пауза основного цикла: до ближайшего опроса, но не дольше 60с (аренда лидера)"""
+        next_poll_in = self.poller.next_poll_in()
+        return 60.0 if next_poll_in is None else min(60.0, max(1.0, next_poll_in))
+
+    def _discover_news(self, force: bool = False):
+        """Find new articles in due source listings and enqueue them as discovered"""
+        stage_times = {}
+        sources = self.due_sources(force)
+        if not sources:
+            return 0, 0, 0, stage_times
+        
+        # Получаем новости из источников
+        stage_start = time.time()
+        news_items = self.get_all_news(sources)
+        stage_times['listing'] = time.time() - stage_start
+        
+        # Отбрасываем статьи, которые уже есть в базе
+        stage_start = time.time()
+        discovered_count, skipped_count = self._enqueue_listed(sources, news_items)
+        stage_times['dedup'] = time.time() - stage_start
+        
+        self._daily_cleanup()
+        
+        logger.warning(f"Discovered {discovered_count} new articles, {skipped_count} already known")
+        return discovered_count, skipped_count, len(news_items), stage_times
+
+    def _daily_cleanup(self):
+        """Очистка старых записей раз в день"""
+        if datetime.utcnow().hour == 3:  # В 3 часа ночи
+            from models import AnalyticsData
+            logger.info("Запуск очистки старых записей...")
+            result = AnalyticsData.cleanup_old_records(days=30)
+            logger.info(f"Очистка старых записей: {'успешно' if result else 'ошибка'}")
+
+    def _enqueue_listed(self, sources: List[NewsSource], news_items: List[dict]) -> Tuple[int, int]:
+        """
+        Enqueue items from polled listings, then let the listing tracker keep their ETag and hashes.
+        If any item was not stored, the listings are parsed again on the next poll
+        """
+        tracker = self.scraper.listing_tracker
+        try:
+            counts = self._enqueue_discovered(news_items)
+        except Exception:
+            tracker.discard(sources)
+            raise
+        if all(canonicalize_url(item['url']) in self.seen_urls for item in news_items if item.get('url')):
+            tracker.commit(sources)
+        else:
+            tracker.discard(sources)
+        return counts
+
+    def _enqueue_discovered(self, news_items: List[dict]) -> Tuple[int, int]:
+        """Store listing items that are not in the DB yet. Returns (discovered, skipped)"""
+        if not self.seen_urls.warmed:
+            self.seen_urls.warm()
+        
+        # Канонические адреса без повторов, в порядке ленты
+        items_by_url: Dict[str, dict] = {}
+        aliases: Dict[str, str] = {}
+        for item in news_items:
+            if not item.get('url'):
+                continue
+            url = canonicalize_url(item['url'])
+            aliases[item['url']] = url
+            items_by_url.setdefault(url, item)
+        
+        known = self.seen_urls.known(list(items_by_url), aliases)
+        skipped_count = len(known)
+        new_articles = [
+            NewsArticle(
+                url=url,
+                title=item['title'][:255],
+                # До загрузки текста храним превью из ленты
+                original_content=item.get('preview') or item['title'],
+                # Дата неизвестна и в ленте - считаем статью опубликованной в момент обнаружения
+                created_at=item.get('published_at') or datetime.utcnow(),
+                status=STATUS_DISCOVERED
+            )
+            for url, item in items_by_url.items() if url not in known
+        ]
+        if not new_articles:
+            return 0, skipped_count
+        
+        try:
+            db.session.add_all(new_articles)
+            db.session.commit()
+            discovered_count = len(new_articles)
+            stored_urls = [article.url for article in new_articles]
+        except Exception as e:
+            # Статью мог добавить параллельный процесс - сохраняем по одной
+            db.session.rollback()
+            logger.warning(f"Bulk enqueue failed, retrying one by one: {e}")
+            discovered_count = 0
+            # В фильтр попадают сохраненные статьи и уже существующие в базе (конфликт уникальности url);
+            # статьи, не сохраненные по другой причине, будут снова найдены в следующем цикле
+            stored_urls = []
+            for article in new_articles:
+                try:
+                    db.session.add(NewsArticle(url=article.url, title=article.title,
+                                               original_content=article.original_content,
+                                               created_at=article.created_at, status=STATUS_DISCOVERED))
+                    db.session.commit()
+                    discovered_count += 1
+                    stored_urls.append(article.url)
+                except IntegrityError:
+                    db.session.rollback()
+                    skipped_count += 1
+                    stored_urls.append(article.url)
+                except Exception as e:
+                    db.session.rollback()
+                    skipped_count += 1
+                    logger.warning(f"Could not enqueue {article.url}: {e}")
+        self.seen_urls.add_many(stored_urls)
+        return discovered_count, skipped_count
+
+    def _run_fetch_stage(self, limit: Optional[int] = None) -> int:
+        """Download content for discovered articles. Returns number of claimed articles"""
+        articles = self.queue.claim(STATUS_DISCOVERED, limit or self.stage_batch_size)
+        if not articles:
+            return 0
+        
+        fetched = self.fetcher.fetch_all([article.url for article in articles])
+        
+        for article in articles:
+            self._apply_fetched(article, fetched.get(article.url))
+        return len(articles)
+
+    def _apply_fetched(self, article: NewsArticle, article_data: Optional[dict]) -> None:
+        """Store downloaded content and move the article to fetched, or schedule a retry"""
+        try:
+            if not article_data:
+                self.queue.fail(article, "Could not get article content")
+                return
+            
+            article.title = (article_data.get('title') or article.title)[:255]
+            article.original_content = article_data['content']
+            article.minhash = self._minhash_for(article)
+            # Используем дату из article_data, иначе оставляем дату из ленты
+            if article_data.get('published_at'):
+                article.created_at = to_msk(article_data['published_at'])
+            self.queue.complete(article, STATUS_FETCHED)
+        except Exception as e:
+            db.session.rollback()
+            self.queue.fail(article, e)
+
+    def _article_data_for(self, article: NewsArticle) -> dict:
+        """Article data for AI: scraper result if cached, otherwise from DB"""
+        article_data = self.scraper.get_cached_article(article.url)
+        if not article_data:
+            article_data = {
+                'url': article.url,
+                'title': article.title,
+                'content': article.original_content,
+                'quotes': [],
+                'tags': []
+            }
+        article_data = dict(article_data)
+        # Сохраняем ID статьи для аналитики
+        article_data['article_id'] = article.id
+        return article_data
+
+    def _run_summarize_stage(self, limit: Optional[int] = None) -> int:
+        """Generate summaries for fetched articles. Returns number of claimed articles"""
+        backlog = self.queue.counts().get(STATUS_FETCHED, 0)
+        llm_router.report_backlog(backlog)
+        claimed = self.queue.claim(STATUS_FETCHED, limit or self.stage_batch_size)
+        articles = self._skip_near_duplicates(claimed)
+        if AI_BATCH_SIZE > 1 and backlog > AI_BATCH_THRESHOLD and len(articles) > 1:
+            # Большая очередь: экономим запросы, отправляя несколько статей в одном промпте
+            for start in range(0, len(articles), AI_BATCH_SIZE):
+                chunk = articles[start:start + AI_BATCH_SIZE]
+                try:
+                    outcomes = self._process_articles_batch_ai(chunk)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error processing article batch with AI: {e}")
+                    outcomes = {}
+                for article in chunk:
+                    self._finish_summarize(article, outcomes.get(article.id, False))
+            return len(claimed)
+
+        for article in articles:
+            try:
+                self._finish_summarize(article, self._process_article_ai(article, self._article_data_for(article)))
+            except Exception as e:
+                db.session.rollback()
+                self.queue.fail(article, e)
+        return len(claimed)
+
+    @staticmethod
+    def _minhash_for(article: NewsArticle) -> Optional[str]:
+        signature = minhash_signature(article.title, article.original_content)
+        return pack_signature(signature) if signature else None
+
+    @staticmethod
+    def _source_of(url: str) -> str:
+        """Source name for an article URL, or its domain if the source is not registered"""
+        source = source_registry.find_by_url(url)
+        if source is not None:
+            return source.name
+        host = urlparse(url).netloc.lower()
+        return host[4:] if host.startswith('www.') else host
+
+    def _sync_dedup_index(self) -> None:
+        """
+        Bring the near-duplicate index in line with the DB window: only ids are read for the whole
+        window, signatures are loaded for articles not indexed yet, expired articles are dropped.
+        Must be called under _dedup_lock
+        """
+        # created_at хранится как московское время без часового пояса (см. to_msk)
+        cutoff = now_msk().replace(tzinfo=None) - timedelta(hours=DEDUP_WINDOW_HOURS)
+        window = {article_id for article_id, in db.session.query(NewsArticle.id).filter(
+            NewsArticle.minhash.isnot(None),
+            NewsArticle.status.in_(DEDUP_STATUSES),
+            NewsArticle.created_at >= cutoff
+        )}
+        for article_id in set(self._dedup_articles) - window:
+            self.dedup_index.remove(article_id)
+            del self._dedup_articles[article_id]
+
+        new_ids = sorted(window - set(self._dedup_articles))
+        for start in range(0, len(new_ids), DEDUP_SYNC_CHUNK):
+            rows = db.session.query(NewsArticle.id, NewsArticle.minhash, NewsArticle.cluster_id,
+                                    NewsArticle.url).filter(
+                NewsArticle.id.in_(new_ids[start:start + DEDUP_SYNC_CHUNK])
+            ).all()
+            for article_id, packed, cluster_id, url in rows:
+                signature = unpack_signature(packed)
+                if signature:
+                    self.dedup_index.add(article_id, signature)
+                self._dedup_articles[article_id] = (cluster_id or article_id, self._source_of(url))
+
+    def _skip_near_duplicates(self, articles: List[NewsArticle]) -> List[NewsArticle]:
+        """
+        Link fetched articles to clusters of stories from other sources already in the pipeline,
+        before any LLM call. An article whose cluster is already summarized or posted gets its summary
+        and leaves the queue as duplicate; otherwise it is only linked by cluster_id and summarized
+        as usual. Returns articles that still need a summary
+        """
+        if not DEDUP_ENABLED or not articles:
+            return articles
+        with self._dedup_lock:
+            return self._link_near_duplicates(articles)
+
+    def _link_near_duplicates(self, articles: List[NewsArticle]) -> List[NewsArticle]:
+        try:
+            self._sync_dedup_index()
+            duplicates = set()
+            # Кластер начинается с первой найденной статьи: сравниваем только с более ранними.
+            # Статьи того же источника дубликатами не считаются: это обновления или разные новости
+            for article in sorted(articles, key=lambda a: a.id):
+                if article.minhash is None:
+                    article.minhash = self._minhash_for(article)
+                signature = unpack_signature(article.minhash)
+                if not signature:
+                    continue
+                source = self._source_of(article.url)
+                match = self.dedup_index.find(
+                    signature,
+                    accept=lambda key, article_id=article.id: (key < article_id
+                                                               and self._dedup_articles[key][1] != source))
+                if not match:
+                    self.dedup_index.add(article.id, signature)
+                    self._dedup_articles[article.id] = (article.id, source)
+                    continue
+                root_id = self._dedup_articles[match[0]][0]
+                root = db.session.get(NewsArticle, root_id)
+                article.cluster_id = root_id
+                self.dedup_index.add(article.id, signature)
+                self._dedup_articles[article.id] = (root_id, source)
+                if root is None or not root.summary or root.status not in (STATUS_SUMMARIZED, STATUS_POSTED):
+                    # Резюме кластера еще нет (первая статья ждет LLM или не обработана) -
+                    # статья резюмируется сама, иначе при ошибке первой новость не будет опубликована
+                    continue
+                article.summary = root.summary
+                article.hashtags = root.hashtags
+                self.queue.complete(article, STATUS_DUPLICATE)
+                duplicates.add(article.id)
+                logger.warning(f"Article {article.id} is a near-duplicate of {root_id} "
+                               f"(similarity {match[1]:.2f}), skipped before AI")
+            db.session.commit()
+            return [article for article in articles if article.id not in duplicates]
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Near-duplicate check failed: {e}")
+            # Состояние статей в базе откатилось - при следующей синхронизации они загрузятся заново
+            for article in articles:
+                self.dedup_index.remove(article.id)
+                self._dedup_articles.pop(article.id, None)
+            return articles
+
+    def _finish_summarize(self, article: NewsArticle, success: bool) -> None:
+        """Move the article to summarized or schedule a retry"""
+        if success:
+            self.queue.complete(article, STATUS_SUMMARIZED)
+            logger.warning(f"Processed new article: {article.title[:50]}...")
+        else:
+            self.queue.fail(article, "AI summary generation failed")
+
+    def _drain_stage(self, run_stage) -> int:
+        """Run a stage until its queue has no claimable articles"""
+        total = 0
+        while True:
+            processed = run_stage()
+            if not processed:
+                return total
+            total += processed
+
     def _scrape_and_process_news(self):
-        """Scrape news and process new articles"""
+        """Scrape news and run every pipeline stage until the queue is drained"""
         try:
             logger.info("Starting news scrape...")
             start_time = time.time()
             
-            # Получаем новости из всех источников
-            news_items = self.get_all_news(limit=150)
+            discovered_count, skipped_count, listed_count, stage_times = self._discover_news(force=True)
             
-            new_articles_count = 0
-            skipped_count = 0
-            error_count = 0
-            
-            for item in news_items:
-                try:
-                    url = item['url']
-                    
-                    # Check if article already exists
-                    existing = NewsArticle.query.filter_by(url=url).first()
-                    if existing:
-                        skipped_count += 1
-                        continue
-                    
-                    # Get full article content
-                    article_data = self.scraper.get_article_content(url)
-                    if not article_data:
-                        logger.warning(f"Could not get content for: {url}")
-                        continue
-                    
-                    # Используем дату из article_data или из item, или текущее время
-                    created_at = article_data.get('published_at') or item.get('published_at') or datetime.utcnow()
-
-                    article = NewsArticle(
-                        url=url,
-                        title=article_data['title'],
-                        original_content=article_data['content'],
-                        created_at=created_at
-                    )
-                    db.session.add(article)
-                    db.session.commit()
-                    
-                    # Сохраняем ID статьи для аналитики
-                    article_data['article_id'] = article.id
-                    
-                    # Generate summary and hashtags
-                    self._process_article_ai(article, article_data)
-                    
-                    new_articles_count += 1
-                    logger.warning(f"Processed new article: {article.title[:50]}...")
-                except Exception as item_error:
-                    logger.error(f"Error processing article {item.get('url', 'unknown')}: {item_error}")
-                    error_count += 1
-                    continue
+            stage_start = time.time()
+            fetched_count = self._drain_stage(self._run_fetch_stage)
+            stage_times['fetch'] = time.time() - stage_start
             
-            execution_time = time.time() - start_time
-            logger.warning(f"Scraping completed in {execution_time:.2f}s. {new_articles_count} new articles processed, {skipped_count} skipped, {error_count} errors.")
+            stage_start = time.time()
+            summarized_count = self._drain_stage(self._run_summarize_stage)
+            stage_times['ai'] = time.time() - stage_start
             
-            # Очистка старых записей раз в день
-            if datetime.utcnow().hour == 3:  # В 3 часа ночи
-                from models import AnalyticsData
-                logger.info("Запуск очистки старых записей...")
-                result = AnalyticsData.cleanup_old_records(days=30)
-                logger.info(f"Очистка старых записей: {'успешно' if result else 'ошибка'}")
+            stage_times['total'] = time.time() - start_time
+            self.last_scrape_stats = {
+                'finished_at': datetime.utcnow(),
+                'stage_times': stage_times,
+                'listed': listed_count,
+                'new': discovered_count,
+                'skipped': skipped_count,
+                'fetch_attempted': fetched_count,
+                'ai_attempted': summarized_count,
+                'queue': self.queue.counts(),
+            }
+            logger.warning("Scrape stage times: " + ", ".join(
+                f"{stage}={seconds:.2f}s" for stage, seconds in stage_times.items()))
+            logger.warning(f"Scraping completed in {stage_times['total']:.2f}s. {discovered_count} new articles, "
+                           f"{fetched_count} fetch and {summarized_count} AI attempts, {skipped_count} skipped.")
             
         except Exception as e:
             logger.error(f"Error in news scraping: {e}")
 
-    def _process_article_ai(self, article: NewsArticle, article_data: dict):
-        """Process article with AI for summary and hashtags"""
+    def _process_article_ai(self, article: NewsArticle, article_data: dict) -> bool:
+        """Process article with AI for summary and hashtags. Returns True if summary was generated"""
         try:
             settings = BotSettings.get_current()
             ai_service = AIService(ai_provider=getattr(settings, "ai_provider", "openrouter"))
 
-            # Замеряем время генерации резюме
-            summary_start_time = time.time()
-            
-            # Generate summary
-            summary = ai_service.summarize_article(
-                article_data, 
-                style=settings.summary_style
-            )
-            
-            summary_time = time.time() - summary_start_time
-
-            if summary:
-                article.summary = summary
-
-            # Замеряем время генерации хештегов
-            hashtags_start_time = time.time()
-            
-            # Generate hashtags
-            hashtags = ai_service.generate_hashtags(
-                article_data,
-                custom_tags=settings.custom_hashtags
-            )
-            
-            hashtags_time = time.time() - hashtags_start_time
-
-            if hashtags:
-                article.hashtags = ' '.join(hashtags)
+            usage = {}
+            if COMBINED_GENERATION:
+                # Резюме и хештеги одним запросом к LLM
+                summary_start_time = time.time()
+                summary, hashtags = ai_service.summarize_with_hashtags(
+                    article_data,
+                    style=settings.summary_style,
+                    custom_tags=settings.custom_hashtags,
+                    usage=usage
+                )
+                summary_time = time.time() - summary_start_time
+                hashtags_time = 0.0
+            else:
+                # Замеряем время генерации резюме
+                summary_start_time = time.time()
+                
+                # Generate summary
+                summary = ai_service.summarize_article(
+                    article_data, 
+                    style=settings.summary_style,
+                    usage=usage
+                )
+                
+                summary_time = time.time() - summary_start_time
 
-            db.session.commit()
-            
-            # Сохраняем аналитику
-            try:
-                from models import AnalyticsData
+                # Замеряем время генерации хештегов
+                hashtags_start_time = time.time()
                 
-                analytics = AnalyticsData(
-                    article_id=article.id,
-                    ai_provider=ai_service.ai_provider,
-                    summary_generation_time=summary_time,
-                    hashtags_generation_time=hashtags_time,
-                    summary_length=len(summary) if summary else 0,
-                    hashtags_count=len(hashtags) if hashtags else 0
+                # Generate hashtags
+                hashtags = ai_service.generate_hashtags(
+                    article_data,
+                    custom_tags=settings.custom_hashtags
                 )
-                db.session.add(analytics)
-                db.session.commit()
                 
-                logger.info(f"Сохранена аналитика для статьи {article.id}: резюме {summary_time:.2f}с, хештеги {hashtags_time:.2f}с")
-            except Exception as analytics_error:
-                logger.error(f"Ошибка при сохранении аналитики: {analytics_error}")
+                hashtags_time = time.time() - hashtags_start_time
+
+            return self._save_ai_result(article, ai_service.ai_provider, summary, hashtags,
+                                        summary_time, hashtags_time, usage)
 
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Error processing article with AI: {e}")
+            return False
+
+    def _process_articles_batch_ai(self, articles: List[NewsArticle]) -> Dict[int, bool]:
+        """
+        Process several articles with one batched LLM request.
+        Returns article_id -> True if summary was generated
+        """
+        settings = BotSettings.get_current()
+        ai_service = AIService(ai_provider=getattr(settings, "ai_provider", "openrouter"))
 
-    def get_all_news(self, limit=20):
+        start_time = time.time()
+        article_usage = {}
+        results = ai_service.summarize_batch(
+            [self._article_data_for(article) for article in articles],
+            style=settings.summary_style,
+            custom_tags=settings.custom_hashtags,
+            article_usage=article_usage
+        )
+        # Время пакетного запроса делим поровну между статьями пакета;
+        # provider и prompt_tokens у каждой статьи свои (повторный запрос мог уйти в локальное резюме)
+        summary_time = (time.time() - start_time) / len(articles)
+
+        outcomes = {}
+        for article in articles:
+            summary, hashtags = results.get(article.id, (None, []))
+            outcomes[article.id] = self._save_ai_result(article, ai_service.ai_provider, summary, hashtags,
+                                                        summary_time, 0.0, article_usage.get(article.id))
+        return outcomes
+
+    def _save_ai_result(self, article: NewsArticle, ai_provider: str, summary: Optional[str],
+                        hashtags: List[str], summary_time: float, hashtags_time: float,
+                        usage: Optional[dict] = None) -> bool:
+        """
+        Store generated summary, hashtags and analytics. Returns True if summary was generated.
+        usage - данные запроса от AIService (prompt_tokens, ttft, provider="local" для резюме без LLM),
+        пустой при ответе из кэша
+        """
+        usage = usage or {}
+        if summary:
+            article.summary = summary
+
+        if hashtags:
+            article.hashtags = ' '.join(hashtags)
+
+        db.session.commit()
+        
+        # Сохраняем аналитику
         try:
-            # Распределяем лимит между источниками
-            per_source_limit = limit // 3
+            from models import AnalyticsData
             
-            # Получаем новости из разных источников
-            news = self.scraper.get_latest_news(limit=per_source_limit)
-            news += self.scraper.get_latest_rbc(limit=per_source_limit)
+            analytics = AnalyticsData(
+                article_id=article.id,
+                ai_provider=usage.get('provider') or ai_provider,
+                summary_generation_time=summary_time,
+                hashtags_generation_time=hashtags_time,
+                summary_length=len(summary) if summary else 0,
+                hashtags_count=len(hashtags) if hashtags else 0,
+                prompt_tokens=usage.get('prompt_tokens'),
+                ttft=usage.get('ttft')
+            )
+            db.session.add(analytics)
+            db.session.commit()
             
-            # Добавляем новости из Ведомостей
-            try:
-                vedomosti_news = self.scraper.get_latest_vedomosti(limit=per_source_limit)
-                news += vedomosti_news
-                logger.info(f"Добавлено {len(vedomosti_news)} новостей из Ведомостей")
-            except Exception as e:
-                logger.error(f"Ошибка при получении новостей из Ведомостей: {e}")
+            logger.info(f"Сохранена аналитика для статьи {article.id}: резюме {summary_time:.2f}с, хештеги {hashtags_time:.2f}с")
+        except Exception as analytics_error:
+            db.session.rollback()
+            logger.error(f"Ошибка при сохранении аналитики: {analytics_error}")
+
+        return bool(summary)
+
+    def get_all_news(self, sources: Optional[List[NewsSource]] = None):
+        try:
+            # Каждый источник опрашивается со своим лимитом, ленты загружаются параллельно
+            sources = sources if sources is not None else self.scraper.listing_sources()
+            results = self.scraper.fetch_sources(sources)
+            news = []
+            for source in sources:
+                items = results.get(source.name, [])
+                self.poller.observe(source, items)
+                logger.info(f"Добавлено {len(items)} новостей из {source.name}")
+                news += items
             
             # Сортируем по дате публикации (от новых к старым)
-            return sorted(news, key=lambda x: x.get('published_at', datetime.min), reverse=True)
+            return sorted(news, key=lambda x: x.get('published_at') or DATE_MIN, reverse=True)
         except Exception as e:
             logger.error(f"Error getting all news: {e}")
             return []
 
+    def _claim_for_posting(self, settings: BotSettings) -> List[NewsArticle]:
+        """Claim summarized articles within the daily posting limit"""
+        if not settings.channel_id:
+            logger.warning("No channel ID configured")
+            return []
+        
+        # Check daily posting limit
+        today = datetime.utcnow().date()
+        today_posts = PostingLog.query.filter(
+            PostingLog.posted_at >= today,
+            PostingLog.status == 'success'
+        ).count()
+        
+        if today_posts >= settings.max_articles_per_day:
+            logger.warning(f"Daily posting limit reached: {today_posts}/{settings.max_articles_per_day}")
+            return []
+        
+        # Claim summarized articles from the pipeline queue
+        return self.queue.claim(STATUS_SUMMARIZED, min(5, settings.max_articles_per_day - today_posts))
+
+    def _telegram_message_for(self, article: NewsArticle) -> str:
+        """Format article summary and hashtags for the channel"""
+        hashtags = article.hashtags.split() if article.hashtags else []
+        return self.telegram_service.format_message_for_telegram(
+            article.summary,
+            hashtags,
+            article.url
+        )
+
+    def _finish_post(self, article: NewsArticle, result: dict) -> bool:
+        """Move the article to posted or schedule a retry. Returns True if it was posted now"""
+        if result['success']:
+            article.is_posted = True
+            article.posted_at = datetime.utcnow()
+            self.queue.complete(article, STATUS_POSTED)
+            logger.warning(f"Posted article: {article.title[:50]}...")
+            return True
+        if result.get('duplicate'):
+            # Статью уже опубликовал другой процесс
+            self._mark_already_posted(article)
+            self.queue.complete(article, STATUS_POSTED)
+        else:
+            logger.error(f"Failed to post article: {result['error']}")
+            self.queue.fail(article, result['error'])
+        return False
+
+    @staticmethod
+    def _mark_already_posted(article: NewsArticle) -> None:
+        """Mark an article that another process has already posted; keep its posted_at if it was set"""
+        article.is_posted = True
+        if article.posted_at is None:
+            article.posted_at = datetime.utcnow()
+
     def _post_pending_articles(self, settings: BotSettings):
         """Post unposted articles to Telegram channel"""
         try:
-            if not settings.channel_id:
-                logger.warning("No channel ID configured")
-                return
-            
-            # Check daily posting limit
-            today = datetime.utcnow().date()
-            today_posts = PostingLog.query.filter(
-                PostingLog.posted_at >= today,
-                PostingLog.status == 'success'
-            ).count()
-            
-            if today_posts >= settings.max_articles_per_day:
-                logger.warning(f"Daily posting limit reached: {today_posts}/{settings.max_articles_per_day}")
-                return
-            
-            # Get unposted articles with summaries
-            unposted = NewsArticle.query.filter(
-                NewsArticle.is_posted == False,
-                NewsArticle.summary.isnot(None)
-            ).order_by(NewsArticle.created_at.desc()).limit(5).all()
+            unposted = self._claim_for_posting(settings)
             
             posted_count = 0
             
             for article in unposted:
-                if posted_count >= (settings.max_articles_per_day - today_posts):
-                    break
-                
-                # Format message
-                hashtags = article.hashtags.split() if article.hashtags else []
-                message = self.telegram_service.format_message_for_telegram(
-                    article.summary,
-                    hashtags,
-                    article.url
-                )
+                if not article.summary:
+                    self.queue.fail(article, "Article has no summary")
+                    continue
                 
                 # Send to channel
                 result = self.telegram_service.send_message_sync(
                     settings.channel_id,
-                    message,
+                    self._telegram_message_for(article),
                     article.id
                 )
                 
-                if result['success']:
-                    article.is_posted = True
-                    article.posted_at = datetime.utcnow()
+                if self._finish_post(article, result):
                     posted_count += 1
-                    logger.warning(f"Posted article: {article.title[:50]}...")
-                else:
-                    logger.error(f"Failed to post article: {result['error']}")
                 
                 # Small delay between posts
                 time.sleep(2)
             
-            db.session.commit()
-            
             if posted_count > 0:
                 logger.warning(f"Posted {posted_count} articles to channel")
             
@@ -286,42 +740,51 @@ class NewsScheduler:
         with app.app_context():
             self._scrape_and_process_news()
 
+    def _prepare_manual_post(self, article_id: int, channel_id: Optional[str] = None):
+        """Returns (article, target channel, message) or an error result for manual posting"""
+        article = db.session.get(NewsArticle, article_id)
+        if not article:
+            return {"success": False, "error": "Article not found"}
+        
+        if not article.summary:
+            return {"success": False, "error": "Article has no summary"}
+        
+        settings = BotSettings.get_current()
+        target_channel = channel_id or settings.channel_id
+        
+        if not target_channel:
+            return {"success": False, "error": "No channel specified"}
+        
+        return article, target_channel, self._telegram_message_for(article)
+
+    def _finish_manual_post(self, article: NewsArticle, result: dict) -> dict:
+        """Mark a manually posted article as posted"""
+        if result['success']:
+            article.is_posted = True
+            article.posted_at = datetime.utcnow()
+            article.status = STATUS_POSTED
+            db.session.commit()
+        elif result.get('duplicate') and not article.is_posted:
+            self._mark_already_posted(article)
+            article.status = STATUS_POSTED
+            db.session.commit()
+        
+        return result
+
     def manual_post(self, article_id: int, channel_id: Optional[str] = None):
         """Manually post a specific article"""
         with app.app_context():
-            article = NewsArticle.query.get(article_id)
-            if not article:
-                return {"success": False, "error": "Article not found"}
-            
-            if not article.summary:
-                return {"success": False, "error": "Article has no summary"}
-            
-            settings = BotSettings.get_current()
-            target_channel = channel_id or settings.channel_id
-            
-            if not target_channel:
-                return {"success": False, "error": "No channel specified"}
-            
-            # Format and send message
-            hashtags = article.hashtags.split() if article.hashtags else []
-            message = self.telegram_service.format_message_for_telegram(
-                article.summary,
-                hashtags,
-                article.url
-            )
+            prepared = self._prepare_manual_post(article_id, channel_id)
+            if isinstance(prepared, dict):
+                return prepared
+            article, target_channel, message = prepared
             
             result = self.telegram_service.send_message_sync(
                 target_channel,
                 message,
                 article.id
             )
-            
-            if result['success']:
-                article.is_posted = True
-                article.posted_at = datetime.utcnow()
-                db.session.commit()
-            
-            return result
+            return self._finish_manual_post(article, result)
 
 # Global scheduler instance
 news_scheduler = NewsScheduler()
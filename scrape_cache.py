@@ -0,0 +1,143 @@
+# Last modified: 2024-03-26
+import os
+import time
+import pickle
+import sqlite3
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Бюджет памяти кэша скрапера в байтах сериализованных данных
+SCRAPER_CACHE_MEMORY_BYTES = int(os.environ.get("SCRAPER_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+# Файл SQLite для дискового уровня; пусто - только память
+SCRAPER_CACHE_PATH = os.environ.get("SCRAPER_CACHE_PATH", "")
+SCRAPER_CACHE_DISK_BYTES = int(os.environ.get("SCRAPER_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+# Время жизни записей по видам, секунды
+DEFAULT_TTLS = {
+    'article': int(os.environ.get("SCRAPER_CACHE_ARTICLE_TTL", str(6 * 3600))),
+}
+# Просроченные и лишние записи на диске чистятся раз в PRUNE_EVERY записей
+PRUNE_EVERY = 100
+
+
+class ScrapeCache:
+    """
+    Кэш скрапера: LRU в памяти с бюджетом в байтах и необязательный
+    дисковый уровень в SQLite, который переживает перезапуск и общий
+    для процессов на одной машине. Значения хранятся сериализованными,
+    поэтому вызывающий код получает собственную копию.
+    """
+
+    def __init__(self, memory_bytes: int = SCRAPER_CACHE_MEMORY_BYTES, path: Optional[str] = SCRAPER_CACHE_PATH,
+                 disk_bytes: int = SCRAPER_CACHE_DISK_BYTES, ttls: Optional[Dict[str, int]] = None):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self._memory: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._memory_size = 0
+        self._lock = Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self._writes = 0
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = Lock()
+        if path:
+            try:
+                self._disk = sqlite3.connect(path, check_same_thread=False, timeout=5)
+                self._disk.execute("PRAGMA journal_mode=WAL")
+                self._disk.execute("CREATE TABLE IF NOT EXISTS scrape_cache ("
+                                   "key TEXT PRIMARY KEY, kind TEXT, expires_at REAL, value BLOB)")
+                self._disk.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Scraper disk cache unavailable at {path}: {e}")
+                self._disk = None
+
+    def _memory_set(self, key: str, expires_at: float, blob: bytes) -> None:
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old:
+                self._memory_size -= len(old[1])
+            if len(blob) > self.memory_bytes:
+                return
+            self._memory[key] = (expires_at, blob)
+            self._memory_size += len(blob)
+            while self._memory_size > self.memory_bytes:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+                self._stats['evictions'] += 1
+
+    def _memory_get(self, key: str, now: float) -> Optional[bytes]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if not entry:
+                return None
+            expires_at, blob = entry
+            if expires_at < now:
+                del self._memory[key]
+                self._memory_size -= len(blob)
+                return None
+            self._memory.move_to_end(key)
+            return blob
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        blob = self._memory_get(key, now)
+        if blob is not None:
+            self._stats['hits'] += 1
+            return pickle.loads(blob)
+        if self._disk is not None:
+            try:
+                with self._disk_lock:
+                    row = self._disk.execute("SELECT expires_at, value FROM scrape_cache WHERE key = ?",
+                                             (key,)).fetchone()
+                if row and row[0] >= now:
+                    self._memory_set(key, row[0], row[1])
+                    self._stats['disk_hits'] += 1
+                    return pickle.loads(row[1])
+            except (sqlite3.Error, pickle.UnpicklingError) as e:
+                logger.warning(f"Scraper disk cache lookup failed: {e}")
+        self._stats['misses'] += 1
+        return None
+
+    def set(self, key: str, value: Any, kind: str = 'article') -> None:
+        expires_at = time.time() + self.ttls.get(kind, self.ttls['article'])
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._memory_set(key, expires_at, blob)
+        if self._disk is None:
+            return
+        try:
+            with self._disk_lock:
+                self._disk.execute("INSERT OR REPLACE INTO scrape_cache (key, kind, expires_at, value) "
+                                   "VALUES (?, ?, ?, ?)", (key, kind, expires_at, blob))
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    self._prune()
+                self._disk.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Scraper disk cache store failed: {e}")
+
+    def _prune(self) -> None:
+        """Удаляет просроченные записи и самые старые сверх дискового бюджета"""
+        self._disk.execute("DELETE FROM scrape_cache WHERE expires_at < ?", (time.time(),))
+        total = self._disk.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM scrape_cache").fetchone()[0]
+        if total <= self.disk_bytes:
+            return
+        freed = 0
+        stale = []
+        for key, size in self._disk.execute("SELECT key, LENGTH(value) FROM scrape_cache ORDER BY expires_at"):
+            if total - freed <= self.disk_bytes:
+                break
+            stale.append((key,))
+            freed += size
+        self._disk.executemany("DELETE FROM scrape_cache WHERE key = ?", stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'entries': len(self._memory), 'memory_bytes': self._memory_size,
+                    'disk': self._disk is not None, **self._stats}
+
+
+# Общий кэш процесса: его используют планировщик и веб-обработчики (regenerate_summary)
+scrape_cache = ScrapeCache()
@@ -4,19 +4,28 @@
 import logging
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Optional, Tuple, TypedDict, Union, Any, Sequence, cast, TypeVar
+from typing import Callable, List, Dict, Optional, Tuple, TypedDict, Union, Any, Sequence, cast, TypeVar
 from urllib.parse import urljoin, urlparse
 from zoneinfo import ZoneInfo
 
 # Third-party imports
 import requests
-from bs4 import BeautifulSoup, Tag, NavigableString, ResultSet, PageElement
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer, Tag, NavigableString, ResultSet, PageElement
 import trafilatura
+from lxml import etree
 from dotenv import load_dotenv
 
 # Local imports
 from db import db
+from fetcher import DEFAULT_MAX_WORKERS
+from scrape_cache import ScrapeCache, scrape_cache
+from http_archive import install_archive, SCRAPER_HTTP_ARCHIVE
+from dates import parse_date, date_from_url, extract_html_date
+from sources import (NewsSource, source_registry, parse_listing_html,
+                     parse_feed, FEED_CHUNK_SIZE, ListingChangeTracker, items_fingerprint, HTML_PARSER)
 
 # Load environment variables
 load_dotenv()
@@ -30,7 +39,8 @@ class ArticleData(TypedDict, total=False):
     url: str
     title: str
     preview: str
-    published_at: datetime
+    # None, если дата публикации не найдена
+    published_at: Optional[datetime]
     content: Optional[str]
     quotes: List[str]
     tags: List[str]
@@ -39,10 +49,104 @@ class NewsItem(TypedDict, total=False):
     url: str
     title: str
     preview: str
-    published_at: datetime
+    published_at: Optional[datetime]
+
+# XPath-выражения для разбора статьи, компилируются один раз при импорте
+_XPATH_NS = {'re': 'http://exslt.org/regular-expressions'}
+_TITLE_XPATH = etree.XPath(
+    "(//h1|//h2)[re:test(@class, '(title|heading)', 'i')]", namespaces=_XPATH_NS)
+_QUOTES_XPATH = etree.XPath("//blockquote|//q|//cite")
+_TAGS_XPATH = etree.XPath(
+    "(//a|//span)[re:test(@class, '(tag|category|label)', 'i')]", namespaces=_XPATH_NS)
+_CONTENT_QUOTE_RE = re.compile(r'["«»""]([^"«»""]{20,}?)["«»""]', re.DOTALL)
+_FIRST_LINE_RE = re.compile(r'^([^\n]+)')
+
+# Регулярные выражения для разбора лент
+_SMARTLAB_ITEM_CLASS_RE = re.compile(r'(news|article|item|post)', re.I)
+_SMARTLAB_LINK_RE = re.compile(r'/read/\d+')
+_RBC_FEED_LINK_RE = re.compile(r'(?i)main__feed__link')
+_RBC_ITEM_LINK_RE = re.compile(r'(?i)(item__link|news-feed__item)')
+_RBC_ARTICLE_URL_RE = re.compile(r'https?://www\.rbc\.ru/.*?/\d{2}/\d{2}/\d{4}/')
+_VEDOMOSTI_ITEM_CLASS_RE = re.compile(r'(?i)(article|news-item)')
+_TITLE_CLASS_RE = re.compile(r'(?i)(title|heading)')
+_PREVIEW_CLASS_RE = re.compile(r'(?i)(preview|summary|description)')
+_DATE_CLASS_RE = re.compile(r'(?i)(date|time|published)')
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+
+# Разбираются только нужные поддеревья ленты
+_SMARTLAB_STRAINER = SoupStrainer(['article', 'div'], class_=_SMARTLAB_ITEM_CLASS_RE)
+_SMARTLAB_LINK_STRAINER = SoupStrainer('a', href=_SMARTLAB_LINK_RE)
+_LINK_STRAINER = SoupStrainer('a')
+_VEDOMOSTI_STRAINER = SoupStrainer(['a', 'div'], class_=_VEDOMOSTI_ITEM_CLASS_RE)
+
+def _element_text(element: Any) -> str:
+    """Текст элемента lxml без лишних пробелов"""
+    try:
+        return ' '.join(element.text_content().split())
+    except Exception:
+        return ""
+
+def extract_article_data(html: Union[bytes, str], url: str) -> Optional[Dict[str, Any]]:
+    """
+    Извлекает содержимое статьи из уже загруженного HTML.
+    Документ разбирается один раз: дерево lxml используется и для
+    заголовка, цитат, тегов и даты, и для trafilatura
+    """
+    tree = trafilatura.load_html(html)
+    if tree is None:
+        logger.warning(f"Could not parse HTML from {url}")
+        return None
+
+    # Метаданные извлекаем до trafilatura, т.к. она может модифицировать дерево
+    title_elems = _TITLE_XPATH(tree)
+    title = _element_text(title_elems[0]) if title_elems else ""
+
+    # Extract quotes (important for preserving them fully as requested)
+    quotes: List[str] = []
+    for quote_elem in _QUOTES_XPATH(tree):
+        quote_text = _element_text(quote_elem)
+        if len(quote_text) > 20:  # Only meaningful quotes
+            quotes.append(quote_text)
+
+    # Extract tags/categories
+    tags: List[str] = []
+    for tag_elem in _TAGS_XPATH(tree):
+        tag_text = _element_text(tag_elem)
+        if tag_text and len(tag_text) < 50:  # Reasonable tag length
+            tags.append(tag_text.lower())
+
+    # Дата публикации: meta-теги, <time datetime>, затем текст элементов с датой
+    published_at = extract_html_date(tree)
+
+    content = trafilatura.extract(tree, url=url)
+    if not content:
+        logger.warning(f"Could not extract content from {url}")
+        return None
+
+    if not title:
+        # Fallback to trafilatura title extraction
+        title_match = _FIRST_LINE_RE.search(content)
+        title = title_match.group(1) if title_match else "Без заголовка"
+
+    # Look for quoted text in the content (text in quotes)
+    quotes.extend(q.strip() for q in _CONTENT_QUOTE_RE.findall(content))
+
+    return {
+        'title': title,
+        'content': content,
+        'quotes': quotes,
+        'tags': list(set(tags)),  # Remove duplicates
+        'url': url,
+        'published_at': published_at
+    }
 
 class SmartLabScraper:
-    def __init__(self):
+    def __init__(self, html_parser: Optional[str] = None, cache: Optional[ScrapeCache] = None,
+                 archive: Optional[str] = None):
+        # Парсер BeautifulSoup для лент: 'lxml' (по умолчанию), 'html.parser' или 'html5lib'
+        self.html_parser = html_parser or HTML_PARSER
+        # Извлечение статьи из загруженного HTML; планировщик подменяет его пулом процессов
+        self.extractor: Callable[[bytes, str], Optional[Dict[str, Any]]] = extract_article_data
         self.base_url = "https://smartlab.news/"
         self.session = requests.Session()
         # Set headers to mimic a real browser
@@ -54,26 +158,37 @@ class SmartLabScraper:
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
         })
-        # Кэш для хранения результатов парсинга
-        self._cache: Dict[str, Tuple[float, Union[List[Dict[str, Any]], Dict[str, Any]]]] = {}
-        self._cache_ttl = 3600  # 1 час
+        # Пул соединений рассчитан на параллельную загрузку статей
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Запись ответов в архив или воспроизведение из него (SCRAPER_HTTP_ARCHIVE)
+        self.archive_adapter = install_archive(self.session, archive or SCRAPER_HTTP_ARCHIVE)
+        # Кэш результатов парсинга, по умолчанию общий для всех экземпляров процесса
+        self.cache = cache or scrape_cache
+        # ETag/Last-Modified и хэши лент источников
+        self.listing_tracker = ListingChangeTracker()
 
     def _get_cached_data(self, url: str) -> Optional[Union[List[Dict[str, Any]], Dict[str, Any]]]:
         """Получает кэшированные данные по URL"""
-        if url in self._cache:
-            timestamp, data = self._cache[url]
-            if time.time() - timestamp < self._cache_ttl:
-                return data
-        return None
+        return self.cache.get(url)
 
-    def _cache_data(self, url: str, data: Union[List[Dict[str, Any]], Dict[str, Any]]) -> None:
-        """Сохраняет данные в кэш"""
-        self._cache[url] = (time.time(), data)
-        # Ограничиваем размер кэша
-        if len(self._cache) > 100:
-            # Удаляем самые старые записи
-            oldest_url = min(self._cache.items(), key=lambda x: x[1][0])[0]
-            self._cache.pop(oldest_url)
+    def _cache_data(self, url: str, data: Union[List[Dict[str, Any]], Dict[str, Any]], kind: str = 'article') -> None:
+        """Сохраняет данные в кэш, время жизни зависит от вида записи"""
+        self.cache.set(url, data, kind=kind)
+
+    def get_cached_article(self, url: str) -> Optional[Dict[str, Any]]:
+        """Возвращает статью из кэша без сетевого запроса"""
+        cached_data = self._get_cached_data(url)
+        return cached_data if isinstance(cached_data, dict) else None
+
+    def cache_article(self, url: str, data: Dict[str, Any]) -> None:
+        """Сохраняет статью, загруженную вне скрапера (например, асинхронным конвейером)"""
+        self._cache_data(url, data)
+
+    def listing_sources(self) -> List[NewsSource]:
+        """Включенные источники из реестра"""
+        return source_registry.enabled()
 
     def _is_tag(self, element: Any) -> bool:
         """Проверяет, является ли элемент тегом"""
@@ -105,91 +220,177 @@ class SmartLabScraper:
         except Exception:
             return url
 
-    def get_latest_news(self, limit: int = 20) -> List[Dict[str, Any]]:
+    def get_source_news(self, source: NewsSource, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Загружает и разбирает ленту источника из реестра.
+        Если лента не изменилась с прошлого опроса, возвращает пустой список.
+        """
+        limit = limit or source.limit
+        # Данные прошлого незавершенного опроса не должны попасть в commit() этого
+        self.listing_tracker.discard([source])
         try:
-            # Проверяем кэш
-            cached_data = self._get_cached_data(f"{self.base_url}#limit={limit}")
-            if cached_data and isinstance(cached_data, list):
-                logger.info("Используем кэшированные данные для SmartLab")
-                return list(cached_data)[:limit]
-                
             start_time = time.time()
-            response = self.session.get(self.base_url, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            articles: List[Dict[str, Any]] = []
-            news_items = soup.find_all(['article', 'div'], class_=re.compile(r'(news|article|item|post)', re.I))
-            if not news_items:
-                news_items = soup.find_all('a', href=re.compile(r'/read/\\d+'))
-            for item in news_items[:limit]:
-                try:
-                    link_elem = None
-                    if self._is_tag(item) and cast(Tag, item).name == 'a':
-                        link_elem = item
-                    elif self._is_tag(item):
-                        link_elem = cast(Tag, item).find('a', href=re.compile(r'/read/\\d+'))
-                    
-                    if not self._is_tag(link_elem):
-                        continue
-                        
-                    href = self._safe_get_attr(link_elem, 'href')
-                    if not href:
-                        continue
-                        
-                    url = str(href)
-                    if url.startswith('/'):
-                        url = self._safe_urljoin(self.base_url, url)
-                    elif not url.startswith('http'):
-                        continue
-                        
-                    title = self._safe_get_text(link_elem)
-                    if not title and self._is_tag(item):
-                        title_elem = cast(Tag, item).find(['h1', 'h2', 'h3', 'h4', 'span'])
-                        title = self._safe_get_text(title_elem) if title_elem else "Без заголовка"
-                    if len(title) < 10:
-                        continue
-                        
-                    preview = ""
-                    if self._is_tag(item):
-                        preview_elem = cast(Tag, item).find(['p', 'div'])
-                        if preview_elem:
-                            preview = self._safe_get_text(preview_elem)[:200]
-                        
-                        # Извлекаем дату публикации
-                        published_at = None
-                        date_elem = cast(Tag, item).find(class_=re.compile(r'(?i)(date|time|published)'))
-                        if date_elem:
-                            date_text = self._safe_get_text(date_elem)
-                            try:
-                                # Пытаемся распознать дату
-                                if re.search(r'\d{2}\.\d{2}\.\d{4}', date_text):
-                                    published_at = datetime.strptime(date_text, '%d.%m.%Y')
-                                elif re.search(r'\d{2}\.\d{2}', date_text):
-                                    # Если только день и месяц, добавляем текущий год
-                                    current_year = datetime.now().year
-                                    published_at = datetime.strptime(f"{date_text}.{current_year}", '%d.%m.%Y')
-                            except ValueError:
-                                pass
-                        
-                        articles.append({
-                            'url': url,
-                            'title': title,
-                            'preview': preview,
-                            'published_at': published_at or datetime.utcnow()
-                        })
-                except Exception as e:
-                    logger.warning(f"Error parsing news item: {e}")
-                    continue
-                    
-            # Сохраняем в кэш
-            self._cache_data(f"{self.base_url}#limit={limit}", articles)
+            articles = self.get_feed_news(source, limit) if source.feed_url else None
+            # HTML-лента - запасной вариант, если фида нет или он недоступен
+            if articles is None and source.has_listing:
+                response = self.session.get(source.url, timeout=source.timeout,
+                                            headers=self.listing_tracker.request_headers(source.url))
+                if response.status_code != 304:
+                    response.raise_for_status()
+                articles = self.changed_listing_items(
+                    source, source.url, response.status_code, response.headers,
+                    lambda: self.parse_source(source, response.content, limit), response.content)
+            articles = articles or []
             
             execution_time = time.time() - start_time
-            logger.warning(f"Found {len(articles)} articles from SmartLab in {execution_time:.2f}s")
+            logger.warning(f"Found {len(articles)} articles from {source.title} in {execution_time:.2f}s")
             return articles
         except Exception as e:
-            logger.error(f"Error scraping SmartLab news: {e}")
+            logger.error(f"Error scraping {source.title}: {e}")
+            return []
+
+    def get_feed_news(self, source: NewsSource, limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Новости из RSS/Atom-фида или sitemap источника, фид читается потоково.
+        None - фид недоступен или пуст, пустой список - фид не изменился.
+        """
+        limit = limit or source.limit
+        try:
+            with self.session.get(source.feed_url, timeout=source.timeout, stream=True,
+                                  headers=self.listing_tracker.request_headers(source.feed_url)) as response:
+                if response.status_code != 304:
+                    response.raise_for_status()
+                return self.changed_listing_items(
+                    source, source.feed_url, response.status_code, response.headers,
+                    lambda: parse_feed(response.iter_content(FEED_CHUNK_SIZE), limit,
+                                       base_url=source.url, link_pattern=source.link_pattern))
+        except Exception as e:
+            logger.warning(f"Feed {source.feed_url} unavailable, falling back to listing: {e}")
+            return None
+
+    def changed_listing_items(self, source: NewsSource, url: str, status_code: int, headers: Any,
+                              parse: Callable[[], List[Dict[str, Any]]],
+                              content: Optional[bytes] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Разбирает ленту, только если она изменилась с прошлого опроса.
+        Ответ 304 или тот же хэш страницы - пустой список без разбора,
+        тот же набор статей - пустой список без проверок в базе.
+        None - в ленте не нашлось ни одной статьи.
+        Заголовки и хэши откладываются только после успешного разбора; вызывающий
+        код сохраняет их через listing_tracker.commit() после постановки статей в очередь
+        """
+        tracker = self.listing_tracker
+        if status_code == 304:
+            tracker.record(source, 'not_modified')
             return []
+        if content is not None and tracker.check(url, content):
+            tracker.remember(source, url, headers, {})
+            tracker.record(source, 'unchanged')
+            return []
+        items = parse()
+        if not items:
+            return None
+        fingerprint = items_fingerprint(items)
+        tracker.remember(source, url, headers,
+                         {f"{url}#items": fingerprint, **({url: content} if content is not None else {})})
+        if tracker.check(f"{url}#items", fingerprint):
+            tracker.record(source, 'unchanged')
+            return []
+        tracker.record(source, 'changed')
+        return items
+
+    def make_soup(self, html: Union[str, bytes], parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+        """Разбор HTML выбранным парсером, parse_only ограничивает разбор нужными элементами"""
+        return BeautifulSoup(html, self.html_parser, parse_only=parse_only)
+
+    def parse_source(self, source: NewsSource, html: Union[str, bytes],
+                     limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Разбирает ленту парсером источника или по его CSS-селекторам"""
+        limit = limit or source.limit
+        if source.parser:
+            return getattr(self, source.parser)(html, limit)
+        return parse_listing_html(html, source, limit, html_parser=self.html_parser)
+
+    def fetch_sources(self, sources: List[NewsSource]) -> Dict[str, List[Dict[str, Any]]]:
+        """Опрашивает ленты всех источников параллельно. Возвращает имя источника -> новости"""
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        if not sources:
+            return results
+        workers = min(len(sources), DEFAULT_MAX_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="listing") as executor:
+            futures = {executor.submit(self.get_source_news, source): source for source in sources}
+            for future in as_completed(futures):
+                results[futures[future].name] = future.result()
+        return results
+
+    def get_latest_news(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return self.get_source_news(source_registry.get('smartlab'), limit)
+
+    def get_latest_rbc(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Получить свежие новости с rbc.ru"""
+        return self.get_source_news(source_registry.get('rbc'), limit)
+
+    def get_latest_vedomosti(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Получить свежие новости с vedomosti.ru"""
+        return self.get_source_news(source_registry.get('vedomosti'), limit)
+
+    def parse_smartlab_listing(self, html: Union[str, bytes], limit: int = 20) -> List[Dict[str, Any]]:
+        """Разбирает главную страницу SmartLab"""
+        soup = self.make_soup(html, _SMARTLAB_STRAINER)
+        articles: List[Dict[str, Any]] = []
+        news_items = soup.find_all(['article', 'div'], class_=_SMARTLAB_ITEM_CLASS_RE)
+        if not news_items:
+            news_items = self.make_soup(html, _SMARTLAB_LINK_STRAINER).find_all('a', href=_SMARTLAB_LINK_RE)
+        for item in news_items[:limit]:
+            try:
+                link_elem = None
+                if self._is_tag(item) and cast(Tag, item).name == 'a':
+                    link_elem = item
+                elif self._is_tag(item):
+                    link_elem = cast(Tag, item).find('a', href=_SMARTLAB_LINK_RE)
+                
+                if not self._is_tag(link_elem):
+                    continue
+                    
+                href = self._safe_get_attr(link_elem, 'href')
+                if not href:
+                    continue
+                    
+                url = str(href)
+                if url.startswith('/'):
+                    url = self._safe_urljoin(self.base_url, url)
+                elif not url.startswith('http'):
+                    continue
+                    
+                title = self._safe_get_text(link_elem)
+                if not title and self._is_tag(item):
+                    title_elem = cast(Tag, item).find(['h1', 'h2', 'h3', 'h4', 'span'])
+                    title = self._safe_get_text(title_elem) if title_elem else "Без заголовка"
+                if len(title) < 10:
+                    continue
+                    
+                preview = ""
+                if self._is_tag(item):
+                    preview_elem = cast(Tag, item).find(['p', 'div'])
+                    if preview_elem:
+                        preview = self._safe_get_text(preview_elem)[:200]
+                    
+                    # Извлекаем дату публикации
+                    published_at = None
+                    date_elem = cast(Tag, item).find(class_=_DATE_CLASS_RE)
+                    if date_elem:
+                        published_at = parse_date(self._safe_get_text(date_elem))
+                    
+                    articles.append({
+                        'url': url,
+                        'title': title,
+                        'preview': preview,
+                        'published_at': published_at
+                    })
+            except Exception as e:
+                logger.warning(f"Error parsing news item: {e}")
+                continue
+        return articles
 
     def get_article_content(self, url: str) -> Optional[Dict[str, Any]]:
         """
@@ -204,78 +405,13 @@ class SmartLabScraper:
             
         try:
             start_time = time.time()
+            # Загружаем страницу один раз через общий пул соединений
             response = self.session.get(url, timeout=30)
             response.raise_for_status()
             
-            # Use trafilatura for better content extraction
-            downloaded = trafilatura.fetch_url(url)
-            if not downloaded:
-                logger.warning(f"Could not download content from {url}")
+            result = self.extractor(response.content, url)
+            if not result:
                 return None
-                
-            content = trafilatura.extract(downloaded)
-            if not content:
-                logger.warning(f"Could not extract content from {url}")
-                return None
-            
-            # Also parse with BeautifulSoup for additional data
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extract title
-            title = ""
-            title_elem = soup.find(['h1', 'h2'], class_=re.compile(r'(title|heading)', re.I))
-            if title_elem:
-                title = self._safe_get_text(title_elem)
-            else:
-                # Fallback to trafilatura title extraction
-                title_match = re.search(r'^([^\n]+)', content)
-                title = title_match.group(1) if title_match else "Без заголовка"
-            
-            # Extract quotes (important for preserving them fully as requested)
-            quotes: List[str] = []
-            quote_elements = soup.find_all(['blockquote', 'q', 'cite'])
-            for quote_elem in quote_elements:
-                quote_text = self._safe_get_text(quote_elem)
-                if len(quote_text) > 20:  # Only meaningful quotes
-                    quotes.append(quote_text)
-            
-            # Look for quoted text in the content (text in quotes)
-            quote_pattern = r'["«»""]([^"«»""]{20,}?)["«»""]'
-            content_quotes = re.findall(quote_pattern, content, re.DOTALL)
-            quotes.extend([q.strip() for q in content_quotes])
-            
-            # Extract tags/categories
-            tags: List[str] = []
-            tag_elements = soup.find_all(['a', 'span'], class_=re.compile(r'(tag|category|label)', re.I))
-            for tag_elem in tag_elements:
-                tag_text = self._safe_get_text(tag_elem)
-                if tag_text and len(tag_text) < 50:  # Reasonable tag length
-                    tags.append(tag_text.lower())
-            
-            # Extract publication date
-            published_at = None
-            date_elem = soup.find(class_=re.compile(r'(?i)(date|time|published)'))
-            if date_elem:
-                date_text = self._safe_get_text(date_elem)
-                try:
-                    # Пытаемся распознать дату
-                    if re.search(r'\d{2}\.\d{2}\.\d{4}', date_text):
-                        published_at = datetime.strptime(date_text, '%d.%m.%Y')
-                    elif re.search(r'\d{2}\.\d{2}', date_text):
-                        # Если только день и месяц, добавляем текущий год
-                        current_year = datetime.now().year
-                        published_at = datetime.strptime(f"{date_text}.{current_year}", '%d.%m.%Y')
-                except ValueError:
-                    pass
-            
-            result: Dict[str, Any] = {
-                'title': title,
-                'content': content,
-                'quotes': quotes,
-                'tags': list(set(tags)),  # Remove duplicates
-                'url': url,
-                'published_at': published_at or datetime.utcnow()
-            }
             
             # Сохраняем в кэш
             self._cache_data(url, result)
@@ -289,195 +425,138 @@ class SmartLabScraper:
             logger.error(f"Error getting article content from {url}: {e}")
             return None
 
-    def get_latest_rbc(self, limit: int = 20) -> List[Dict[str, Any]]:
-        """Получить свежие новости с rbc.ru"""
-        # Проверяем кэш
-        cached_data = self._get_cached_data("https://www.rbc.ru/#limit=" + str(limit))
-        if cached_data and isinstance(cached_data, list):
-            logger.info("Используем кэшированные данные для RBC")
-            return list(cached_data)[:limit]
-            
-        logger.warning("Вызван get_latest_rbc")
+    def parse_rbc_listing(self, html: Union[str, bytes], limit: int = 20) -> List[Dict[str, Any]]:
+        """Разбирает ленту rbc.ru"""
         url = "https://www.rbc.ru/"
-        try:
-            start_time = time.time()
-            resp = self.session.get(url, timeout=20)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.content, 'html.parser')
-            articles: List[Dict[str, Any]] = []
-            
-            # Пробуем разные селекторы для поиска новостей
-            news_items = soup.find_all('a', class_=re.compile(r'(?i)main__feed__link'))
-            if not news_items:
-                logger.warning("Не найдены элементы по main__feed__link, пробуем другие селекторы")
-                news_items = soup.find_all('a', class_=re.compile(r'(?i)(item__link|news-feed__item)'))
-            if not news_items:
-                # Пробуем найти по структуре URL
-                news_items = soup.find_all('a', href=re.compile(r'https?://www\.rbc\.ru/.*?/\d{2}/\d{2}/\d{4}/'))
-            
-            logger.warning(f"RBC: найдено {len(news_items)} элементов")
-            
-            for item in news_items:
-                try:
-                    if not self._is_tag(item):
-                        continue
-                    
-                    href = self._safe_get_attr(item, 'href')
-                    if not href:
-                        continue
-                        
-                    news_url = str(href)
-                    if not news_url.startswith('http'):
-                        news_url = self._safe_urljoin(url, news_url)
-                        
-                    title = self._safe_get_text(item)
-                    if not title:
-                        title_elem = cast(Tag, item).find(['h1', 'h2', 'h3', 'h4', 'span'])
-                        if title_elem:
-                            title = self._safe_get_text(title_elem)
-                            
-                    if not news_url or not title or len(title) < 10:
-                        continue
-                        
-                    preview = ""
-                    preview_elem = cast(Tag, item).find(['p', 'div', 'span'], class_=re.compile(r'(?i)(preview|summary|description)'))
-                    if preview_elem:
-                        preview = self._safe_get_text(preview_elem)[:200]
+        # Новости ленты - ссылки, остальную страницу не разбираем
+        soup = self.make_soup(html, _LINK_STRAINER)
+        articles: List[Dict[str, Any]] = []
+        
+        # Пробуем разные селекторы для поиска новостей
+        news_items = soup.find_all('a', class_=_RBC_FEED_LINK_RE)
+        if not news_items:
+            logger.warning("Не найдены элементы по main__feed__link, пробуем другие селекторы")
+            news_items = soup.find_all('a', class_=_RBC_ITEM_LINK_RE)
+        if not news_items:
+            # Пробуем найти по структуре URL
+            news_items = soup.find_all('a', href=_RBC_ARTICLE_URL_RE)
+        
+        logger.warning(f"RBC: найдено {len(news_items)} элементов")
+        
+        for item in news_items:
+            try:
+                if not self._is_tag(item):
+                    continue
+                
+                href = self._safe_get_attr(item, 'href')
+                if not href:
+                    continue
                     
-                    # Извлекаем дату публикации из URL
-                    published_at = None
-                    date_match = re.search(r'/(\d{4})/(\d{2})/(\d{2})/', news_url)
-                    if date_match:
-                        year, month, day = map(int, date_match.groups())
-                        try:
-                            published_at = datetime(year, month, day)
-                        except ValueError:
-                            pass
-                        
-                    articles.append({
-                        'url': news_url,
-                        'title': title,
-                        'preview': preview,
-                        'published_at': published_at or datetime.utcnow()
-                    })
+                news_url = str(href)
+                if not news_url.startswith('http'):
+                    news_url = self._safe_urljoin(url, news_url)
                     
-                    if len(articles) >= limit:
-                        break
+                title = self._safe_get_text(item)
+                if not title:
+                    title_elem = cast(Tag, item).find(['h1', 'h2', 'h3', 'h4', 'span'])
+                    if title_elem:
+                        title = self._safe_get_text(title_elem)
                         
-                except Exception as e:
-                    logger.warning(f"RBC parse error: {e}")
+                if not news_url or not title or len(title) < 10:
                     continue
-            
-            # Сохраняем в кэш
-            self._cache_data("https://www.rbc.ru/#limit=" + str(limit), articles)
-            
-            execution_time = time.time() - start_time
-            logger.warning(f"Found {len(articles)} articles from RBC in {execution_time:.2f}s")
-            return articles
-            
-        except Exception as e:
-            logger.error(f"Error scraping RBC: {e}")
-            return []
-    
-    def get_latest_vedomosti(self, limit: int = 20) -> List[Dict[str, Any]]:
-        """Получить свежие новости с vedomosti.ru"""
-        # Проверяем кэш
-        cached_data = self._get_cached_data("https://www.vedomosti.ru/economics#limit=" + str(limit))
-        if cached_data and isinstance(cached_data, list):
-            logger.info("Используем кэшированные данные для Vedomosti")
-            return list(cached_data)[:limit]
-            
-        url = "https://www.vedomosti.ru/economics"
-        try:
-            start_time = time.time()
-            resp = self.session.get(url, timeout=20)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.content, 'html.parser')
-            articles: List[Dict[str, Any]] = []
-            
-            news_items = soup.find_all('a', class_=re.compile(r'(?i)(article|news-item)'))
-            if not news_items:
-                news_items = soup.find_all('div', class_=re.compile(r'(?i)(article|news-item)'))
+                    
+                preview = ""
+                preview_elem = cast(Tag, item).find(['p', 'div', 'span'], class_=_PREVIEW_CLASS_RE)
+                if preview_elem:
+                    preview = self._safe_get_text(preview_elem)[:200]
                 
-            logger.warning(f"Vedomosti: найдено {len(news_items)} элементов")
-            
-            for item in news_items[:limit]:
-                try:
-                    # Извлекаем URL
-                    if self._is_tag(item) and cast(Tag, item).name == 'a':
-                        href = self._safe_get_attr(item, 'href')
-                        if not href:
-                            continue
-                        news_url = str(href)
-                    else:
-                        link_elem = cast(Tag, item).find('a') if self._is_tag(item) else None
-                        if not link_elem or not self._is_tag(link_elem):
-                            continue
-                        href = self._safe_get_attr(link_elem, 'href')
-                        if not href:
-                            continue
-                        news_url = str(href)
-                        
-                    if not news_url.startswith('http'):
-                        news_url = self._safe_urljoin(url, news_url)
+                # Извлекаем дату публикации из URL
+                published_at = date_from_url(news_url)
                     
-                    # Извлекаем заголовок
-                    title_elem = cast(Tag, item).find(['h1', 'h2', 'h3', 'h4', 'span'], class_=re.compile(r'(?i)(title|heading)'))
-                    title = self._safe_get_text(title_elem) if title_elem else self._safe_get_text(item)
+                articles.append({
+                    'url': news_url,
+                    'title': title,
+                    'preview': preview,
+                    'published_at': published_at
+                })
+                
+                if len(articles) >= limit:
+                    break
                     
-                    if not title or len(title) < 10:
+            except Exception as e:
+                logger.warning(f"RBC parse error: {e}")
+                continue
+        return articles
+
+    def parse_vedomosti_listing(self, html: Union[str, bytes], limit: int = 20) -> List[Dict[str, Any]]:
+        """Разбирает ленту vedomosti.ru"""
+        url = "https://www.vedomosti.ru/economics"
+        soup = self.make_soup(html, _VEDOMOSTI_STRAINER)
+        articles: List[Dict[str, Any]] = []
+        
+        news_items = soup.find_all('a', class_=_VEDOMOSTI_ITEM_CLASS_RE)
+        if not news_items:
+            news_items = soup.find_all('div', class_=_VEDOMOSTI_ITEM_CLASS_RE)
+            
+        logger.warning(f"Vedomosti: найдено {len(news_items)} элементов")
+        
+        for item in news_items[:limit]:
+            try:
+                # Извлекаем URL
+                if self._is_tag(item) and cast(Tag, item).name == 'a':
+                    href = self._safe_get_attr(item, 'href')
+                    if not href:
                         continue
+                    news_url = str(href)
+                else:
+                    link_elem = cast(Tag, item).find('a') if self._is_tag(item) else None
+                    if not link_elem or not self._is_tag(link_elem):
+                        continue
+                    href = self._safe_get_attr(link_elem, 'href')
+                    if not href:
+                        continue
+                    news_url = str(href)
                     
-                    # Извлекаем превью
-                    preview = ""
-                    preview_elem = cast(Tag, item).find(['p', 'div'], class_=re.compile(r'(?i)(preview|summary|description)'))
-                    if preview_elem:
-                        preview = self._safe_get_text(preview_elem)[:200]
-                    
-                    # Извлекаем дату публикации
-                    published_at = None
-                    date_elem = cast(Tag, item).find(class_=re.compile(r'(?i)(date|time|published)'))
-                    if date_elem:
-                        date_text = self._safe_get_text(date_elem)
-                        try:
-                            # Пытаемся распознать дату
-                            if re.search(r'\d{2}\.\d{2}\.\d{4}', date_text):
-                                published_at = datetime.strptime(date_text, '%d.%m.%Y')
-                            elif re.search(r'\d{2}\.\d{2}', date_text):
-                                # Если только день и месяц, добавляем текущий год
-                                current_year = datetime.now().year
-                                published_at = datetime.strptime(f"{date_text}.{current_year}", '%d.%m.%Y')
-                        except ValueError:
-                            pass
-                    
-                    articles.append({
-                        'url': news_url,
-                        'title': title,
-                        'preview': preview,
-                        'published_at': published_at or datetime.utcnow()
-                    })
-                    
-                except Exception as e:
-                    logger.warning(f"Vedomosti parse error: {e}")
+                if not news_url.startswith('http'):
+                    news_url = self._safe_urljoin(url, news_url)
+                
+                # Извлекаем заголовок
+                title_elem = cast(Tag, item).find(['h1', 'h2', 'h3', 'h4', 'span'], class_=_TITLE_CLASS_RE)
+                title = self._safe_get_text(title_elem) if title_elem else self._safe_get_text(item)
+                
+                if not title or len(title) < 10:
                     continue
-            
-            # Сохраняем в кэш
-            self._cache_data("https://www.vedomosti.ru/economics#limit=" + str(limit), articles)
-            
-            execution_time = time.time() - start_time
-            logger.warning(f"Found {len(articles)} articles from Vedomosti in {execution_time:.2f}s")
-            return articles
-            
-        except Exception as e:
-            logger.error(f"Error scraping Vedomosti: {e}")
-            return []
-    
+                
+                # Извлекаем превью
+                preview = ""
+                preview_elem = cast(Tag, item).find(['p', 'div'], class_=_PREVIEW_CLASS_RE)
+                if preview_elem:
+                    preview = self._safe_get_text(preview_elem)[:200]
+                
+                # Извлекаем дату публикации
+                published_at = None
+                date_elem = cast(Tag, item).find(class_=_DATE_CLASS_RE)
+                if date_elem:
+                    published_at = parse_date(self._safe_get_text(date_elem))
+                
+                articles.append({
+                    'url': news_url,
+                    'title': title,
+                    'preview': preview,
+                    'published_at': published_at
+                })
+                
+            except Exception as e:
+                logger.warning(f"Vedomosti parse error: {e}")
+                continue
+        return articles
+
     def extract_hashtags_from_content(self, content: str, existing_tags: Optional[List[str]] = None) -> List[str]:
         hashtags = set()
         if existing_tags is None:
             existing_tags = []
         for tag in existing_tags:
-            clean_tag = re.sub(r'[^\w\s]', '', tag).strip()
+            clean_tag = _NON_WORD_RE.sub('', tag).strip()
             if clean_tag:
                 hashtags.add(f"#{clean_tag}")
         financial_terms = [
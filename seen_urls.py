@@ -0,0 +1,122 @@
+# Last modified: 2024-03-26
+import os
+import hashlib
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Deque, Dict, Iterable, List, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# Сколько адресов помнить в памяти и за сколько дней загружать их из базы при старте
+SEEN_URLS_CAPACITY = int(os.environ.get("SEEN_URLS_CAPACITY", "200000"))
+SEEN_URLS_WARM_DAYS = int(os.environ.get("SEEN_URLS_WARM_DAYS", "30"))
+# Размер пачки для запроса IN (...): у SQLite лимит 999 параметров
+URL_LOOKUP_CHUNK = 500
+
+# Параметры, которые не меняют страницу: метки рекламных кампаний и переходов
+TRACKING_PARAMS = {'from', 'ref', 'yclid', 'gclid', 'fbclid', '_openstat', 'utm_referrer', 'rss'}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Канонический адрес статьи: схема и домен в нижнем регистре, без порта по умолчанию,
+    без якоря, меток utm_* и других трекинговых параметров, без завершающего слэша
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    ))
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+def _url_hash(url: str) -> int:
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class SeenURLFilter:
+    """
+    Множество 64-битных хэшей недавно встреченных адресов.
+    Адрес из множества точно есть в базе, такие статьи отбрасываются без запроса;
+    остальные проверяются одним запросом IN (...) на цикл.
+    При переполнении забываются самые старые адреса.
+    """
+
+    def __init__(self, capacity: int = SEEN_URLS_CAPACITY):
+        self.capacity = capacity
+        self._hashes: Set[int] = set()
+        self._order: Deque[int] = deque()
+        self._lock = Lock()
+        self.warmed = False
+        self._stats = {'filtered': 0, 'db_checked': 0}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, url: str) -> bool:
+        return _url_hash(url) in self._hashes
+
+    def add_many(self, urls: Iterable[str]) -> None:
+        with self._lock:
+            for url in urls:
+                value = _url_hash(url)
+                if value in self._hashes:
+                    continue
+                self._hashes.add(value)
+                self._order.append(value)
+            while len(self._order) > self.capacity:
+                self._hashes.discard(self._order.popleft())
+
+    def warm(self, days: int = SEEN_URLS_WARM_DAYS) -> int:
+        """Загружает адреса статей за последние days дней. Нужен контекст приложения"""
+        from models import NewsArticle
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        rows = (NewsArticle.query.with_entities(NewsArticle.url)
+                .filter(NewsArticle.created_at >= cutoff)
+                .order_by(NewsArticle.created_at.desc())
+                .limit(self.capacity).all())
+        # Самые свежие адреса добавляются последними и вытесняются позже всех
+        self.add_many(canonicalize_url(url) for url, in reversed(rows))
+        self.warmed = True
+        logger.info(f"Seen URL filter warmed with {len(rows)} URLs")
+        return len(rows)
+
+    def known(self, urls: List[str], aliases: Optional[Dict[str, str]] = None) -> Set[str]:
+        """
+        Какие из канонических адресов уже есть в базе.
+        Сначала проверяется множество в памяти, остальные - запросами IN (...).
+        aliases (исходный адрес -> канонический) позволяет найти статьи,
+        сохраненные до канонизации адресов.
+        """
+        from models import NewsArticle
+        known = {url for url in urls if url in self}
+        unknown = [url for url in urls if url not in known]
+        self._stats['filtered'] += len(known)
+        self._stats['db_checked'] += len(unknown)
+        if not unknown:
+            return known
+        unknown_set = set(unknown)
+        aliases = aliases or {}
+        candidates = unknown + [raw for raw, canonical in aliases.items()
+                                if canonical in unknown_set and raw != canonical]
+        found: Set[str] = set()
+        for i in range(0, len(candidates), URL_LOOKUP_CHUNK):
+            chunk = candidates[i:i + URL_LOOKUP_CHUNK]
+            rows = NewsArticle.query.with_entities(NewsArticle.url).filter(NewsArticle.url.in_(chunk)).all()
+            found.update(aliases.get(url, url) for url, in rows)
+        self.add_many(found)
+        return known | found
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self._hashes), **self._stats}
@@ -0,0 +1,350 @@
+# Last modified: 2024-03-26
+import os
+import re
+import json
+import hashlib
+import logging
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup, Tag
+from lxml import etree
+
+from dates import parse_date, date_from_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCE_LIMIT = int(os.environ.get("SOURCE_DEFAULT_LIMIT", "50"))
+DEFAULT_POLL_INTERVAL = int(os.environ.get("SOURCE_DEFAULT_POLL_INTERVAL", "15"))
+# Парсер BeautifulSoup для HTML-лент
+HTML_PARSER = os.environ.get("SCRAPER_HTML_PARSER", "lxml")
+
+_MARKUP_RE = re.compile(r'<[^>]+>')
+
+# Элементы, из которых фид состоит: RSS <item>, Atom <entry>, sitemap <url>.
+# Пространства имен учитываются, чтобы не спутать с вложенными <url> расширений RSS
+FEED_ENTRY_TAGS = {
+    'item',
+    '{http://purl.org/rss/1.0/}item',
+    '{http://www.w3.org/2005/Atom}entry',
+    '{http://www.sitemaps.org/schemas/sitemap/0.9}url',
+}
+FEED_CHUNK_SIZE = 16 * 1024
+
+
+class NewsSource:
+    """
+    Описание источника новостей.
+
+    name          - уникальное имя источника
+    url           - страница ленты
+    limit         - сколько новостей брать за один опрос
+    poll_interval - как часто опрашивать ленту, минуты
+    parser        - имя метода SmartLabScraper для разбора ленты; если не задан,
+                    лента разбирается по CSS-селекторам:
+    item_selector, link_selector, title_selector, preview_selector, date_selector
+    link_pattern  - регулярное выражение, которому должен соответствовать URL статьи
+    feed_url      - RSS/Atom-фид или новостной sitemap; если задан, новости берутся
+                    из него, а HTML-лента используется только когда фид недоступен
+    """
+
+    def __init__(self, name: str, url: str, limit: int = DEFAULT_SOURCE_LIMIT,
+                 poll_interval: int = DEFAULT_POLL_INTERVAL, parser: Optional[str] = None,
+                 item_selector: Optional[str] = None, link_selector: str = 'a[href]',
+                 title_selector: Optional[str] = None, preview_selector: Optional[str] = None,
+                 date_selector: Optional[str] = None, link_pattern: Optional[str] = None,
+                 title: Optional[str] = None, timeout: int = 20, enabled: bool = True,
+                 feed_url: Optional[str] = None):
+        if not parser and not item_selector and not feed_url:
+            raise ValueError(f"Source '{name}' needs a parser, an item_selector or a feed_url")
+        self.name = name
+        self.url = url
+        self.limit = limit
+        self.poll_interval = poll_interval
+        self.parser = parser
+        self.item_selector = item_selector
+        self.link_selector = link_selector
+        self.title_selector = title_selector
+        self.preview_selector = preview_selector
+        self.date_selector = date_selector
+        self.link_pattern = re.compile(link_pattern) if link_pattern else None
+        self.title = title or name
+        self.timeout = timeout
+        self.enabled = enabled
+        self.feed_url = feed_url
+
+    @property
+    def has_listing(self) -> bool:
+        """Можно ли разобрать HTML-ленту источника"""
+        return bool(self.parser or self.item_selector)
+
+    @property
+    def domain(self) -> str:
+        host = urlparse(self.url).netloc.lower()
+        return host[4:] if host.startswith('www.') else host
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "NewsSource":
+        return cls(**data)
+
+    def __repr__(self):
+        return f'<NewsSource {self.name}>'
+
+
+class SourceRegistry:
+    """Реестр источников в порядке регистрации"""
+
+    def __init__(self, sources: Optional[List[NewsSource]] = None):
+        self._sources: Dict[str, NewsSource] = {}
+        for source in sources or []:
+            self.register(source)
+
+    def register(self, source: NewsSource) -> NewsSource:
+        if source.name in self._sources:
+            logger.warning(f"Source '{source.name}' is registered again, replacing")
+        self._sources[source.name] = source
+        return source
+
+    def get(self, name: str) -> Optional[NewsSource]:
+        return self._sources.get(name)
+
+    def all(self) -> List[NewsSource]:
+        return list(self._sources.values())
+
+    def enabled(self) -> List[NewsSource]:
+        return [source for source in self._sources.values() if source.enabled]
+
+    def find_by_url(self, url: str) -> Optional[NewsSource]:
+        """Источник статьи по домену ее URL"""
+        host = urlparse(url).netloc.lower()
+        for source in self._sources.values():
+            if host == source.domain or host.endswith('.' + source.domain):
+                return source
+        return None
+
+    def load_file(self, path: str) -> int:
+        """Добавляет источники из JSON-файла со списком описаний NewsSource"""
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+        for entry in entries:
+            self.register(NewsSource.from_dict(entry))
+        return len(entries)
+
+
+def parse_listing_html(html: Any, source: NewsSource, limit: Optional[int] = None,
+                       html_parser: str = HTML_PARSER) -> List[Dict[str, Any]]:
+    """Разбор ленты по CSS-селекторам источника"""
+    limit = limit or source.limit
+    soup = BeautifulSoup(html, html_parser)
+    articles: List[Dict[str, Any]] = []
+    seen = set()
+    for item in soup.select(source.item_selector):
+        try:
+            link = item if item.name == 'a' else item.select_one(source.link_selector)
+            href = link.get('href') if isinstance(link, Tag) else None
+            if not href:
+                continue
+            url = urljoin(source.url, str(href))
+            if url in seen or (source.link_pattern and not source.link_pattern.search(url)):
+                continue
+
+            title_elem = item.select_one(source.title_selector) if source.title_selector else link
+            title = title_elem.get_text(strip=True) if title_elem else ''
+            if len(title) < 10:
+                continue
+
+            preview = ''
+            if source.preview_selector:
+                preview_elem = item.select_one(source.preview_selector)
+                preview = preview_elem.get_text(strip=True)[:200] if preview_elem else ''
+
+            published_at = None
+            if source.date_selector:
+                date_elem = item.select_one(source.date_selector)
+                if date_elem:
+                    published_at = parse_date(date_elem.get_text(strip=True))
+            published_at = published_at or date_from_url(url)
+
+            seen.add(url)
+            articles.append({
+                'url': url,
+                'title': title,
+                'preview': preview,
+                'published_at': published_at
+            })
+            if len(articles) >= limit:
+                break
+        except Exception as e:
+            logger.warning(f"{source.name} parse error: {e}")
+            continue
+    return articles
+
+
+def _local_name(element) -> str:
+    return etree.QName(element).localname if isinstance(element.tag, str) else ''
+
+
+def _feed_entry(element, base_url: str) -> Optional[Dict[str, Any]]:
+    """URL, заголовок, превью и дата из элемента RSS/Atom/sitemap"""
+    url = title = preview = None
+    published_at = None
+    for child in element.iter():
+        name = _local_name(child)
+        text = (child.text or '').strip()
+        if name == 'link':
+            # В Atom ссылка в атрибуте href, берем rel="alternate" или ссылку без rel
+            href = child.get('href')
+            if href and child.get('rel', 'alternate') == 'alternate':
+                url = url or href
+            elif text:
+                url = url or text
+        elif name == 'loc' and not url:
+            url = text
+        elif name == 'title' and not title:
+            title = text
+        elif name in ('description', 'summary') and not preview:
+            preview = _MARKUP_RE.sub('', text)[:200].strip()
+        elif name in ('pubDate', 'published', 'publication_date', 'updated', 'lastmod', 'date'):
+            published_at = published_at or parse_date(text)
+    if not url or not title:
+        return None
+    return {
+        'url': urljoin(base_url, url),
+        'title': title,
+        'preview': preview or '',
+        'published_at': published_at or date_from_url(url)
+    }
+
+
+def parse_feed(chunks: Iterable[bytes], limit: int, base_url: str = '',
+               link_pattern: Optional[re.Pattern] = None) -> List[Dict[str, Any]]:
+    """
+    Потоковый разбор RSS, Atom или новостного sitemap.
+    Куски документа подаются парсеру по мере загрузки; как только набрано limit
+    новостей, чтение прекращается и остаток фида не загружается.
+    """
+    parser = etree.XMLPullParser(events=('end',), resolve_entities=False, no_network=True)
+    articles: List[Dict[str, Any]] = []
+    seen = set()
+    for chunk in chunks:
+        parser.feed(chunk)
+        for _, element in parser.read_events():
+            if element.tag not in FEED_ENTRY_TAGS:
+                continue
+            entry = _feed_entry(element, base_url)
+            # Разобранные элементы больше не нужны, дерево не растет
+            element.clear()
+            if not entry or entry['url'] in seen:
+                continue
+            if link_pattern and not link_pattern.search(entry['url']):
+                continue
+            seen.add(entry['url'])
+            articles.append(entry)
+            if len(articles) >= limit:
+                return articles
+    return articles
+
+
+class ListingChangeTracker:
+    """
+    Отслеживает изменения лент источников между опросами.
+    Хранит ETag/Last-Modified для условных запросов и хэши содержимого:
+    ответ 304 или совпавший хэш означают, что разбирать ленту и проверять
+    ее статьи в базе не нужно.
+    Новые заголовки и хэши опроса сначала откладываются и вступают в силу
+    только после commit(), когда статьи ленты сохранены в очередь: иначе после
+    ошибки разбора или записи в базу та же лента считалась бы неизменившейся.
+    """
+
+    def __init__(self):
+        self._validators: Dict[str, Dict[str, str]] = {}
+        self._hashes: Dict[str, str] = {}
+        # Отложенные данные опроса по источникам: {'validators': {url: ...}, 'hashes': {key: ...}}
+        self._pending: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = Lock()
+
+    def _pending_for(self, source: NewsSource) -> Dict[str, Dict[str, Any]]:
+        return self._pending.setdefault(source.name, {'validators': {}, 'hashes': {}})
+
+    def request_headers(self, url: str) -> Dict[str, str]:
+        """Заголовки If-None-Match/If-Modified-Since для ленты"""
+        with self._lock:
+            validators = self._validators.get(url, {})
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def remember(self, source: NewsSource, url: str, headers: Any, contents: Dict[str, bytes]) -> None:
+        """Откладывает до commit() ETag/Last-Modified из ответа и хэши содержимого по ключам"""
+        validators = {'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+        with self._lock:
+            pending = self._pending_for(source)
+            pending['validators'][url] = validators
+            for key, content in contents.items():
+                pending['hashes'][key] = hashlib.sha1(content).hexdigest()
+
+    def check(self, key: str, content: bytes) -> bool:
+        """Совпадает ли хэш содержимого с сохраненным опросом"""
+        digest = hashlib.sha1(content).hexdigest()
+        with self._lock:
+            return self._hashes.get(key) == digest
+
+    def commit(self, sources: Iterable[NewsSource]) -> None:
+        """Сохраняет отложенные заголовки и хэши: статьи лент источников уже в очереди"""
+        with self._lock:
+            for source in sources:
+                pending = self._pending.pop(source.name, None)
+                if not pending:
+                    continue
+                for url, validators in pending['validators'].items():
+                    if any(validators.values()):
+                        self._validators[url] = validators
+                    else:
+                        self._validators.pop(url, None)
+                self._hashes.update(pending['hashes'])
+
+    def discard(self, sources: Iterable[NewsSource]) -> None:
+        """Забывает отложенные данные опроса: следующий опрос разберет ленты заново"""
+        with self._lock:
+            for source in sources:
+                self._pending.pop(source.name, None)
+
+    def record(self, source: NewsSource, outcome: str) -> None:
+        """Итог опроса: not_modified (304), unchanged (тот же хэш) или changed"""
+        with self._lock:
+            stats = self._stats.setdefault(source.name, {'not_modified': 0, 'unchanged': 0, 'changed': 0})
+            stats[outcome] += 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Попадания (304 или тот же хэш) и промахи по источникам"""
+        with self._lock:
+            return {name: {**counts, 'hits': counts['not_modified'] + counts['unchanged'],
+                           'misses': counts['changed']}
+                    for name, counts in self._stats.items()}
+
+
+def items_fingerprint(items: List[Dict[str, Any]]) -> bytes:
+    """Содержимое ленты для сравнения хэшей: адреса и заголовки статей"""
+    return '\n'.join(f"{item['url']} {item['title']}" for item in items).encode('utf-8')
+
+
+# Встроенные источники; дополнительные можно описать в JSON-файле NEWS_SOURCES_FILE
+source_registry = SourceRegistry([
+    NewsSource('smartlab', 'https://smartlab.news/', parser='parse_smartlab_listing', title='SmartLab', timeout=30),
+    NewsSource('rbc', 'https://www.rbc.ru/', parser='parse_rbc_listing', title='РБК',
+               feed_url='https://rssexport.rbc.ru/rbcnews/news/30/full.rss'),
+    NewsSource('vedomosti', 'https://www.vedomosti.ru/economics', parser='parse_vedomosti_listing',
+               title='Ведомости', feed_url='https://www.vedomosti.ru/rss/rubric/economics'),
+])
+
+if os.environ.get("NEWS_SOURCES_FILE"):
+    try:
+        loaded = source_registry.load_file(os.environ["NEWS_SOURCES_FILE"])
+        logger.warning(f"Loaded {loaded} news sources from {os.environ['NEWS_SOURCES_FILE']}")
+    except Exception as e:
+        logger.error(f"Error loading news sources: {e}")
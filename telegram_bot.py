@@ -6,10 +6,13 @@ load_dotenv()
 import os
 import logging
 import asyncio
+import httpx
 import requests
-from typing import Optional, Dict, List
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional, Dict, List, Tuple
 from app import db
-from models import PostingLog, BotSettings
+from models import PostingLog, BotSettings, MSK
+from http_client import AsyncPooledHTTPClient, http_client
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +24,83 @@ class TelegramBotService:
         if not self.token:
             logger.warning("TELEGRAM_BOT_TOKEN not found in environment variables")
 
+    def _finish_log(self, log_entry: Optional[PostingLog], status: str,
+                    message_id: Optional[int] = None, error_msg: Optional[str] = None) -> None:
+        """Завершает зарезервированную запись журнала публикаций"""
+        if not log_entry:
+            return
+        try:
+            log_entry.status = status
+            log_entry.message_id = str(message_id) if message_id else None
+            log_entry.error_message = error_msg
+            log_entry.posted_at = datetime.now(MSK)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Ошибка записи журнала публикаций: {e}")
+
+    def _prepare_send(self, channel_id: str, message: str,
+                      article_id: Optional[int] = None) -> Tuple[Optional[Dict], Optional[PostingLog], Dict]:
+        """
+        Резервирует публикацию и готовит данные запроса sendMessage.
+        Возвращает (результат с ошибкой или None, запись журнала, данные запроса)
+        """
+        # Ensure channel_id has proper format
+        if not channel_id.startswith('@') and not channel_id.startswith('-'):
+            channel_id = '@' + channel_id
+        
+        # Резервируем публикацию до отправки, чтобы статья не ушла в канал дважды
+        log_entry = None
+        if article_id:
+            log_entry = PostingLog.reserve(article_id, channel_id)
+            if not log_entry:
+                logger.warning(f"Article {article_id} is already posted to {channel_id}")
+                return {"success": False, "error": "Статья уже опубликована в этом канале", "duplicate": True}, None, {}
+        
+        # Проверяем длину сообщения и обрезаем при необходимости
+        if len(message) > 4000:
+            message = message[:3997] + "..."
+            logger.warning(f"Message truncated to {len(message)} characters")
+        
+        # Prepare request data
+        data = {
+            'chat_id': channel_id,
+            'text': message,
+            'parse_mode': 'HTML',
+            'disable_web_page_preview': False
+        }
+        return None, log_entry, data
+
+    def _complete_send(self, result: Dict, log_entry: Optional[PostingLog], channel_id: str) -> Dict:
+        """Разбирает ответ sendMessage и завершает запись журнала"""
+        if not result.get('ok'):
+            error_msg = result.get('description', 'Unknown error')
+            logger.error(f"Telegram API error: {error_msg}")
+            
+            # Log the failed attempt
+            self._finish_log(log_entry, 'failed', error_msg=error_msg)
+            
+            return {"success": False, "error": error_msg}
+        
+        message_data = result.get('result', {})
+        message_id = message_data.get('message_id')
+        
+        # Log the successful posting
+        self._finish_log(log_entry, 'success', message_id=message_id)
+        
+        logger.warning(f"Successfully sent message to {channel_id}")
+        return {
+            "success": True,
+            "message_id": message_id,
+            "chat_id": message_data.get('chat', {}).get('id')
+        }
+
+    def _fail_send(self, log_entry: Optional[PostingLog], error_msg: str) -> Dict:
+        """Фиксирует неудачную отправку"""
+        logger.error(error_msg)
+        self._finish_log(log_entry, 'failed', error_msg=error_msg)
+        return {"success": False, "error": error_msg}
+
     def send_message_to_channel(self, channel_id: str, message: str, article_id: Optional[int] = None) -> Dict:
         """
         Send message to Telegram channel using HTTP API
@@ -32,95 +112,59 @@ class TelegramBotService:
         if not channel_id:
             return {"success": False, "error": "Channel ID not provided"}
         
+        log_entry = None
         try:
-            # Ensure channel_id has proper format
-            if not channel_id.startswith('@') and not channel_id.startswith('-'):
-                channel_id = '@' + channel_id
-            
-            # Проверяем длину сообщения и обрезаем при необходимости
-            if len(message) > 4000:
-                message = message[:3997] + "..."
-                logger.warning(f"Message truncated to {len(message)} characters")
-            
-            # Prepare request data
-            data = {
-                'chat_id': channel_id,
-                'text': message,
-                'parse_mode': 'HTML',
-                'disable_web_page_preview': False
-            }
+            error, log_entry, data = self._prepare_send(channel_id, message, article_id)
+            if error:
+                return error
             
             # Send message via HTTP API
-            response = requests.post(f"{self.base_url}/sendMessage", json=data, timeout=30)
+            response = http_client.post(f"{self.base_url}/sendMessage", json=data, timeout=30)
             response.raise_for_status()
             
-            result = response.json()
-            if not result.get('ok'):
-                error_msg = result.get('description', 'Unknown error')
-                logger.error(f"Telegram API error: {error_msg}")
-                
-                # Log the failed attempt
-                if article_id:
-                    log_entry = PostingLog()
-                    log_entry.article_id = article_id
-                    log_entry.channel_id = channel_id
-                    log_entry.status = 'failed'
-                    log_entry.error_message = error_msg
-                    db.session.add(log_entry)
-                    db.session.commit()
-                
-                return {"success": False, "error": error_msg}
-            
-            message_data = result.get('result', {})
-            message_id = message_data.get('message_id')
-            
-            # Log the successful posting
-            if article_id:
-                log_entry = PostingLog()
-                log_entry.article_id = article_id
-                log_entry.channel_id = channel_id
-                log_entry.message_id = str(message_id) if message_id else None
-                log_entry.status = 'success'
-                db.session.add(log_entry)
-                db.session.commit()
-            
-            logger.warning(f"Successfully sent message to {channel_id}")
-            return {
-                "success": True,
-                "message_id": message_id,
-                "chat_id": message_data.get('chat', {}).get('id')
-            }
+            return self._complete_send(response.json(), log_entry, data['chat_id'])
             
         except requests.exceptions.RequestException as e:
-            error_msg = f"Network error: {str(e)}"
-            logger.error(error_msg)
-            
-            # Log the failed attempt
-            if article_id:
-                log_entry = PostingLog()
-                log_entry.article_id = article_id
-                log_entry.channel_id = channel_id
-                log_entry.status = 'failed'
-                log_entry.error_message = error_msg
-                db.session.add(log_entry)
-                db.session.commit()
-            
-            return {"success": False, "error": error_msg}
+            return self._fail_send(log_entry, f"Network error: {str(e)}")
         
         except Exception as e:
-            error_msg = f"Unexpected error: {str(e)}"
-            logger.error(error_msg)
+            return self._fail_send(log_entry, f"Unexpected error: {str(e)}")
+
+    async def send_message_async(self, client: AsyncPooledHTTPClient, channel_id: str, message: str,
+                                 article_id: Optional[int] = None,
+                                 run_db: Optional[Callable[..., Awaitable[Any]]] = None) -> Dict:
+        """
+        Асинхронная отправка сообщения через общий асинхронный HTTP-клиент.
+        run_db выполняет синхронную работу с базой (резерв и журнал публикаций)
+        вне цикла событий; без него она выполняется в текущем потоке
+        """
+        async def db_call(func, *args):
+            if run_db:
+                return await run_db(func, *args)
+            return func(*args)
+
+        if not self.base_url:
+            return {"success": False, "error": "Bot token not configured"}
+        
+        if not channel_id:
+            return {"success": False, "error": "Channel ID not provided"}
+        
+        log_entry = None
+        try:
+            error, log_entry, data = await db_call(self._prepare_send, channel_id, message, article_id)
+            if error:
+                return error
+            
+            response = await client.post(f"{self.base_url}/sendMessage", json=data, timeout=30)
+            response.raise_for_status()
             
-            if article_id:
-                log_entry = PostingLog()
-                log_entry.article_id = article_id
-                log_entry.channel_id = channel_id
-                log_entry.status = 'failed'
-                log_entry.error_message = error_msg
-                db.session.add(log_entry)
-                db.session.commit()
+            return await db_call(self._complete_send, response.json(), log_entry, data['chat_id'])
             
-            return {"success": False, "error": error_msg}
+        except httpx.HTTPError as e:
+            return await db_call(self._fail_send, log_entry, f"Network error: {str(e)}")
+        
+        except Exception as e:
+            return await db_call(self._fail_send, log_entry, f"Unexpected error: {str(e)}")
 
     def send_message_sync(self, channel_id: str, message: str, article_id: Optional[int] = None) -> Dict:
         """
@@ -155,7 +199,7 @@ class TelegramBotService:
                 'disable_web_page_preview': False
             }
             
-            response = requests.post(f"{self.base_url}/editMessageText", json=data, timeout=30)
+            response = http_client.post(f"{self.base_url}/editMessageText", json=data, timeout=30)
             
             # Check if response is valid JSON
             try:
@@ -192,7 +236,7 @@ class TelegramBotService:
                 channel_id = '@' + channel_id
             
             # Try to get chat info
-            response = requests.get(f"{self.base_url}/getChat", params={'chat_id': channel_id}, timeout=10)
+            response = http_client.get(f"{self.base_url}/getChat", params={'chat_id': channel_id}, timeout=10)
             response.raise_for_status()
             
             result = response.json()
@@ -1,2 +1,11 @@
 # -*- coding: utf-8 -*-
-# Пустой файл __init__.py для обозначения директории тестов как пакета Python
\ No newline at end of file
+# Пакет тестов. app.py настраивает базу при импорте, поэтому до любого теста
+# DATABASE_URL указывает на временный файл, а не на рабочую sqlite:///telegram_bot.db
+import atexit
+import os
+import shutil
+import tempfile
+
+_test_db_dir = tempfile.mkdtemp(prefix='news-bot-tests-')
+atexit.register(shutil.rmtree, _test_db_dir, ignore_errors=True)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_test_db_dir, 'test.db')
@@ -69,7 +69,7 @@ class TestAIService(unittest.TestCase):
         # Проверяем, что ответ сохранен в кэше
         self.assertEqual(self.ai_service._get_cached_response(prompt_hash), response)
     
-    @patch('ai_service.requests.post')
+    @patch('ai_service.http_client.post')
     def test_summarize_article_gemini(self, mock_post):
         """Тест генерации резюме через Gemini API"""
         # Настраиваем мок
@@ -135,5 +135,68 @@ class TestAIService(unittest.TestCase):
         self.assertIn("#тест", result[0])
         self.assertIn("#пользовательский", result[0])
 
+    @patch('ai_service.AIService._call_openrouter_api')
+    def test_summarize_with_hashtags(self, mock_api_call):
+        """Тест генерации резюме и хештегов одним запросом"""
+        self.ai_service.api_key = "test_key"
+        summary_text = "🇷🇺 #нефть Добыча нефти в России выросла на 5% по итогам месяца."
+        mock_api_call.return_value = {
+            "choices": [{"message": {"content": f"ХЕШТЕГИ: 🇷🇺#нефть #россия\nРЕЗЮМЕ:\n{summary_text}"}}]
+        }
+        article = dict(self.test_article, content='Добыча нефти в России выросла на 5% (combined)')
+
+        summary, hashtags = self.ai_service.summarize_with_hashtags(article, custom_tags="#тест")
+
+        self.assertEqual(summary, summary_text)
+        self.assertEqual(hashtags, ["🇷🇺#нефть #россия #тест"])
+        mock_api_call.assert_called_once()
+
+    @patch('ai_service.AIService._call_openrouter_api')
+    def test_summarize_with_hashtags_fallback(self, mock_api_call):
+        """Тест резервных хештегов, если в ответе нет строки хештегов"""
+        self.ai_service.api_key = "test_key"
+        mock_api_call.return_value = {
+            "choices": [{"message": {"content": "Ответ без разметки и хештегов"}}]
+        }
+        article = dict(self.test_article, content='Новость о рубле без хештегов (combined fallback)')
+
+        summary, hashtags = self.ai_service.summarize_with_hashtags(article)
+
+        self.assertEqual(hashtags, self.ai_service._fallback_hashtags(article))
+        mock_api_call.assert_called_once()
+
+    @patch('ai_service.AIService._call_openrouter_api')
+    def test_summarize_batch(self, mock_api_call):
+        """Тест пакетной генерации: недостающий блок отправляется повторно отдельным запросом"""
+        self.ai_service.api_key = "test_key"
+        first_summary = "🇷🇺 #нефть Добыча нефти в России выросла на 5% по итогам месяца."
+        second_summary = "🇺🇸 #ФРС ФРС сохранила ставку на уровне 4,5% годовых."
+        mock_api_call.side_effect = [
+            {"choices": [{"message": {"content":
+                f"=== СТАТЬЯ 1 ===\nХЕШТЕГИ: 🇷🇺#нефть #россия\nРЕЗЮМЕ:\n{first_summary}"}}]},
+            {"choices": [{"message": {"content":
+                f"ХЕШТЕГИ: 🇺🇸#ФРС #ставка\nРЕЗЮМЕ:\n{second_summary}"}}]},
+        ]
+        articles = [
+            dict(self.test_article, article_id=1, content='Добыча нефти в России выросла на 5% (batch)'),
+            dict(self.test_article, article_id=2, content='ФРС сохранила ставку (batch)'),
+        ]
+
+        results = self.ai_service.summarize_batch(articles)
+
+        self.assertEqual(results[1], (first_summary, ["🇷🇺#нефть #россия"]))
+        self.assertEqual(results[2], (second_summary, ["🇺🇸#ФРС #ставка"]))
+        self.assertEqual(mock_api_call.call_count, 2)
+        batch_prompt = mock_api_call.call_args_list[0][0][0]['messages'][0]['content']
+        self.assertIn("=== СТАТЬЯ 2 ===", batch_prompt)
+
+    def test_parse_batch_response(self):
+        """Тест разбиения пакетного ответа на блоки по номерам статей"""
+        text = "Вступление\n=== СТАТЬЯ 2 ===\nвторой\n**=== СТАТЬЯ 1 ===**\nпервый\n=== СТАТЬЯ 7 ===\nлишний"
+
+        blocks = self.ai_service._parse_batch_response(text, 2)
+
+        self.assertEqual(blocks, {1: "первый", 2: "второй"})
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
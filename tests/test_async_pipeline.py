@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import json
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from app import app
+from db import db
+from models import NewsArticle, PostingLog, STATUS_POSTED, STATUS_SUMMARIZED
+from scheduler import NewsScheduler
+from sources import NewsSource
+from http_client import AsyncPooledHTTPClient
+import async_pipeline
+from async_pipeline import AsyncPipelineEngine
+
+SUMMARY = "🇷🇺 #нефть Добыча нефти в России выросла на 5% по итогам месяца."
+CONTENTS = [
+    "Добыча нефти в России выросла на 5% по итогам месяца, сообщил Минэнерго.",
+    "Центробанк сохранил ключевую ставку на прежнем уровне и ужесточил сигнал.",
+    "Акции металлургов подорожали после публикации сильной квартальной отчетности.",
+]
+
+
+class TestAsyncPipelineEngine(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+        self.requests = []
+        self.scheduler = NewsScheduler()
+        self.scheduler.telegram_service.base_url = "https://api.telegram.org/botTEST"
+        self.engine = AsyncPipelineEngine(scheduler=self.scheduler)
+
+    def tearDown(self):
+        self.engine.close()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _handler(self, request):
+        self.requests.append(request)
+        if request.url.host == 'openrouter.ai':
+            content = f"ХЕШТЕГИ: 🇷🇺#нефть #россия\nРЕЗЮМЕ:\n{SUMMARY}"
+            return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+        if request.url.host == 'api.telegram.org':
+            return httpx.Response(200, json={"ok": True, "result": {"message_id": 42, "chat": {"id": -1}}})
+        if request.url.path == '/':
+            links = ''.join(f'<div class="item"><a href="/async/{i}">Асинхронная новость {i}</a></div>'
+                            for i in range(3))
+            return httpx.Response(200, text=f"<html><body>{links}</body></html>")
+        return httpx.Response(200, text=f"<html>{request.url.path}</html>")
+
+    def _client(self, *args, **kwargs):
+        return AsyncPooledHTTPClient(backoff_factor=0, transport=httpx.MockTransport(self._handler))
+
+    def _extract(self, html, url):
+        content = CONTENTS[int(url.rsplit('/', 1)[-1])]
+        return {'url': url, 'title': 'Загруженная новость', 'content': content,
+                'quotes': [], 'tags': [], 'published_at': None}
+
+    @patch.dict(os.environ, {'OPENROUTER_API_KEY': 'test_key'})
+    def test_scrape_and_post(self):
+        """Тест полного прохода конвейера и ручной публикации через асинхронный движок"""
+        with patch.object(async_pipeline, 'AsyncPooledHTTPClient', self._client), \
+                patch.object(self.scheduler.extraction_pool, 'extract', self._extract), \
+                patch.object(self.scheduler.scraper, 'listing_sources',
+                             return_value=[NewsSource('test', 'https://news.test/', item_selector='div.item')]):
+            self.engine.manual_scrape()
+
+            with app.app_context():
+                articles = NewsArticle.query.filter(NewsArticle.url.like('https://news.test/async/%')).all()
+                self.assertEqual(len(articles), 3)
+                for article in articles:
+                    self.assertEqual(article.status, STATUS_SUMMARIZED)
+                    self.assertTrue(article.summary.startswith(SUMMARY[:20]))
+                    self.assertEqual(article.title, 'Загруженная новость')
+                article_id = articles[0].id
+
+            result = self.engine.manual_post(article_id, '@channel')
+
+        self.assertTrue(result['success'])
+        self.assertEqual(self.scheduler.last_scrape_stats['fetch_attempted'], 3)
+        telegram_calls = [r for r in self.requests if r.url.host == 'api.telegram.org']
+        self.assertEqual(len(telegram_calls), 1)
+        self.assertEqual(json.loads(telegram_calls[0].content)['chat_id'], '@channel')
+        with app.app_context():
+            self.assertEqual(db.session.get(NewsArticle, article_id).status, STATUS_POSTED)
+            self.assertEqual(PostingLog.query.filter_by(article_id=article_id, status='success').count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
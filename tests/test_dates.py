@@ -0,0 +1,80 @@
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+import trafilatura
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dates import MSK, parse_date, date_from_url, extract_html_date
+
+NOW = datetime(2025, 3, 12, 15, 30, tzinfo=MSK)
+
+
+class TestParseDate(unittest.TestCase):
+    def test_numeric(self):
+        """Тест форматов dd.mm.yyyy и dd.mm, в том числе со временем"""
+        self.assertEqual(parse_date('12.03.2025', NOW), datetime(2025, 3, 12, tzinfo=MSK))
+        self.assertEqual(parse_date('Опубликовано 11.03.2025 18:40', NOW), datetime(2025, 3, 11, 18, 40, tzinfo=MSK))
+        self.assertEqual(parse_date('10.03', NOW), datetime(2025, 3, 10, tzinfo=MSK))
+        # Дата без года из будущего относится к прошлому году
+        self.assertEqual(parse_date('31.12', NOW), datetime(2024, 12, 31, tzinfo=MSK))
+        self.assertIsNone(parse_date('31.02.2025', NOW))
+
+    def test_month_names(self):
+        """Тест дат с названиями месяцев"""
+        self.assertEqual(parse_date('12 марта 2025, 10:15', NOW), datetime(2025, 3, 12, 10, 15, tzinfo=MSK))
+        self.assertEqual(parse_date('3 мая 2024 г. в 09:00', NOW), datetime(2024, 5, 3, 9, 0, tzinfo=MSK))
+        self.assertEqual(parse_date('1 Янв', NOW), datetime(2025, 1, 1, tzinfo=MSK))
+
+    def test_relative(self):
+        """Тест относительных дат"""
+        self.assertEqual(parse_date('5 минут назад', NOW), NOW - timedelta(minutes=5))
+        self.assertEqual(parse_date('час назад', NOW), NOW - timedelta(hours=1))
+        self.assertEqual(parse_date('2 дня назад', NOW), NOW - timedelta(days=2))
+        self.assertEqual(parse_date('1 день назад', NOW), NOW - timedelta(days=1))
+        self.assertEqual(parse_date('3 мин. назад', NOW), NOW - timedelta(minutes=3))
+        self.assertEqual(parse_date('две недели назад', NOW), NOW - timedelta(weeks=2))
+        self.assertEqual(parse_date('полчаса назад', NOW), NOW - timedelta(minutes=30))
+        self.assertEqual(parse_date('только что', NOW), NOW)
+        self.assertEqual(parse_date('вчера в 18:40', NOW), datetime(2025, 3, 11, 18, 40, tzinfo=MSK))
+        self.assertEqual(parse_date('Сегодня', NOW), datetime(2025, 3, 12, tzinfo=MSK))
+        self.assertEqual(parse_date('09:05', NOW), datetime(2025, 3, 12, 9, 5, tzinfo=MSK))
+
+    def test_iso_and_rfc822(self):
+        """Тест ISO 8601 и RFC 822: результат в московском времени"""
+        self.assertEqual(parse_date('2025-03-12T07:00:00Z', NOW), datetime(2025, 3, 12, 10, 0, tzinfo=MSK))
+        self.assertEqual(parse_date('2025-03-12', NOW), datetime(2025, 3, 12, tzinfo=MSK))
+        result = parse_date('Wed, 12 Mar 2025 10:00:00 +0000', NOW)
+        self.assertEqual(result, datetime(2025, 3, 12, 13, 0, tzinfo=MSK))
+        self.assertEqual(result.tzinfo, MSK)
+
+    def test_no_date(self):
+        """Тест: текст без даты"""
+        for text in (None, '', 'Главное за день', 'месяц назад', 'частично назад', 'минимум назад'):
+            self.assertIsNone(parse_date(text, NOW), text)
+
+    def test_date_from_url(self):
+        """Тест даты из URL"""
+        self.assertEqual(date_from_url('https://www.rbc.ru/economics/2025/03/12/abc'),
+                         datetime(2025, 3, 12, tzinfo=MSK))
+        self.assertIsNone(date_from_url('https://www.rbc.ru/economics/abc'))
+
+
+class TestExtractHtmlDate(unittest.TestCase):
+    def test_priority(self):
+        """Тест: meta-тег важнее <time datetime>, а тот важнее текста элемента с датой"""
+        page = ('<html><head><meta property="article:published_time" content="2025-03-12T09:00:00+03:00">'
+                '</head><body><time datetime="2025-03-11T10:00:00+03:00">вчера</time>'
+                '<span class="date">10.03.2025</span></body></html>')
+        self.assertEqual(extract_html_date(trafilatura.load_html(page)), datetime(2025, 3, 12, 9, 0, tzinfo=MSK))
+        page = page.replace('article:published_time', 'og:title')
+        self.assertEqual(extract_html_date(trafilatura.load_html(page)), datetime(2025, 3, 11, 10, 0, tzinfo=MSK))
+        page = page.replace('datetime=', 'data-x=')
+        self.assertEqual(extract_html_date(trafilatura.load_html(page)), datetime(2025, 3, 10, tzinfo=MSK))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+from datetime import timedelta
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from db import db
+from models import NewsArticle, STATUS_FETCHED, STATUS_SUMMARIZED, STATUS_DUPLICATE
+from dedup import (MinHashLSHIndex, estimate_similarity, minhash_signature, pack_signature,
+                   unpack_signature, DEDUP_WINDOW_HOURS)
+from dates import now_msk
+from scheduler import NewsScheduler
+
+SBER_TITLE = "Сбербанк увеличил чистую прибыль в третьем квартале на 15%"
+SBER = ("Сбербанк по итогам третьего квартала увеличил чистую прибыль по МСФО на 15% до 410 млрд рублей, "
+        "сообщила пресс-служба банка. Рентабельность капитала составила 24%. Глава банка Герман Греф заявил, "
+        "что банк ожидает рекордной прибыли по итогам года. Кредитный портфель вырос на 4%.")
+SBER_COPY_TITLE = "Чистая прибыль Сбербанка в третьем квартале выросла на 15%"
+SBER_COPY = ("Чистая прибыль Сбербанка по МСФО по итогам третьего квартала увеличилась на 15% до 410 млрд "
+             "рублей, сообщила пресс-служба банка. Рентабельность капитала составила 24%. Герман Греф заявил, "
+             "что банк ожидает рекордной прибыли по итогам года. Кредитный портфель вырос на 4%.")
+SBER_OTHER_TITLE = "Сбербанк снизил прибыль в октябре на 3%"
+SBER_OTHER = ("Сбербанк в октябре снизил чистую прибыль по РПБУ на 3% до 120 млрд рублей. "
+              "Банк объяснил снижение ростом резервов. Кредитный портфель вырос на 1%.")
+
+
+class TestMinHash(unittest.TestCase):
+    def test_similarity(self):
+        """Тест: пересказ той же новости похож, другая новость о той же компании - нет"""
+        original = minhash_signature(SBER_TITLE, SBER)
+        self.assertGreater(estimate_similarity(original, minhash_signature(SBER_COPY_TITLE, SBER_COPY)), 0.7)
+        self.assertLess(estimate_similarity(original, minhash_signature(SBER_OTHER_TITLE, SBER_OTHER)), 0.4)
+        self.assertIsNone(minhash_signature('', ''))
+
+    def test_pack_roundtrip(self):
+        """Тест упаковки подписи в строку для базы данных"""
+        signature = minhash_signature(SBER_TITLE, SBER)
+        self.assertEqual(unpack_signature(pack_signature(signature)), signature)
+        self.assertIsNone(unpack_signature('abc'))
+
+    def test_index_find(self):
+        """Тест поиска похожей статьи в LSH-индексе"""
+        index = MinHashLSHIndex(threshold=0.5)
+        index.add(1, minhash_signature(SBER_TITLE, SBER))
+        index.add(2, minhash_signature(SBER_OTHER_TITLE, SBER_OTHER))
+
+        match = index.find(minhash_signature(SBER_COPY_TITLE, SBER_COPY))
+        self.assertEqual(match[0], 1)
+        self.assertIsNone(index.find(minhash_signature(SBER_COPY_TITLE, SBER_COPY), accept=lambda key: key != 1))
+
+        index.remove(1)
+        self.assertIsNone(index.find(minhash_signature(SBER_COPY_TITLE, SBER_COPY)))
+        self.assertEqual(index.keys(), {2})
+
+
+class TestNearDuplicateSkip(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+            scheduler = NewsScheduler()
+            for i, (title, content, status) in enumerate([
+                (SBER_TITLE, SBER, STATUS_SUMMARIZED),
+                (SBER_COPY_TITLE, SBER_COPY, STATUS_FETCHED),
+                (SBER_OTHER_TITLE, SBER_OTHER, STATUS_FETCHED),
+            ]):
+                article = NewsArticle(url=f'https://source{i}.test/dedup/{i}', title=title, original_content=content,
+                                      created_at=now_msk(), status=status)
+                if status == STATUS_SUMMARIZED:
+                    article.summary = 'Готовое резюме'
+                    article.hashtags = '#сбербанк'
+                    article.minhash = scheduler._minhash_for(article)
+                db.session.add(article)
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_duplicate_reuses_summary(self):
+        """Тест: дубликат связывается с кластером и получает готовое резюме без вызова LLM"""
+        with app.app_context():
+            scheduler = NewsScheduler()
+            claimed = scheduler.queue.claim(STATUS_FETCHED, limit=10)
+
+            remaining = scheduler._skip_near_duplicates(claimed)
+
+            self.assertEqual([a.url for a in remaining], ['https://source2.test/dedup/2'])
+            original = NewsArticle.query.filter_by(url='https://source0.test/dedup/0').first()
+            duplicate = NewsArticle.query.filter_by(url='https://source1.test/dedup/1').first()
+            self.assertEqual(duplicate.status, STATUS_DUPLICATE)
+            self.assertEqual(duplicate.cluster_id, original.id)
+            self.assertEqual(duplicate.summary, 'Готовое резюме')
+            self.assertIsNone(duplicate.locked_by)
+
+    def test_root_without_summary(self):
+        """Тест: пока у первой статьи кластера нет резюме, похожая статья не закрывается как дубликат"""
+        with app.app_context():
+            original = NewsArticle.query.filter_by(url='https://source0.test/dedup/0').first()
+            original.status, original.summary = STATUS_FETCHED, None
+            db.session.commit()
+            scheduler = NewsScheduler()
+            claimed = scheduler.queue.claim(STATUS_FETCHED, limit=10)
+
+            remaining = scheduler._skip_near_duplicates(claimed)
+
+            self.assertEqual(len(remaining), 3)
+            copy = NewsArticle.query.filter_by(url='https://source1.test/dedup/1').first()
+            self.assertEqual(copy.status, STATUS_FETCHED)
+            self.assertEqual(copy.cluster_id, original.id)
+
+    def test_window_in_msk(self):
+        """Тест: окно сравнения отсчитывается в московском времени, как хранится created_at"""
+        with app.app_context():
+            original = NewsArticle.query.filter_by(url='https://source0.test/dedup/0').first()
+            # Чуть старше окна по Москве, но внутри окна, если считать от UTC
+            original.created_at = now_msk() - timedelta(hours=DEDUP_WINDOW_HOURS + 1)
+            db.session.commit()
+            scheduler = NewsScheduler()
+            claimed = scheduler.queue.claim(STATUS_FETCHED, limit=10)
+
+            remaining = scheduler._skip_near_duplicates(claimed)
+
+            self.assertEqual(len(remaining), 2)
+            self.assertNotIn(original.id, scheduler.dedup_index.keys())
+
+    def test_same_source_not_duplicate(self):
+        """Тест: похожая статья того же источника не считается дубликатом"""
+        with app.app_context():
+            copy = NewsArticle.query.filter_by(url='https://source1.test/dedup/1').first()
+            copy.url = 'https://source0.test/dedup/1'
+            db.session.commit()
+            scheduler = NewsScheduler()
+            claimed = scheduler.queue.claim(STATUS_FETCHED, limit=10)
+
+            remaining = scheduler._skip_near_duplicates(claimed)
+
+            self.assertEqual(len(remaining), 2)
+
+    def test_index_kept_between_batches(self):
+        """Тест: индекс не строится заново - догружаются новые статьи, вышедшие из окна удаляются"""
+        with app.app_context():
+            scheduler = NewsScheduler()
+            scheduler._skip_near_duplicates(scheduler.queue.claim(STATUS_FETCHED, limit=10))
+            original = NewsArticle.query.filter_by(url='https://source0.test/dedup/0').first()
+            self.assertEqual(len(scheduler.dedup_index), 3)
+
+            original.created_at = now_msk() - timedelta(days=30)
+            article = NewsArticle(url='https://source3.test/dedup/3', title=SBER_COPY_TITLE,
+                                  original_content=SBER_COPY, created_at=now_msk(), status=STATUS_FETCHED)
+            db.session.add(article)
+            db.session.commit()
+            with patch('scheduler.unpack_signature', side_effect=unpack_signature) as unpack:
+                remaining = scheduler._skip_near_duplicates(scheduler.queue.claim(STATUS_FETCHED, limit=10))
+
+            # Подпись распакована только для новой статьи, старая статья кластера вышла из окна
+            self.assertEqual(unpack.call_count, 1)
+            self.assertNotIn(original.id, scheduler.dedup_index.keys())
+            # Дубликат из source1 остался в индексе и связывает новую статью с кластером
+            self.assertEqual(remaining, [])
+            self.assertEqual(article.cluster_id, original.id)
+
+
+if __name__ == '__main__':
+    unittest.main()
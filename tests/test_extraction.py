@@ -0,0 +1,38 @@
+import unittest
+import sys
+import os
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction import ExtractionPool
+from tests.test_scraper import TEST_PAGE
+
+
+class TestExtractionPool(unittest.TestCase):
+    def test_extract_in_process_pool(self):
+        """Тест извлечения статьи в пуле процессов и перезапуска пула по таймауту"""
+        pool = ExtractionPool(workers=1, timeout=0.001)
+        try:
+            # Процесс не успевает даже запуститься - задача прерывается, пул перезапускается
+            self.assertIsNone(pool.extract(TEST_PAGE, 'https://smartlab.news/read/1'))
+            self.assertEqual(pool.stats()['timeouts'], 1)
+            self.assertFalse(pool.stats()['running'])
+
+            pool.timeout = 60
+            result = pool.extract(TEST_PAGE, 'https://smartlab.news/read/1')
+            self.assertEqual(result['title'], 'Газпром увеличил выручку на 15%')
+            self.assertEqual(pool.stats()['extracted'], 1)
+        finally:
+            pool.shutdown()
+
+    def test_inline_mode(self):
+        """Тест: при workers=0 статья извлекается без процессов"""
+        pool = ExtractionPool(workers=0)
+        self.assertEqual(pool.extract(TEST_PAGE, 'https://smartlab.news/read/1')['url'],
+                         'https://smartlab.news/read/1')
+        self.assertFalse(pool.stats()['running'])
+
+
+if __name__ == '__main__':
+    unittest.main()
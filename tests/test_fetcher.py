@@ -0,0 +1,56 @@
+import unittest
+import sys
+import os
+import time
+from threading import Lock
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fetcher import ConcurrentFetcher
+
+class TestConcurrentFetcher(unittest.TestCase):
+    def setUp(self):
+        self.lock = Lock()
+        self.active = {}
+        self.max_active = {}
+
+    def _fake_fetch(self, url):
+        host = url.split('/')[2]
+        with self.lock:
+            self.active[host] = self.active.get(host, 0) + 1
+            self.max_active[host] = max(self.max_active.get(host, 0), self.active[host])
+        time.sleep(0.02)
+        with self.lock:
+            self.active[host] -= 1
+        if url.endswith('/fail'):
+            raise RuntimeError("boom")
+        return {'url': url, 'title': url}
+
+    def test_fetch_all_respects_per_host_limit(self):
+        """Тест ограничения числа одновременных запросов к одному домену"""
+        urls = [f"https://a.ru/{i}" for i in range(10)] + [f"https://b.ru/{i}" for i in range(10)]
+        fetcher = ConcurrentFetcher(self._fake_fetch, max_workers=8, per_host_limit=2)
+        results = fetcher.fetch_all(urls)
+
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(results[url]['url'] == url for url in urls))
+        self.assertLessEqual(self.max_active['a.ru'], 2)
+        self.assertLessEqual(self.max_active['b.ru'], 2)
+
+    def test_fetch_all_handles_errors(self):
+        """Тест обработки ошибок загрузки отдельных статей"""
+        fetcher = ConcurrentFetcher(self._fake_fetch, max_workers=4, per_host_limit=4)
+        results = fetcher.fetch_all(["https://a.ru/ok", "https://a.ru/fail"])
+
+        self.assertIsNotNone(results["https://a.ru/ok"])
+        self.assertIsNone(results["https://a.ru/fail"])
+
+    def test_interleave_by_host(self):
+        """Тест чередования URL разных доменов"""
+        urls = ["https://a.ru/1", "https://a.ru/2", "https://b.ru/1"]
+        result = ConcurrentFetcher._interleave_by_host(urls)
+        self.assertEqual(result, ["https://a.ru/1", "https://b.ru/1", "https://a.ru/2"])
+
+if __name__ == '__main__':
+    unittest.main()
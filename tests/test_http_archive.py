@@ -0,0 +1,65 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraper import SmartLabScraper
+from scrape_cache import ScrapeCache
+
+PAGE = "<html><body><p>Новость</p></body></html>".encode('utf-8')
+
+
+class _PageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHTTPArchive(unittest.TestCase):
+    def test_record_and_replay(self):
+        """Тест: записанные ответы воспроизводятся с заголовками, в том числе потоково"""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _PageHandler)
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = f"http://127.0.0.1:{server.server_port}/news/1"
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'archive.db')
+            try:
+                recorder = SmartLabScraper(cache=ScrapeCache(path=None), archive=f"record:{path}")
+                self.assertEqual(recorder.session.get(url, timeout=5).content, PAGE)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+            # Сервер остановлен - ответ берется из архива
+            player = SmartLabScraper(cache=ScrapeCache(path=None), archive=f"replay:{path}")
+            response = player.session.get(url, timeout=5)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, PAGE)
+            self.assertEqual(response.headers['ETag'], '"v1"')
+            self.assertEqual(response.text, PAGE.decode('utf-8'))
+            with player.session.get(url, timeout=5, stream=True) as streamed:
+                self.assertEqual(b''.join(streamed.iter_content(8)), PAGE)
+
+            missing = player.session.get(url + '/missing', timeout=5)
+            self.assertEqual(missing.status_code, 404)
+            self.assertEqual(player.archive_adapter.misses, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+import sys
+import os
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from http_client import AsyncPooledHTTPClient, PooledHTTPClient
+
+
+class _FlakyHandler(BaseHTTPRequestHandler):
+    """Отвечает 503 на первый запрос к /flaky, остальные запросы - 200"""
+    protocol_version = 'HTTP/1.1'
+    flaky_calls = 0
+
+    def _reply(self, status):
+        body = b'ok'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/flaky':
+            _FlakyHandler.flaky_calls += 1
+            self._reply(503 if _FlakyHandler.flaky_calls == 1 else 200)
+        else:
+            self._reply(200)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._reply(503)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestPooledHTTPClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), _FlakyHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _FlakyHandler.flaky_calls = 0
+        self.client = PooledHTTPClient(pool_size=2, host_pool_sizes={}, backoff_factor=0)
+
+    def test_timeout(self):
+        """Тест разделения таймаута на таймауты соединения и чтения"""
+        self.assertEqual(self.client._timeout(None), (self.client.connect_timeout, self.client.read_timeout))
+        self.assertEqual(self.client._timeout(10), (self.client.connect_timeout, 10))
+        self.assertEqual(self.client._timeout((1, 2)), (1, 2))
+
+    def test_host_adapter(self):
+        """Тест отдельного пула для настроенного хоста"""
+        client = PooledHTTPClient(host_pool_sizes={'api.telegram.org': 7})
+        adapter = client.session.get_adapter('https://api.telegram.org/bot123/getChat')
+        self.assertIs(adapter, client._adapters['api.telegram.org'])
+        self.assertIs(client.session.get_adapter('https://example.com/'), client._adapters['*'])
+
+    def test_keep_alive_and_stats(self):
+        """Тест повторного использования соединения и статистики пулов"""
+        for _ in range(3):
+            self.assertEqual(self.client.get(f"{self.base_url}/").status_code, 200)
+
+        stats = self.client.stats()
+        pool = stats['pools']['http://127.0.0.1']
+        self.assertEqual(pool['opened_connections'], 1)
+        self.assertEqual(pool['requests'], 3)
+        self.assertEqual(stats['hosts'][f"127.0.0.1:{self.server.server_port}"]['requests'], 3)
+
+    def test_retry_idempotent_only(self):
+        """Тест повтора GET при 503 и отсутствия повтора для POST"""
+        self.assertEqual(self.client.get(f"{self.base_url}/flaky").status_code, 200)
+        self.assertEqual(_FlakyHandler.flaky_calls, 2)
+
+        self.assertEqual(self.client.post(f"{self.base_url}/", json={}).status_code, 503)
+        host_stats = self.client.stats()['hosts'][f"127.0.0.1:{self.server.server_port}"]
+        self.assertEqual(host_stats['errors'], 1)
+
+
+class TestAsyncPooledHTTPClient(unittest.IsolatedAsyncioTestCase):
+    async def test_per_host_limit(self):
+        """Тест ограничения одновременных запросов к одному хосту"""
+        in_flight = {'a.test': 0, 'b.test': 0}
+        peak = {'a.test': 0, 'b.test': 0}
+
+        async def handler(request):
+            host = request.url.host
+            in_flight[host] += 1
+            peak[host] = max(peak[host], in_flight[host])
+            await asyncio.sleep(0.01)
+            in_flight[host] -= 1
+            return httpx.Response(200, text='ok')
+
+        async with AsyncPooledHTTPClient(per_host_limit=2, host_pool_sizes={'b.test': 5},
+                                         transport=httpx.MockTransport(handler)) as client:
+            await asyncio.gather(*(client.get(f"https://{host}/{i}")
+                                   for host in ('a.test', 'b.test') for i in range(10)))
+            stats = client.stats()
+
+        self.assertEqual(peak['a.test'], 2)
+        self.assertEqual(peak['b.test'], 5)
+        self.assertEqual(stats['hosts']['a.test']['requests'], 10)
+        self.assertEqual(stats['in_flight'], 0)
+
+    async def test_retry_idempotent_only(self):
+        """Тест повтора GET при 503 и отсутствия повтора для POST"""
+        calls = []
+
+        def handler(request):
+            calls.append(request.method)
+            return httpx.Response(503 if len(calls) == 1 else 200)
+
+        async with AsyncPooledHTTPClient(backoff_factor=0, transport=httpx.MockTransport(handler)) as client:
+            self.assertEqual((await client.get("https://a.test/")).status_code, 200)
+            calls.clear()
+            self.assertEqual((await client.post("https://a.test/", json={})).status_code, 503)
+
+        self.assertEqual(calls, ['POST'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from db import db
+from key_pool import KeyPool, retry_after, key_id, STATE_CLOSED, STATE_OPEN
+from ai_service import AIService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestKeyPool(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_retry_after(self):
+        """Тест разбора момента сброса лимита из ответа 429"""
+        now = 1_700_000_000.0
+        self.assertEqual(retry_after({'Retry-After': '30'}, now=now), now + 30)
+        self.assertEqual(retry_after({'X-RateLimit-Reset': str(int((now + 90) * 1000))}, now=now), now + 90)
+        self.assertEqual(retry_after({}, '{"error": {"details": [{"retryDelay": "37s"}]}}', now=now), now + 37)
+        self.assertIsNone(retry_after({}, 'Too Many Requests', now=now))
+
+    def test_rate_limited_key_is_skipped(self):
+        """Тест: ключ после 429 не используется до сброса лимита"""
+        clock = FakeClock()
+        pool = KeyPool(default_cooldown=60, clock=clock)
+        pool.rate_limited('openrouter', 'key-a', {'Retry-After': '120'})
+        self.assertFalse(pool.available('openrouter', 'key-a'))
+        self.assertTrue(pool.available('openrouter', 'key-b'))
+        clock.now += 121
+        self.assertTrue(pool.available('openrouter', 'key-a'))
+
+    def test_exhausted_quota(self):
+        """Тест: ключ с нулевым остатком квоты ждет X-RateLimit-Reset"""
+        clock = FakeClock()
+        pool = KeyPool(clock=clock)
+        pool.success('openrouter', 'key-a', {'X-RateLimit-Remaining': '0',
+                                             'X-RateLimit-Reset': str(int((clock.now + 30) * 1000))})
+        self.assertFalse(pool.available('openrouter', 'key-a'))
+        clock.now += 31
+        self.assertTrue(pool.available('openrouter', 'key-a'))
+
+    def test_circuit_breaker(self):
+        """Тест автомата: открывается после ошибок подряд, затем один пробный запрос"""
+        clock = FakeClock()
+        pool = KeyPool(failure_threshold=2, open_seconds=100, clock=clock)
+        pool.failure('gemini', 'key-a')
+        self.assertTrue(pool.available('gemini', 'key-a'))
+        pool.failure('gemini', 'key-a')
+        self.assertFalse(pool.available('gemini', 'key-a'))
+
+        clock.now += 101
+        self.assertTrue(pool.available('gemini', 'key-a'))
+        # Неудачный пробный запрос снова открывает автомат
+        pool.failure('gemini', 'key-a')
+        self.assertFalse(pool.available('gemini', 'key-a'))
+        clock.now += 101
+        self.assertTrue(pool.available('gemini', 'key-a'))
+        pool.success('gemini', 'key-a')
+        self.assertEqual(pool.stats()['keys'][f"gemini:{key_id('key-a')}"]['state'], STATE_CLOSED)
+
+    def test_half_open_single_trial(self):
+        """Тест: полуоткрытый автомат пропускает один пробный запрос до его результата"""
+        clock = FakeClock()
+        pool = KeyPool(failure_threshold=1, open_seconds=100, clock=clock)
+        pool.failure('gemini', 'key-a')
+        clock.now += 101
+        self.assertTrue(pool.available('gemini', 'key-a'))
+        self.assertFalse(pool.available('gemini', 'key-a'))
+        self.assertFalse(pool.available('gemini', 'key-a'))
+        pool.success('gemini', 'key-a')
+        self.assertTrue(pool.available('gemini', 'key-a'))
+        self.assertTrue(pool.available('gemini', 'key-a'))
+
+        # Результат пробного запроса потерян: следующий пропускается через open_seconds
+        pool.failure('gemini', 'key-a')
+        clock.now += 101
+        self.assertTrue(pool.available('gemini', 'key-a'))
+        clock.now += 50
+        self.assertFalse(pool.available('gemini', 'key-a'))
+        clock.now += 51
+        self.assertTrue(pool.available('gemini', 'key-a'))
+
+    def test_shared_between_processes(self):
+        """Тест: пауза ключа, записанная одним пулом, видна другому через БД"""
+        clock = FakeClock()
+        with app.app_context():
+            first = KeyPool(failure_threshold=1, clock=clock)
+            second = KeyPool(clock=clock)
+            self.assertTrue(second.available('openrouter', 'key-a'))
+            first.rate_limited('openrouter', 'key-a', {'Retry-After': '60'})
+            first.failure('gemini', 'key-g')
+
+            second.sync(force=True)
+            self.assertFalse(second.available('openrouter', 'key-a'))
+            self.assertFalse(second.available('gemini', 'key-g'))
+            self.assertEqual(second.stats()['keys'][f"gemini:{key_id('key-g')}"]['state'], STATE_OPEN)
+
+    @patch('ai_service.key_pool', new_callable=lambda: KeyPool(clock=FakeClock()))
+    @patch('ai_service.http_client.post')
+    def test_ai_service_skips_limited_key(self, mock_post, pool):
+        """Тест: после 429 AIService больше не отправляет запросы с этим ключом"""
+        service = AIService(ai_provider="openrouter")
+        service.api_key, service.backup_key, service.backup_key2 = 'key-a', 'key-b', None
+        service.gemini_api_key = None
+        limited = MagicMock(status_code=429, headers={'Retry-After': '600'}, text='rate limited')
+        limited.raise_for_status.side_effect = Exception("429")
+        ok = MagicMock(status_code=200, headers={}, text='')
+        ok.json.return_value = {"choices": [{"message": {"content": "Ответ"}}]}
+        mock_post.side_effect = [limited, ok, ok]
+
+        self.assertEqual(service._generate_text("prompt"), "Ответ")
+        self.assertEqual(service._generate_text("prompt"), "Ответ")
+
+        used_keys = [call.kwargs['headers']['Authorization'] for call in mock_post.call_args_list]
+        self.assertEqual(used_keys, ['Bearer key-a', 'Bearer key-b', 'Bearer key-b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
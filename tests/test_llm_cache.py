@@ -0,0 +1,65 @@
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from db import db
+from models import LLMCacheEntry
+from llm_cache import LLMResponseCache, make_cache_key
+
+class TestLLMResponseCache(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_cache_key_normalization(self):
+        """Тест: пробелы и регистр не влияют на ключ, параметры генерации влияют"""
+        article = {'title': 'Новость', 'content': 'Рубль  укрепился\nк доллару'}
+        same = {'title': 'новость ', 'content': 'Рубль укрепился к доллару'}
+        key = make_cache_key('summary', article, 'openrouter', 'model', 'formal', 0.7)
+
+        self.assertEqual(key, make_cache_key('summary', same, 'openrouter', 'model', 'formal', 0.7))
+        self.assertNotEqual(key, make_cache_key('summary', article, 'gemini', 'model', 'formal', 0.7))
+        self.assertNotEqual(key, make_cache_key('summary', article, 'openrouter', 'model', 'engaging', 0.7))
+        self.assertNotEqual(key, make_cache_key('hashtags', article, 'openrouter', 'model', 'formal', 0.7))
+
+    def test_shared_between_instances(self):
+        """Тест: запись одного экземпляра видна другому через БД"""
+        with app.app_context():
+            LLMResponseCache().set('key1', 'ответ', kind='summary', provider='openrouter', model='m')
+            self.assertEqual(LLMResponseCache().get('key1'), 'ответ')
+
+    def test_ttl_expiry(self):
+        """Тест: просроченные записи не возвращаются"""
+        with app.app_context():
+            cache = LLMResponseCache(ttl_seconds=60)
+            cache.set('key1', 'ответ')
+            db.session.get(LLMCacheEntry, 'key1').expires_at = datetime.utcnow() - timedelta(seconds=1)
+            db.session.commit()
+            self.assertIsNone(LLMResponseCache().get('key1'))
+
+    def test_lru_eviction(self):
+        """Тест: при превышении лимита удаляются давно не использованные записи"""
+        with app.app_context():
+            cache = LLMResponseCache(max_entries=2)
+            cache.set('old', 'a')
+            db.session.get(LLMCacheEntry, 'old').last_used_at = datetime.utcnow() - timedelta(hours=1)
+            db.session.commit()
+            cache.set('new1', 'b')
+            cache.set('new2', 'c')
+
+            self.assertEqual(LLMCacheEntry.query.count(), 2)
+            self.assertIsNone(db.session.get(LLMCacheEntry, 'old'))
+
+if __name__ == '__main__':
+    unittest.main()
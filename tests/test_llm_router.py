@@ -0,0 +1,103 @@
+import unittest
+import sys
+import os
+import time
+import asyncio
+from threading import Event
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_router import Attempt, ProviderRouter, endpoint_name
+
+
+class TestProviderRouter(unittest.TestCase):
+    def test_rank_by_latency(self):
+        """Тест: эндпоинты упорядочены по медиане задержки"""
+        router = ProviderRouter(hedge=False)
+        slow = Attempt('openrouter:m:slow', 'openrouter', lambda: 'slow')
+        fast = Attempt('gemini:m:fast', 'gemini', lambda: 'fast')
+        for _ in range(3):
+            router.record(slow.endpoint, 8.0, True)
+            router.record(fast.endpoint, 2.0, True)
+        router.record(fast.endpoint, 30.0, False)
+        self.assertEqual(router.rank([slow, fast], preferred='openrouter'), [fast, slow])
+        self.assertEqual(router.stats()['endpoints'][fast.endpoint]['errors'], 1)
+
+    def test_seed_and_preferred_provider(self):
+        """Тест: без замеров задержка берется из аналитики, при равенстве - выбранный провайдер"""
+        router = ProviderRouter(hedge=False)
+        first = Attempt('openrouter:m:a', 'openrouter', lambda: 'a')
+        second = Attempt('gemini:m:b', 'gemini', lambda: 'b')
+        self.assertEqual(router.rank([first, second], preferred='gemini'), [second, first])
+        router.seed({'openrouter': [2.0, 3.0, 4.0], 'gemini': [9.0, 10.0]})
+        self.assertEqual(router.rank([first, second], preferred='gemini'), [first, second])
+        self.assertEqual(router.hedge_delay(second), 10.0)
+
+    def test_fallback_on_error(self):
+        """Тест: при ошибке сразу пробуется следующий эндпоинт"""
+        router = ProviderRouter(hedge=True, min_hedge_delay=5)
+
+        def broken():
+            raise ValueError("429 Too Many Requests")
+
+        result = router.run([Attempt('openrouter:m:a', 'openrouter', broken),
+                             Attempt('openrouter:m:b', 'openrouter', lambda: 'ok')])
+        self.assertEqual(result, 'ok')
+        self.assertEqual(router.stats()['endpoints']['openrouter:m:a']['errors'], 1)
+        self.assertEqual(router.stats()['fallbacks'], 1)
+
+    def test_hedge_to_other_provider(self):
+        """Тест: если ответа нет дольше p90, запрос дублируется другому провайдеру"""
+        router = ProviderRouter(hedge=True, min_hedge_delay=0.05)
+        router.seed({'openrouter': [0.01], 'gemini': [0.01]})
+        release = Event()
+
+        def stuck():
+            release.wait(5)
+            return 'late'
+
+        called = []
+        attempts = [Attempt('openrouter:m:a', 'openrouter', stuck),
+                    Attempt('openrouter:m:b', 'openrouter', lambda: called.append('b') or 'b'),
+                    Attempt('gemini:m:c', 'gemini', lambda: 'hedged')]
+        start_time = time.time()
+        result = router.run(attempts, preferred='openrouter')
+        release.set()
+
+        self.assertEqual(result, 'hedged')
+        self.assertEqual(called, [])
+        self.assertLess(time.time() - start_time, 2)
+        self.assertEqual((router.stats()['hedged'], router.stats()['hedge_wins']), (1, 1))
+
+    def test_async_hedge_cancels_loser(self):
+        """Тест асинхронного дублирования: опоздавший запрос отменяется"""
+        router = ProviderRouter(hedge=True, min_hedge_delay=0.05)
+        router.seed({'openrouter': [0.01], 'gemini': [0.01]})
+        cancelled = []
+
+        async def stuck():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return 'late'
+
+        async def fast():
+            return 'hedged'
+
+        result = asyncio.run(router.arun([Attempt('openrouter:m:a', 'openrouter', stuck),
+                                          Attempt('gemini:m:c', 'gemini', fast)]))
+        self.assertEqual(result, 'hedged')
+        self.assertEqual(cancelled, [True])
+
+    def test_endpoint_name_hides_key(self):
+        """Тест: имя эндпоинта не содержит ключ"""
+        name = endpoint_name('openrouter', 'model', 'sk-or-secret-key')
+        self.assertNotIn('secret', name)
+        self.assertEqual(name, endpoint_name('openrouter', 'model', 'sk-or-secret-key'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import json
+import sys
+import os
+
+import httpx
+from requests.structures import CaseInsensitiveDict
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_stream import GenerationRejected, StreamMonitor, header_verdict, sse_events
+from key_pool import KeyPool
+from http_client import AsyncPooledHTTPClient
+from ai_service import AIService
+
+GOOD = "🇷🇺 #нефть #россия\n\nДобыча нефти в России выросла на 5% по итогам месяца."
+BAD = "Вот краткая сводка новости о добыче нефти в России за месяц."
+
+
+def openrouter_lines(text, chunk=4):
+    """Строки потока SSE chat/completions, текст нарезан по chunk символов"""
+    yield b": OPENROUTER PROCESSING"
+    for i in range(0, len(text), chunk):
+        yield f"data: {json.dumps({'choices': [{'delta': {'content': text[i:i + chunk]}}]})}".encode('utf-8')
+        yield b""
+    yield b"data: [DONE]"
+
+
+class FakeStreamResponse:
+    def __init__(self, text):
+        self.status_code = 200
+        self.headers = CaseInsensitiveDict({'Content-Type': 'text/event-stream; charset=utf-8'})
+        self.lines_read = 0
+        self.closed = False
+        self._text = text
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        for line in openrouter_lines(self._text):
+            self.lines_read += 1
+            yield line
+
+    def close(self):
+        self.closed = True
+
+
+class TestLLMStream(unittest.TestCase):
+    def test_header_verdict(self):
+        """Тест проверки первой строки по частям ответа"""
+        self.assertIsNone(header_verdict(""))
+        self.assertIsNone(header_verdict("🇷🇺 "))
+        self.assertIsNone(header_verdict("**ХЕШТ"))
+        self.assertIsNone(header_verdict("ХЕШТЕГИ: 🇷🇺"))
+        self.assertTrue(header_verdict("🇷🇺 #нефть"))
+        self.assertTrue(header_verdict("**ХЕШТЕГИ:** 📊#рынки #акции\nРЕЗЮМЕ:"))
+        self.assertFalse(header_verdict("Вот краткая"))
+        self.assertFalse(header_verdict("📊 Рынки растут\n"))
+        self.assertFalse(header_verdict("📊 Рынки", complete=True))
+
+    def test_monitor_rejects_early(self):
+        """Тест: плохая первая строка обрывает генерацию на первых символах"""
+        monitor = StreamMonitor(check_header=True)
+        monitor.feed("Вот ")
+        with self.assertRaises(GenerationRejected):
+            monitor.feed("краткая сводка")
+
+        monitor = StreamMonitor(check_header=True)
+        for part in ("🇷🇺 #", "нефть", " Вот краткая сводка"):
+            monitor.feed(part)
+        self.assertEqual(monitor.finish(), "🇷🇺 #нефть Вот краткая сводка")
+        self.assertIsNotNone(monitor.ttft)
+
+    def test_sse_events(self):
+        """Тест разбора потока SSE: комментарии пропускаются, поток заканчивается на [DONE]"""
+        events = list(sse_events(openrouter_lines("абвгд", chunk=3)))
+        self.assertEqual([e['choices'][0]['delta']['content'] for e in events], ["абв", "гд"])
+
+    @patch('ai_service.key_pool', new_callable=KeyPool)
+    @patch('ai_service.http_client.post')
+    def test_bad_generation_retried(self, mock_post, pool):
+        """Тест: ответ без эмодзи и хештегов обрывается и сразу запрашивается заново"""
+        service = AIService(ai_provider="openrouter")
+        service.api_key, service.backup_key, service.backup_key2 = 'key-a', None, None
+        service.gemini_api_key = None
+        bad, good = FakeStreamResponse(BAD), FakeStreamResponse(GOOD)
+        mock_post.side_effect = [bad, good]
+        usage = {}
+
+        result = service._generate_text("prompt", check_header=True, usage=usage)
+
+        self.assertEqual(result, GOOD)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertTrue(mock_post.call_args.kwargs['json']['stream'])
+        self.assertTrue(mock_post.call_args.kwargs['stream'])
+        # Плохой ответ прочитан лишь до первых слов, соединение закрыто
+        self.assertLess(bad.lines_read, 10)
+        self.assertTrue(bad.closed)
+        self.assertIn('ttft', usage)
+
+    @patch('ai_service.key_pool', new_callable=KeyPool)
+    @patch('ai_service.http_client.post')
+    def test_last_attempt_not_cancelled(self, mock_post, pool):
+        """Тест: последняя попытка не обрывается, результат не хуже, чем без проверки"""
+        service = AIService(ai_provider="openrouter")
+        service.api_key, service.backup_key, service.backup_key2 = 'key-a', None, None
+        service.gemini_api_key = None
+        mock_post.side_effect = [FakeStreamResponse(BAD), FakeStreamResponse(BAD)]
+
+        self.assertEqual(service._generate_text("prompt", check_header=True), BAD)
+
+    @patch('ai_service.key_pool', new_callable=KeyPool)
+    def test_async_gemini_stream(self, pool):
+        """Тест асинхронного потока Gemini через streamGenerateContent"""
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(request)
+            body = "".join(
+                f"data: {json.dumps({'candidates': [{'content': {'parts': [{'text': GOOD[i:i + 5]}]}}]})}\r\n\r\n"
+                for i in range(0, len(GOOD), 5))
+            return httpx.Response(200, headers={'content-type': 'text/event-stream'}, content=body.encode('utf-8'))
+
+        service = AIService(ai_provider="gemini")
+        service.gemini_api_key = 'gemini-key'
+        service.api_key = service.backup_key = service.backup_key2 = None
+        usage = {}
+
+        async def run():
+            async with AsyncPooledHTTPClient(backoff_factor=0, transport=httpx.MockTransport(handler)) as client:
+                return await service.agenerate_text(client, "prompt", check_header=True, usage=usage)
+
+        self.assertEqual(asyncio.run(run()), GOOD)
+        self.assertIn(':streamGenerateContent', str(requests_seen[0].url))
+        self.assertIn('alt=sse', str(requests_seen[0].url))
+        self.assertIn('ttft', usage)
+
+
+if __name__ == '__main__':
+    unittest.main()
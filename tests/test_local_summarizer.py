@@ -0,0 +1,135 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_summarizer import ExtractiveSummarizer, MAX_PARAGRAPH_CHARS
+from llm_router import ProviderRouter, Attempt
+from key_pool import KeyPool
+from validate_summary import validate_summary_quality
+from ai_service import AIService
+
+ARTICLE = {
+    'title': 'Газпром увеличил экспорт газа в Китай',
+    'content': (
+        "Газпром в первом квартале увеличил экспорт газа в Китай на 25% по сравнению с прошлым годом. "
+        "Фото: пресс-служба. "
+        "Поставки идут по газопроводу «Сила Сибири», который работает на проектной мощности. "
+        "Погода в Москве в выходные будет солнечной и теплой, синоптики обещают до плюс двадцати градусов. "
+        "Экспорт газа в Китай по итогам года может превысить 38 млрд кубометров, считают аналитики. "
+        "Что будет с ценами на газ дальше? "
+        "Акции Газпрома на новостях о росте экспорта в Китай подорожали на 3% на Московской бирже."
+    ),
+    'quotes': [],
+}
+
+
+class TestLocalSummarizer(unittest.TestCase):
+    def test_select(self):
+        """Тест выбора предложений: начало и связанные с заголовком, в исходном порядке"""
+        selected = ExtractiveSummarizer(sentences=3).select(ARTICLE['title'], ARTICLE['content'])
+
+        self.assertEqual(len(selected), 3)
+        self.assertTrue(selected[0].startswith("Газпром в первом квартале"))
+        self.assertFalse(any('Погода' in sentence for sentence in selected))
+        self.assertFalse(any(sentence.endswith('?') or 'Фото' in sentence for sentence in selected))
+        positions = [ARTICLE['content'].index(sentence) for sentence in selected]
+        self.assertEqual(positions, sorted(positions))
+        self.assertTrue(all(len(sentence) <= MAX_PARAGRAPH_CHARS for sentence in selected))
+
+    def test_empty_content(self):
+        """Тест: без подходящих предложений резюме не создается"""
+        summarizer = ExtractiveSummarizer()
+        self.assertIsNone(summarizer.summarize('Заголовок', 'Коротко.', '📊 #новости'))
+        self.assertEqual(summarizer.stats()['empty'], 1)
+
+    def test_summarize_locally(self):
+        """Тест резюме без LLM в формате канала"""
+        usage = {'prompt_tokens': 100}
+
+        summary, hashtags = AIService().summarize_locally(ARTICLE, custom_tags="#тест", usage=usage)
+
+        self.assertTrue(validate_summary_quality(summary))
+        self.assertEqual(summary.split('\n')[0], '🇨🇳 #газ')
+        self.assertIn("#тест", hashtags[0])
+        self.assertEqual(usage, {'provider': 'local'})
+
+    @patch('ai_service.key_pool', new_callable=KeyPool)
+    @patch('ai_service.http_client.post')
+    def test_all_keys_limited(self, mock_post, pool):
+        """Тест: когда все ключи на паузе после 429, резюме создается локально без запроса"""
+        service = AIService(ai_provider="openrouter")
+        service.api_key, service.backup_key, service.backup_key2 = 'key-a', 'key-b', None
+        service.gemini_api_key = None
+        pool.rate_limited('openrouter', 'key-a', {'Retry-After': '600'})
+        pool.rate_limited('openrouter', 'key-b', {'Retry-After': '600'})
+        article = dict(ARTICLE, title=ARTICLE['title'] + ' (limited)')
+        usage = {}
+
+        summary, hashtags = service.summarize_with_hashtags(article, usage=usage)
+
+        mock_post.assert_not_called()
+        self.assertTrue(validate_summary_quality(summary))
+        self.assertTrue(hashtags)
+        self.assertEqual(usage['provider'], 'local')
+
+    @patch('ai_service.key_pool', new_callable=KeyPool)
+    @patch('ai_service.http_client.post')
+    def test_batch_usage_per_article(self, mock_post, pool):
+        """Тест: статьи пакета, резюмированные локально, получают свой usage с provider local"""
+        service = AIService(ai_provider="openrouter")
+        service.api_key, service.backup_key, service.backup_key2 = 'key-a', None, None
+        service.gemini_api_key = None
+        pool.rate_limited('openrouter', 'key-a', {'Retry-After': '600'})
+        articles = [dict(ARTICLE, article_id=i, title=f"{ARTICLE['title']} (batch {i})",
+                         content=ARTICLE['content'][:400]) for i in (1, 2)]
+        article_usage = {}
+
+        results = service.summarize_batch(articles, article_usage=article_usage)
+
+        self.assertTrue(all(validate_summary_quality(results[i][0]) for i in (1, 2)))
+        self.assertEqual(article_usage, {1: {'provider': 'local'}, 2: {'provider': 'local'}})
+
+    @patch('ai_service.key_pool', new_callable=KeyPool)
+    @patch('ai_service.http_client.post')
+    def test_batch_backlog(self, mock_post, pool):
+        """Тест: при очереди на резюме выше порога пакет резюмируется локально без запроса к LLM"""
+        router = ProviderRouter(max_backlog=2)
+        router.seeded = True
+        router.report_backlog(20)
+        service = AIService(ai_provider="openrouter")
+        service.api_key, service.backup_key, service.backup_key2 = 'key-a', None, None
+        service.gemini_api_key = None
+        articles = [dict(ARTICLE, article_id=i, title=f"{ARTICLE['title']} (backlog {i})",
+                         content=ARTICLE['content'][:400]) for i in (1, 2)]
+        article_usage = {}
+
+        with patch('ai_service.llm_router', router):
+            results = service.summarize_batch(articles, article_usage=article_usage)
+
+        mock_post.assert_not_called()
+        self.assertTrue(all(validate_summary_quality(results[i][0]) for i in (1, 2)))
+        self.assertEqual(article_usage, {1: {'provider': 'local'}, 2: {'provider': 'local'}})
+
+    def test_router_overload(self):
+        """Тест порогов перегрузки маршрутизатора: очередь статей на резюме и ожидаемая задержка"""
+        router = ProviderRouter(max_backlog=2, max_latency=30, probe_interval=60)
+        attempts = [Attempt('openrouter:m:k', 'openrouter', lambda: 'ok')]
+        self.assertIsNone(router.overload_reason(attempts))
+
+        router.report_backlog(2)
+        self.assertIn('backlog', router.overload_reason(attempts))
+        router.report_backlog(0)
+
+        router.seed({'openrouter': [45.0]})
+        # Первый запрос уходит в LLM как пробный, следующие - локально
+        self.assertIsNone(router.overload_reason(attempts))
+        self.assertIn('latency', router.overload_reason(attempts))
+        self.assertEqual(router.stats()['overloaded'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
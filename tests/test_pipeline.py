@@ -0,0 +1,154 @@
+import unittest
+import sys
+import os
+from datetime import datetime
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from db import db
+from models import (NewsArticle, PostingLog, SchedulerLease, STATUS_DISCOVERED, STATUS_FETCHED, STATUS_FAILED,
+                    STATUS_POSTED)
+from pipeline import PipelineQueue
+from dates import MSK
+from scraper import extract_article_data
+
+class TestPipelineQueue(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+            for i in range(3):
+                db.session.add(NewsArticle(
+                    url=f'https://test.com/queue/{i}',
+                    title=f'Тестовая статья {i}',
+                    original_content='Превью',
+                    created_at=datetime.utcnow(),
+                    status=STATUS_DISCOVERED
+                ))
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_claim_is_exclusive(self):
+        """Тест: захваченные статьи не выдаются другому воркеру"""
+        with app.app_context():
+            first = PipelineQueue(worker_id='worker-1').claim(STATUS_DISCOVERED, limit=2)
+            second = PipelineQueue(worker_id='worker-2').claim(STATUS_DISCOVERED, limit=10)
+
+            self.assertEqual(len(first), 2)
+            self.assertEqual(len(second), 1)
+            self.assertFalse({a.id for a in first} & {a.id for a in second})
+
+    def test_complete_moves_to_next_status(self):
+        """Тест перехода статьи в следующее состояние"""
+        with app.app_context():
+            queue = PipelineQueue()
+            article = queue.claim(STATUS_DISCOVERED, limit=1)[0]
+            queue.complete(article, STATUS_FETCHED)
+
+            saved = db.session.get(NewsArticle, article.id)
+            self.assertEqual(saved.status, STATUS_FETCHED)
+            self.assertIsNone(saved.locked_by)
+            self.assertEqual(len(queue.claim(STATUS_FETCHED, limit=10)), 1)
+
+    def test_undated_page_keeps_listing_date(self):
+        """Тест: если на странице статьи нет даты, остается дата из ленты"""
+        from scheduler import NewsScheduler
+        listing_date = datetime(2025, 3, 12, 10, 0, tzinfo=MSK)
+        with app.app_context():
+            scheduler = NewsScheduler()
+            scheduler._enqueue_discovered([{'url': 'https://test.com/queue/dated', 'title': 'Статья с датой в ленте',
+                                            'published_at': listing_date}])
+            article = NewsArticle.query.filter_by(url='https://test.com/queue/dated').first()
+
+            page = ("<html><body><article><h1>Статья с датой в ленте</h1>"
+                    + "<p>Компания сообщила о росте выручки на 15% по итогам первого квартала.</p>" * 20
+                    + "</article></body></html>").encode('utf-8')
+            scheduler._apply_fetched(article, extract_article_data(page, article.url))
+
+            self.assertEqual(article.status, STATUS_FETCHED)
+            # created_at хранится как московское время без часового пояса
+            self.assertEqual(article.created_at.replace(tzinfo=None), listing_date.replace(tzinfo=None))
+
+    def test_fail_backs_off_and_gives_up(self):
+        """Тест отложенного повтора и перехода в failed"""
+        with app.app_context():
+            queue = PipelineQueue(max_attempts=2, base_backoff=60)
+            article = queue.claim(STATUS_DISCOVERED, limit=1)[0]
+            queue.fail(article, 'timeout')
+
+            self.assertEqual(article.attempts, 1)
+            self.assertEqual(article.status, STATUS_DISCOVERED)
+            self.assertGreater(article.next_attempt_at, datetime.utcnow())
+            # Статья с отложенным повтором не захватывается
+            self.assertNotIn(article.id, [a.id for a in queue.claim(STATUS_DISCOVERED, limit=10)])
+
+            queue.fail(article, 'timeout')
+            self.assertEqual(article.status, STATUS_FAILED)
+            self.assertEqual(PipelineQueue.counts()[STATUS_FAILED], 1)
+
+class TestCoordination(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+            article = NewsArticle(
+                url='https://test.com/posted',
+                title='Тестовая статья',
+                original_content='Содержание',
+                created_at=datetime.utcnow()
+            )
+            db.session.add(article)
+            db.session.commit()
+            self.article_id = article.id
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_scheduler_lease_single_leader(self):
+        """Тест: аренду лидера держит только один процесс"""
+        with app.app_context():
+            self.assertTrue(SchedulerLease.acquire('test', 'node-1', 60))
+            self.assertFalse(SchedulerLease.acquire('test', 'node-2', 60))
+            # Лидер продлевает свою аренду
+            self.assertTrue(SchedulerLease.acquire('test', 'node-1', 60))
+
+            SchedulerLease.release('test', 'node-1')
+            self.assertTrue(SchedulerLease.acquire('test', 'node-2', 60))
+
+    def test_posting_reserved_once_per_channel(self):
+        """Тест: статья резервируется для публикации в канале только один раз"""
+        with app.app_context():
+            first = PostingLog.reserve(self.article_id, '@channel')
+            self.assertIsNotNone(first)
+            self.assertIsNone(PostingLog.reserve(self.article_id, '@channel'))
+            # В другой канал публиковать можно
+            self.assertIsNotNone(PostingLog.reserve(self.article_id, '@other'))
+
+            # После неудачной отправки публикацию можно повторить
+            first.status = 'failed'
+            db.session.commit()
+            self.assertIsNotNone(PostingLog.reserve(self.article_id, '@channel'))
+
+    def test_already_posted_sets_posted_at(self):
+        """Тест: статья, уже опубликованная другим процессом, получает время публикации"""
+        from scheduler import NewsScheduler
+        with app.app_context():
+            scheduler = NewsScheduler()
+            article = scheduler.queue.claim(STATUS_FETCHED, limit=1)[0]
+
+            scheduler._finish_post(article, {'success': False, 'duplicate': True, 'error': 'уже опубликована'})
+
+            self.assertTrue(article.is_posted)
+            self.assertIsNotNone(article.posted_at)
+            self.assertEqual(article.status, STATUS_POSTED)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import sys
+import os
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polling import AdaptivePollScheduler
+from sources import NewsSource
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def listing(source, start, count):
+    return [{'url': f'https://{source}.test/{i}', 'title': f'Новость {i}'} for i in range(start, start + count)]
+
+
+class TestAdaptivePollScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.poller = AdaptivePollScheduler(min_interval=2, max_interval=60, jitter=0, clock=self.clock)
+        self.busy = NewsSource('busy', 'https://busy.test/', item_selector='a', poll_interval=15)
+        self.quiet = NewsSource('quiet', 'https://quiet.test/', item_selector='a', poll_interval=15)
+
+    def poll_all(self, minutes, busy_new):
+        """Проходит minutes минут, опрашивая источники, когда подходит их время"""
+        quiet_polled = False
+        for _ in range(minutes):
+            for source in self.poller.due([self.busy, self.quiet]):
+                if source is self.busy:
+                    busy_total = int(self.clock.now / 60 * busy_new)
+                    self.poller.observe(source, listing('busy', busy_total, 20))
+                else:
+                    # Тихая лента не меняется: после первого опроса скрапер возвращает пустой список
+                    self.poller.observe(source, [] if quiet_polled else listing('quiet', 0, 20))
+                    quiet_polled = True
+            self.clock.now += 60
+
+    def test_intervals_adapt(self):
+        """Тест: частый источник опрашивается чаще, тихий - реже, в пределах границ"""
+        self.poll_all(minutes=300, busy_new=0.5)
+        stats = self.poller.stats()
+        self.assertLessEqual(stats['busy']['interval_minutes'], 3)
+        self.assertGreaterEqual(stats['busy']['interval_minutes'], 2)
+        self.assertEqual(stats['quiet']['interval_minutes'], 60)
+
+    def test_due_and_force(self):
+        """Тест: источник не опрашивается до назначенного времени, кроме ручного запуска"""
+        self.assertEqual(self.poller.due([self.busy]), [self.busy])
+        self.assertEqual(self.poller.due([self.busy]), [])
+        self.assertEqual(self.poller.next_poll_in(), 15 * 60)
+        self.assertEqual(self.poller.due([self.busy], force=True), [self.busy])
+        self.clock.now += 15 * 60
+        self.assertEqual(self.poller.due([self.busy]), [self.busy])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt_budget import estimate_tokens, trim_to_budget, prompt_token_budget, split_sentences
+from ai_service import AIService
+
+FILLER = "Участники рынка обсуждали общую ситуацию в отрасли и перспективы развития на ближайшие годы. "
+ARTICLE = (
+    "Газпром отчитался о результатах за первый квартал. "
+    + FILLER * 30
+    + "Выручка компании выросла на 15% и составила 2,1 трлн рублей. "
+    + FILLER * 30
+    + "Глава компании заявил: «Мы ожидаем дальнейшего роста экспорта». "
+    + FILLER * 10
+)
+
+
+class TestPromptBudget(unittest.TestCase):
+    def test_estimate_tokens(self):
+        """Тест оценки токенов: кириллица дороже латиницы, пустая строка - ноль"""
+        self.assertEqual(estimate_tokens(''), 0)
+        self.assertGreater(estimate_tokens('привет мир ' * 10), estimate_tokens('hello world ' * 10))
+        self.assertAlmostEqual(estimate_tokens('a' * 4000), 1000, delta=2)
+
+    def test_short_text_unchanged(self):
+        """Тест: текст в пределах бюджета не меняется"""
+        self.assertEqual(trim_to_budget("Короткая новость.", 100), "Короткая новость.")
+
+    def test_trim_keeps_informative_sentences(self):
+        """Тест: остаются начало, предложения с цифрами и цитаты, в исходном порядке"""
+        trimmed = trim_to_budget(ARTICLE, 120, title="Газпром: выручка компании выросла")
+
+        self.assertLessEqual(estimate_tokens(trimmed), 120)
+        sentences = split_sentences(trimmed)
+        self.assertEqual(sentences[0], "Газпром отчитался о результатах за первый квартал.")
+        self.assertIn("Выручка компании выросла на 15% и составила 2,1 трлн рублей.", sentences)
+        self.assertIn("Глава компании заявил: «Мы ожидаем дальнейшего роста экспорта».", sentences)
+        self.assertLess(sentences.index("Выручка компании выросла на 15% и составила 2,1 трлн рублей."),
+                        sentences.index("Глава компании заявил: «Мы ожидаем дальнейшего роста экспорта»."))
+
+    def test_model_budgets(self):
+        """Тест бюджета по моделям с запасным значением"""
+        self.assertEqual(prompt_token_budget('gemini-2.0-flash-001'), 4000)
+        with patch.dict('prompt_budget.MODEL_PROMPT_BUDGETS', {}, clear=True), \
+                patch('prompt_budget.DEFAULT_PROMPT_BUDGET', 1234):
+            self.assertEqual(prompt_token_budget('unknown/model'), 1234)
+
+    @patch.dict('prompt_budget.MODEL_PROMPT_BUDGETS', {'test-model': 1200})
+    def test_summary_prompt_within_budget(self):
+        """Тест: запрос резюме для длинной статьи укладывается в бюджет модели"""
+        service = AIService(ai_provider="openrouter")
+        service.model = 'test-model'
+        article = {'title': 'Газпром увеличил выручку', 'content': ARTICLE * 3, 'quotes': []}
+
+        prompt = service.build_summary_prompt(article, 'formal')
+        combined = service.build_combined_prompt(article, 'engaging')
+
+        self.assertLessEqual(estimate_tokens(prompt), 1200)
+        self.assertLessEqual(estimate_tokens(combined), 1200 + 2)
+        self.assertIn("Выручка компании выросла на 15%", prompt)
+        self.assertIn("ФОРМАТ ОТВЕТА", combined)
+
+    @patch('ai_service.AIService._generate_text', return_value="🇷🇺 #газпром Выручка выросла на 15%.")
+    def test_usage_records_prompt_tokens(self, mock_generate):
+        """Тест: размер отправленного запроса попадает в usage"""
+        service = AIService(ai_provider="openrouter")
+        article = {'title': 'Газпром увеличил выручку (usage)', 'content': ARTICLE, 'quotes': []}
+        usage = {}
+
+        service.summarize_with_hashtags(article, usage=usage)
+
+        self.assertEqual(usage['prompt_tokens'], estimate_tokens(mock_generate.call_args[0][0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
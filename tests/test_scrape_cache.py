@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import tempfile
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scrape_cache
+from scrape_cache import ScrapeCache
+
+ARTICLE = {'url': 'https://news.test/1', 'title': 'Новость', 'content': 'Текст ' * 200}
+
+
+class TestScrapeCache(unittest.TestCase):
+    def test_byte_budget_lru(self):
+        """Тест: при превышении бюджета в байтах вытесняются давно не использованные записи"""
+        cache = ScrapeCache(memory_bytes=5000, path=None)
+        cache.set('a', ARTICLE)
+        cache.set('b', ARTICLE)
+        self.assertIsNotNone(cache.get('a'))
+        cache.set('c', ARTICLE)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertLessEqual(cache.stats()['memory_bytes'], 5000)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_ttl_by_kind_and_copies(self):
+        """Тест: время жизни зависит от вида записи, вызывающий код получает копию"""
+        cache = ScrapeCache(path=None, ttls={'short': 10, 'article': 1000})
+        with patch.object(scrape_cache.time, 'time', return_value=1000.0):
+            cache.set('short', [ARTICLE], kind='short')
+            cache.set('article', ARTICLE)
+        with patch.object(scrape_cache.time, 'time', return_value=1100.0):
+            self.assertIsNone(cache.get('short'))
+            article = cache.get('article')
+            article['article_id'] = 1
+            self.assertNotIn('article_id', cache.get('article'))
+
+    def test_disk_tier(self):
+        """Тест: записи с диска доступны новому экземпляру кэша (после перезапуска)"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'scrape_cache.db')
+            ScrapeCache(path=path).set('https://news.test/1', ARTICLE)
+
+            cache = ScrapeCache(path=path)
+            self.assertEqual(cache.get('https://news.test/1'), ARTICLE)
+            self.assertEqual(cache.stats()['disk_hits'], 1)
+            cache.get('https://news.test/1')
+            self.assertEqual(cache.stats()['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
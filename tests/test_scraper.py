@@ -0,0 +1,88 @@
+import unittest
+import sys
+import os
+from datetime import datetime
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dates import MSK
+from scraper import extract_article_data, SmartLabScraper
+
+PARAGRAPH = "<p>Компания сообщила о росте выручки на 15% по итогам первого квартала текущего года.</p>"
+
+TEST_PAGE = f"""<!DOCTYPE html><html><head><meta charset="utf-8"><title>Тест</title></head><body>
+<article>
+<h1 class="article__title">Газпром увеличил выручку на 15%</h1>
+<span class="news-date">12.03.2025</span>
+<a class="tag-link">Газпром</a><a class="tag-link">Нефть и газ</a>
+{PARAGRAPH * 20}
+<blockquote>Мы ожидаем дальнейшего роста выручки в следующем году</blockquote>
+</article></body></html>""".encode('utf-8')
+
+SMARTLAB_LISTING = """<html><body><header><a href="/about">О проекте</a></header>
+<div class="news-item"><a href="/read/101">Газпром увеличил выручку на 15%</a><span class="date">12.03.2025</span></div>
+<div class="news-item"><a href="/read/102">Сбербанк сохранил прогноз по прибыли</a></div>
+</body></html>""".encode('utf-8')
+
+RBC_LISTING = """<html><body><nav><a href="/about">О компании</a></nav>
+<a class="main__feed__link" href="https://www.rbc.ru/economics/12/03/2025/abc">Нефть подорожала на 3% за сутки
+<span class="main__feed__preview">Brent превысила 80 долларов</span></a>
+<a class="main__feed__link" href="/business/12/03/2025/def">Банки снизили ставки по вкладам</a>
+</body></html>""".encode('utf-8')
+
+VEDOMOSTI_LISTING = """<html><body>
+<div class="articles-list"><a class="article-preview" href="/economics/news/2025/03/12/1">
+<h3 class="article-preview__title">Минфин разместил ОФЗ на 100 млрд рублей</h3></a></div>
+</body></html>""".encode('utf-8')
+
+
+class TestListingParsers(unittest.TestCase):
+    def test_backends_agree(self):
+        """Тест: lxml и html.parser находят одни и те же новости в лентах"""
+        for parse_name, page in [('parse_smartlab_listing', SMARTLAB_LISTING), ('parse_rbc_listing', RBC_LISTING),
+                                 ('parse_vedomosti_listing', VEDOMOSTI_LISTING)]:
+            results = {}
+            for backend in ('lxml', 'html.parser'):
+                items = getattr(SmartLabScraper(html_parser=backend), parse_name)(page, 20)
+                results[backend] = [(item['url'], item['title'], item['preview']) for item in items]
+            self.assertTrue(results['lxml'], parse_name)
+            self.assertEqual(results['lxml'], results['html.parser'], parse_name)
+
+    def test_smartlab_listing(self):
+        """Тест разбора ленты SmartLab: ссылки /read/<id> и даты"""
+        items = SmartLabScraper().parse_smartlab_listing(SMARTLAB_LISTING, 20)
+        self.assertEqual([item['url'] for item in items],
+                         ['https://smartlab.news/read/101', 'https://smartlab.news/read/102'])
+        self.assertEqual(items[0]['published_at'], datetime(2025, 3, 12, tzinfo=MSK))
+        # Дата неизвестна - None, а не время разбора
+        self.assertIsNone(items[1]['published_at'])
+
+
+class TestExtractArticleData(unittest.TestCase):
+    def test_extract_article_data(self):
+        """Тест извлечения статьи из загруженного HTML"""
+        result = extract_article_data(TEST_PAGE, 'https://smartlab.news/read/1')
+
+        self.assertIsNotNone(result)
+        self.assertEqual(result['title'], 'Газпром увеличил выручку на 15%')
+        self.assertIn('росте выручки', result['content'])
+        self.assertIn('Мы ожидаем дальнейшего роста выручки в следующем году', result['quotes'])
+        self.assertEqual(sorted(result['tags']), ['газпром', 'нефть и газ'])
+        self.assertEqual(result['published_at'], datetime(2025, 3, 12, tzinfo=MSK))
+        self.assertEqual(result['url'], 'https://smartlab.news/read/1')
+
+    def test_extract_article_data_without_date(self):
+        """Тест: статья без даты в разметке возвращается с published_at=None"""
+        page = TEST_PAGE.replace('<span class="news-date">12.03.2025</span>'.encode('utf-8'), b'')
+        result = extract_article_data(page, 'https://smartlab.news/read/1')
+        self.assertIsNotNone(result)
+        self.assertIsNone(result['published_at'])
+
+    def test_extract_article_data_empty_page(self):
+        """Тест обработки страницы без содержимого"""
+        result = extract_article_data(b"<html><body></body></html>", 'https://smartlab.news/read/2')
+        self.assertIsNone(result)
+
+if __name__ == '__main__':
+    unittest.main()
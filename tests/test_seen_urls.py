@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+from datetime import datetime
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from db import db
+from models import NewsArticle, STATUS_DISCOVERED
+from scheduler import NewsScheduler
+from seen_urls import SeenURLFilter, canonicalize_url
+
+
+class TestCanonicalizeURL(unittest.TestCase):
+    def test_canonicalize(self):
+        """Тест канонизации: трекинговые параметры, якорь, регистр домена, порт и слэш"""
+        self.assertEqual(canonicalize_url('HTTPS://WWW.RBC.ru:443/economics/12/abc/?utm_source=tg&from=newsfeed#top'),
+                         'https://www.rbc.ru/economics/12/abc')
+        self.assertEqual(canonicalize_url('https://smartlab.news/read/1?b=2&a=1&yclid=5'),
+                         'https://smartlab.news/read/1?a=1&b=2')
+        self.assertEqual(canonicalize_url('http://news.test:8080/'), 'http://news.test:8080/')
+
+
+class TestSeenURLFilter(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+            # Статья, сохраненная до канонизации адресов
+            db.session.add(NewsArticle(url='https://news.test/old/?utm_source=rss', title='Старая новость',
+                                       original_content='Текст', created_at=datetime.utcnow()))
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_enqueue_discovered(self):
+        """Тест: известные адреса отсеиваются, новые сохраняются канонизированными"""
+        items = [
+            {'url': 'https://news.test/old/?utm_source=rss', 'title': 'Старая новость'},
+            {'url': 'https://news.test/new/?utm_medium=feed#comments', 'title': 'Новая новость'},
+            {'url': 'https://news.test/new', 'title': 'Новая новость из другой ленты'},
+        ]
+        with app.app_context():
+            scheduler = NewsScheduler()
+            self.assertEqual(scheduler._enqueue_discovered(items), (1, 1))
+            article = NewsArticle.query.filter_by(url='https://news.test/new').first()
+            self.assertEqual(article.status, STATUS_DISCOVERED)
+
+            # Повторный цикл не обращается к базе: все адреса уже в фильтре
+            db_checked = scheduler.seen_urls.stats()['db_checked']
+            self.assertEqual(scheduler._enqueue_discovered(items), (0, 2))
+            self.assertEqual(scheduler.seen_urls.stats()['db_checked'], db_checked)
+
+    def test_failed_enqueue_not_seen(self):
+        """Тест: адрес, который не удалось сохранить, не попадает в фильтр и будет найден снова"""
+        items = [
+            {'url': 'https://news.test/saved', 'title': 'Сохраненная новость'},
+            {'url': 'https://news.test/failed', 'title': 'Несохраненная новость'},
+        ]
+        with app.app_context():
+            scheduler = NewsScheduler()
+            with patch.object(db.session, 'commit',
+                              side_effect=[RuntimeError('bulk'), None, RuntimeError('database is locked')]):
+                self.assertEqual(scheduler._enqueue_discovered(items), (1, 1))
+            self.assertIn('https://news.test/saved', scheduler.seen_urls)
+            self.assertNotIn('https://news.test/failed', scheduler.seen_urls)
+
+    def test_capacity(self):
+        """Тест: при переполнении забываются самые старые адреса"""
+        seen = SeenURLFilter(capacity=2)
+        seen.add_many(['https://a.test/1', 'https://a.test/2', 'https://a.test/3'])
+        self.assertNotIn('https://a.test/1', seen)
+        self.assertIn('https://a.test/3', seen)
+        self.assertEqual(len(seen), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
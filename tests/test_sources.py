@@ -0,0 +1,189 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+import json
+import tempfile
+from datetime import datetime
+
+# Добавляем родительскую директорию в sys.path для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from db import db
+from dates import MSK
+from sources import (NewsSource, SourceRegistry, parse_listing_html, parse_feed,
+                     source_registry)
+from scheduler import NewsScheduler
+from scraper import SmartLabScraper
+
+LISTING = """<html><body>
+<div class="news"><a href="/2025/03/12/oil">Добыча нефти в России выросла на 5%</a><p>Превью новости</p></div>
+<div class="news"><a href="/2025/03/11/rate">Центробанк сохранил ключевую ставку</a><span class="date">11.03.2025</span></div>
+<div class="news"><a href="https://other.test/ad">Реклама на другом сайте партнера</a></div>
+<div class="news"><a href="/2025/03/10/short">Коротко</a></div>
+</body></html>"""
+
+RSS_ITEM = """<item><title>Новость номер {i}</title><link>https://news.test/rss/{i}</link>
+<pubDate>Wed, 12 Mar 2025 10:00:00 +0300</pubDate><description>&lt;p&gt;Превью {i}&lt;/p&gt;</description>
+<ext:image><ext:url>https://img.test/{i}.jpg</ext:url></ext:image></item>"""
+RSS = ('<?xml version="1.0" encoding="utf-8"?><rss version="2.0" xmlns:ext="http://ext.test"><channel>'
+       '<title>Лента</title>' + ''.join(RSS_ITEM.format(i=i) for i in range(50)) + '</channel></rss>').encode('utf-8')
+ATOM = b"""<feed xmlns="http://www.w3.org/2005/Atom"><title>Feed</title>
+<entry><title>Atom entry title</title><link rel="self" href="/self/1"/><link href="/atom/1"/>
+<published>2025-03-12T10:00:00Z</published></entry></feed>"""
+SITEMAP = b"""<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"
+ xmlns:news="http://www.google.com/schemas/sitemap-news/0.9"><url><loc>https://news.test/sitemap/1</loc>
+<news:news><news:publication_date>2025-03-12T10:00:00+03:00</news:publication_date>
+<news:title>Sitemap news title</news:title></news:news></url></urlset>"""
+
+
+class TestSources(unittest.TestCase):
+    def test_parse_listing_html(self):
+        """Тест разбора ленты по CSS-селекторам источника"""
+        source = NewsSource('test', 'https://news.test/', item_selector='div.news', preview_selector='p',
+                            date_selector='.date', link_pattern=r'^https://news\.test/\d{4}/')
+
+        items = parse_listing_html(LISTING, source)
+
+        self.assertEqual([item['url'] for item in items],
+                         ['https://news.test/2025/03/12/oil', 'https://news.test/2025/03/11/rate'])
+        self.assertEqual(items[0]['preview'], 'Превью новости')
+        self.assertEqual(items[0]['published_at'], datetime(2025, 3, 12, tzinfo=MSK))
+        self.assertEqual(items[1]['published_at'], datetime(2025, 3, 11, tzinfo=MSK))
+        self.assertEqual(len(parse_listing_html(LISTING, source, limit=1)), 1)
+
+    def test_parse_feed(self):
+        """Тест потокового разбора RSS, Atom и новостного sitemap"""
+        chunks = [RSS[i:i + 256] for i in range(0, len(RSS), 256)]
+        items = parse_feed(chunks, limit=50)
+        self.assertEqual(len(items), 50)
+        self.assertEqual(items[0], {'url': 'https://news.test/rss/0', 'title': 'Новость номер 0',
+                                    'preview': 'Превью 0', 'published_at': datetime(2025, 3, 12, 10, 0, tzinfo=MSK)})
+
+        atom = parse_feed([ATOM], limit=5, base_url='https://news.test/')
+        self.assertEqual([(item['url'], item['published_at']) for item in atom],
+                         [('https://news.test/atom/1', datetime(2025, 3, 12, 13, 0, tzinfo=MSK))])
+        sitemap = parse_feed([SITEMAP], limit=5)
+        self.assertEqual([(item['url'], item['title']) for item in sitemap],
+                         [('https://news.test/sitemap/1', 'Sitemap news title')])
+
+    def test_parse_feed_stops_at_limit(self):
+        """Тест: набрав limit новостей, парсер перестает читать фид"""
+        consumed = []
+
+        def chunks():
+            for i in range(0, len(RSS), 256):
+                consumed.append(i)
+                yield RSS[i:i + 256]
+
+        items = parse_feed(chunks(), limit=3)
+        self.assertEqual(len(items), 3)
+        self.assertLess(len(consumed) * 256, len(RSS) // 4)
+
+    def test_feed_falls_back_to_listing(self):
+        """Тест: при недоступном фиде новости берутся из HTML-ленты"""
+        source = NewsSource('test', 'https://news.test/', item_selector='div.news',
+                            feed_url='https://news.test/rss')
+        scraper = SmartLabScraper()
+        feed_response = MagicMock()
+        feed_response.__enter__.return_value.raise_for_status.side_effect = Exception('404')
+        listing_response = MagicMock(status_code=200, content=LISTING.encode('utf-8'), headers={})
+        with patch.object(scraper.session, 'get', side_effect=[feed_response, listing_response]) as get:
+            items = scraper.get_source_news(source)
+        self.assertEqual([call.args[0] for call in get.call_args_list], ['https://news.test/rss', 'https://news.test/'])
+        self.assertEqual(len(items), 3)
+
+    def test_conditional_get(self):
+        """Тест: 304 и неизменившаяся лента не разбираются, счетчики попаданий по источнику"""
+        source = NewsSource('test', 'https://news.test/', item_selector='div.news')
+        scraper = SmartLabScraper()
+        content = LISTING.encode('utf-8')
+        responses = [
+            MagicMock(status_code=200, content=content, headers={'ETag': '"v1"'}),
+            MagicMock(status_code=304, content=b'', headers={}),
+            MagicMock(status_code=200, content=content, headers={'ETag': '"v1"'}),
+        ]
+        with patch.object(scraper.session, 'get', side_effect=responses) as get, \
+                patch.object(scraper, 'parse_source', wraps=scraper.parse_source) as parse:
+            self.assertEqual(len(scraper.get_source_news(source)), 3)
+            # Статьи поставлены в очередь - заголовки и хэши ленты сохраняются
+            scraper.listing_tracker.commit([source])
+            self.assertEqual(scraper.get_source_news(source), [])
+            self.assertEqual(scraper.get_source_news(source), [])
+
+        self.assertEqual(get.call_args_list[1].kwargs['headers'], {'If-None-Match': '"v1"'})
+        self.assertEqual(parse.call_count, 1)
+        stats = scraper.listing_tracker.stats()['test']
+        self.assertEqual((stats['hits'], stats['misses'], stats['not_modified']), (2, 1, 1))
+
+    def test_failed_poll_parsed_again(self):
+        """Тест: после ошибки разбора или записи в очередь та же лента разбирается заново"""
+        source = NewsSource('test', 'https://news.test/', item_selector='div.news')
+        scraper = SmartLabScraper()
+        content = LISTING.encode('utf-8')
+        responses = [MagicMock(status_code=200, content=content, headers={'ETag': '"v1"'}) for _ in range(3)]
+        with patch.object(scraper.session, 'get', side_effect=responses) as get:
+            with patch.object(scraper, 'parse_source', side_effect=ValueError('broken markup')):
+                self.assertEqual(scraper.get_source_news(source), [])
+            scraper.listing_tracker.commit([source])
+
+            items = scraper.get_source_news(source)
+            self.assertEqual(len(items), 3)
+            self.assertEqual(get.call_args_list[1].kwargs['headers'], {})
+            # Запись в очередь не удалась - отложенные данные опроса отбрасываются
+            scraper.listing_tracker.discard([source])
+
+            self.assertEqual(len(scraper.get_source_news(source)), 3)
+
+    def test_enqueue_commits_listing(self):
+        """Тест: хэши ленты сохраняются, только если все ее статьи поставлены в очередь"""
+        source = NewsSource('test', 'https://news.test/', item_selector='div.news')
+        with app.app_context():
+            db.create_all()
+            try:
+                scheduler = NewsScheduler()
+                tracker = scheduler.scraper.listing_tracker
+                items = [{'url': 'https://news.test/2025/03/12/oil', 'title': 'Добыча нефти выросла'}]
+                tracker.remember(source, source.url, {'ETag': '"v1"'}, {})
+                with patch.object(scheduler, '_enqueue_discovered', side_effect=RuntimeError('db is locked')):
+                    with self.assertRaises(RuntimeError):
+                        scheduler._enqueue_listed([source], items)
+                self.assertEqual(tracker.request_headers(source.url), {})
+
+                tracker.remember(source, source.url, {'ETag': '"v1"'}, {})
+                self.assertEqual(scheduler._enqueue_listed([source], items), (1, 0))
+                self.assertEqual(tracker.request_headers(source.url), {'If-None-Match': '"v1"'})
+            finally:
+                db.session.remove()
+                db.drop_all()
+
+    def test_registry(self):
+        """Тест реестра источников: встроенные источники, загрузка из файла, поиск по URL"""
+        self.assertEqual([source.name for source in source_registry.all()], ['smartlab', 'rbc', 'vedomosti'])
+        self.assertEqual(source_registry.find_by_url('https://www.rbc.ru/economics/1').name, 'rbc')
+
+        registry = SourceRegistry()
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+            json.dump([{'name': 'test', 'url': 'https://news.test/', 'item_selector': 'div.news',
+                        'poll_interval': 30, 'enabled': False}], f)
+        try:
+            self.assertEqual(registry.load_file(f.name), 1)
+        finally:
+            os.unlink(f.name)
+        self.assertEqual(registry.get('test').poll_interval, 30)
+        self.assertEqual(registry.enabled(), [])
+        with self.assertRaises(ValueError):
+            NewsSource('broken', 'https://news.test/')
+
+    def test_due_sources(self):
+        """Тест: источник опрашивается не чаще своего интервала, ручной запуск опрашивает все"""
+        scheduler = NewsScheduler()
+        names = [source.name for source in scheduler.due_sources()]
+        self.assertEqual(names, ['smartlab', 'rbc', 'vedomosti'])
+        self.assertEqual(scheduler.due_sources(), [])
+        self.assertEqual(len(scheduler.due_sources(force=True)), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Last modified: 2024-03-26
+"""
+Отдельный процесс конвейера новостей.
+
+Запускает воркеры этапов fetch/summarize и участвует в выборе лидера:
+поиск новостей и публикацию выполняет только один процесс, держатель
+аренды в таблице scheduler_lease. Можно запускать любое число процессов
+на разных машинах с общей базой данных. Веб-процессы при этом стоит
+запускать с SCHEDULER_MODE=worker, чтобы gunicorn не поднимал свой планировщик.
+
+С --engine async все этапы выполняются в одном цикле asyncio
+(см. async_pipeline.AsyncPipelineEngine) вместо отдельных потоков.
+
+Использование:
+    python worker.py [--engine threads|async] [--fetch-workers N] [--summarize-workers N]
+"""
+import os
+
+# Процесс воркера сам управляет планировщиком, routes.py не должен запускать его при импорте
+os.environ.setdefault("SCHEDULER_MODE", "worker")
+
+import argparse
+import asyncio
+import logging
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fetch-workers', type=int,
+                        default=int(os.environ.get("PIPELINE_FETCH_WORKERS", "1")),
+                        help='число потоков этапа загрузки статей')
+    parser.add_argument('--summarize-workers', type=int,
+                        default=int(os.environ.get("PIPELINE_SUMMARIZE_WORKERS", "1")),
+                        help='число потоков этапа генерации резюме')
+    parser.add_argument('--engine', choices=['threads', 'async'],
+                        default=os.environ.get("PIPELINE_ENGINE", "threads"),
+                        help='потоки NewsScheduler или асинхронный движок')
+    args = parser.parse_args()
+
+    if args.engine == 'async':
+        run_async_engine({'fetch': args.fetch_workers, 'summarize': args.summarize_workers})
+        return
+
+    # Импорт здесь, а не на уровне модуля: процессы ExtractionPool запускаются через spawn
+    # и заново импортируют __main__, им не нужно поднимать Flask-приложение и планировщик
+    from scheduler import news_scheduler
+
+    def handle_signal(signum, frame):
+        logger.warning(f"Received signal {signum}, stopping worker")
+        news_scheduler.running = False
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    news_scheduler.start(stage_workers={
+        'fetch': args.fetch_workers,
+        'summarize': args.summarize_workers,
+    })
+    logger.warning(f"Pipeline worker {news_scheduler.queue.worker_id} started")
+
+    while news_scheduler.running:
+        time.sleep(1)
+
+    news_scheduler.stop()
+
+
+def run_async_engine(stage_workers: dict):
+    from async_pipeline import AsyncPipelineEngine
+
+    engine = AsyncPipelineEngine(stage_workers=stage_workers)
+
+    async def serve():
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, engine.stop)
+        await engine.run()
+
+    try:
+        asyncio.run(serve())
+    finally:
+        engine.close()
+
+
+if __name__ == '__main__':
+    main()